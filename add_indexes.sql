@@ -23,6 +23,19 @@ CREATE INDEX IF NOT EXISTS idx_scan_events_zone ON scan_events(zone_id);
 CREATE INDEX IF NOT EXISTS idx_scan_events_timestamp ON scan_events(scanned_at DESC);
 CREATE INDEX IF NOT EXISTS idx_scan_events_direction ON scan_events(direction);
 
+-- Worker profile (/api/workers/{id}/detail) lookups
+CREATE INDEX IF NOT EXISTS idx_worker_sites_worker ON worker_sites(worker_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_enrollment_invites_worker ON enrollment_invites(worker_id, created_at DESC);
+
+-- Site embedding snapshots (/api/sites/{id}/embeddings); also one row per
+-- assignment, so re-run assignment jobs skip existing ones (oldest kept)
+DELETE FROM worker_sites a
+USING worker_sites b
+WHERE a.site_id = b.site_id AND a.worker_id = b.worker_id
+  AND (a.created_at, a.id) > (b.created_at, b.id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_worker_sites_site_worker ON worker_sites(site_id, worker_id);
+DROP INDEX IF EXISTS idx_worker_sites_site;
+
 -- Emergency events indexes
 CREATE INDEX IF NOT EXISTS idx_emergency_status ON emergency_events(status);
 CREATE INDEX IF NOT EXISTS idx_emergency_type ON emergency_events(event_type);
@@ -0,0 +1,192 @@
+"""
+Admission control for database-bound requests
+Each route belongs to a group with a concurrency limit, a bounded wait
+queue, a priority and a statement_timeout. A request is admitted when its
+group is under its limit and the process-wide limit, minus the headroom
+the group leaves for higher priorities, is not used up. Waiting requests
+are woken in priority order, and requests that cannot be queued or wait
+too long get a fast 503 with Retry-After. So when Postgres slows down,
+exports are shed first, and incident-critical reads such as
+/api/rpc/get_worker_last_seen keep capacity reserved for them.
+
+Limits are per API process. Size ADMISSION_MAX_CONCURRENCY to the
+connection pool (SQLAlchemy default: 5 + 10 overflow).
+
+    ADMISSION_GROUPS='{"export": {"limit": 4}, "critical": {"timeout_ms": 3000}}'
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import time
+
+from metrics import (
+    ADMISSION_ACTIVE,
+    ADMISSION_QUEUE_DEPTH,
+    ADMISSION_REJECTED_TOTAL,
+    ADMISSION_WAIT_SECONDS,
+)
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_CONTROL", "true").lower() == "true"
+MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "15"))
+
+# priority: lower is more important. headroom: slots of MAX_CONCURRENCY the
+# group leaves free for higher priorities. max_wait: seconds in the queue
+# before a 503. timeout_ms: statement_timeout for the request's sessions.
+GROUPS = {
+    "critical": {"priority": 0, "limit": 15, "queue": 50, "headroom": 0, "max_wait": 5.0, "timeout_ms": 5000},
+    "default": {"priority": 1, "limit": 12, "queue": 100, "headroom": 3, "max_wait": 2.0, "timeout_ms": 10000},
+    "write": {"priority": 1, "limit": 8, "queue": 100, "headroom": 3, "max_wait": 2.0, "timeout_ms": 10000},
+    "export": {"priority": 2, "limit": 2, "queue": 4, "headroom": 6, "max_wait": 1.0, "timeout_ms": 120000},
+}
+for _name, _overrides in json.loads(os.getenv("ADMISSION_GROUPS", "{}")).items():
+    GROUPS.setdefault(_name, dict(GROUPS["default"])).update(_overrides)
+
+# Route templates -> group; anything else is "default" (or "write" for
+# mutations). Emergency and muster endpoints belong in "critical".
+ROUTE_GROUPS = {
+    "/api/rpc/get_worker_last_seen": "critical",
+    "/api/identify": "default",
+    "/api/reports/attendance": "export",
+    "/api/reports/zone_dwell": "export",
+    "/api/scan_events/archive": "export",
+    "/api/workers/snapshot": "export",
+    "/api/sync": "export",
+    "/api/jobs/{job_id}/result": "export",
+    "/api/sites/{site_id}/embeddings": "export",
+}
+
+# Routes that never touch the database are not admission controlled
+EXEMPT_ROUTES = {
+    "/", "/health", "/metrics",
+    "/api/devices/{device_id}/heartbeat",
+    "/api/licenses/download/{site_id}",
+    "/api/licenses/list",
+}
+
+READ_METHODS = {"GET", "HEAD"}
+
+
+def route_group(method, route):
+    """Group for a request, or None when it is exempt"""
+    if route in EXEMPT_ROUTES or route.startswith("<") or method == "OPTIONS":
+        return None
+    if route in ROUTE_GROUPS:
+        return ROUTE_GROUPS[route]
+    return "default" if method in READ_METHODS else "write"
+
+
+class Rejected(Exception):
+    def __init__(self, group, reason):
+        super().__init__(f"{group} requests over capacity ({reason})")
+        self.group = group
+        self.reason = reason
+
+
+class AdmissionController:
+    """Priority-ordered admission with per-group limits (one per process)"""
+
+    def __init__(self, groups=GROUPS, max_concurrency=MAX_CONCURRENCY):
+        self.groups = groups
+        self.max_concurrency = max_concurrency
+        self.active_total = 0
+        self.active = {name: 0 for name in groups}
+        self.queued = {name: 0 for name in groups}
+        self._waiters = []  # heap of (priority, seq, group, future)
+        self._seq = itertools.count()
+
+    def _can_admit(self, group):
+        config = self.groups[group]
+        return (
+            self.active[group] < config["limit"]
+            and self.active_total < self.max_concurrency - config["headroom"]
+        )
+
+    def _admit(self, group):
+        self.active[group] += 1
+        self.active_total += 1
+        ADMISSION_ACTIVE.labels(group=group).set(self.active[group])
+
+    def _blocked_by_waiters(self, group):
+        """Whether admitting now would jump the queue
+
+        Requests queue FIFO within a group, and never take shared capacity
+        that a queued request of the same or higher priority is waiting for.
+        """
+        priority = self.groups[group]["priority"]
+        for p, _, g, future in self._waiters:
+            if future.done():
+                continue
+            if g == group:
+                return True
+            if p <= priority and self.active[g] < self.groups[g]["limit"]:
+                return True
+        return False
+
+    async def acquire(self, group):
+        if self._can_admit(group) and not self._blocked_by_waiters(group):
+            self._admit(group)
+            ADMISSION_WAIT_SECONDS.labels(group=group).observe(0)
+            return
+
+        config = self.groups[group]
+        if self.queued[group] >= config["queue"]:
+            ADMISSION_REJECTED_TOTAL.labels(group=group, reason="queue_full").inc()
+            raise Rejected(group, "queue full")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (config["priority"], next(self._seq), group, future))
+        self.queued[group] += 1
+        ADMISSION_QUEUE_DEPTH.labels(group=group).set(self.queued[group])
+        started = time.perf_counter()
+        self._wake()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), config["max_wait"])
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                # Admitted just as the wait expired; give the slot back
+                self.release(group)
+            future.cancel()
+            ADMISSION_REJECTED_TOTAL.labels(group=group, reason="timeout").inc()
+            raise Rejected(group, "queue timeout")
+        except BaseException:
+            if future.done() and not future.cancelled():
+                self.release(group)
+            future.cancel()
+            raise
+        finally:
+            self.queued[group] -= 1
+            ADMISSION_QUEUE_DEPTH.labels(group=group).set(self.queued[group])
+            self._wake()
+        ADMISSION_WAIT_SECONDS.labels(group=group).observe(time.perf_counter() - started)
+
+    def release(self, group):
+        self.active[group] -= 1
+        self.active_total -= 1
+        ADMISSION_ACTIVE.labels(group=group).set(self.active[group])
+        self._wake()
+
+    def _wake(self):
+        """Admit queued requests in priority order while capacity allows"""
+        deferred = []
+        while self._waiters:
+            entry = heapq.heappop(self._waiters)
+            priority, _, group, future = entry
+            if future.done():
+                continue
+            if self._can_admit(group):
+                self._admit(group)
+                future.set_result(None)
+            else:
+                deferred.append(entry)
+                # A lower priority may only pass a blocked higher one if it
+                # does not need the capacity that one is waiting for
+                if self.active_total >= self.max_concurrency:
+                    break
+        for entry in deferred:
+            heapq.heappush(self._waiters, entry)
+
+
+controller = AdmissionController()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Critikality scan event archive
+Streams scan_events partitions detached by partitions.py into compressed
+Parquet files, one directory per company and month:
+
+    <SCAN_ARCHIVE_DIR>/company=<client_company_id>/month=YYYY-MM/<partition>.parquet
+
+and reads them back with partition and row-group pruning for
+/api/scan_events/archive, so historical queries never touch Postgres.
+
+The company is the worker's company when the partition is archived. A
+worker deleted since is looked up in sync_tombstones (delta_sync.sql)
+while their tombstone is retained; scans that still can't be placed go
+under company=unknown, which the endpoint serves for
+client_company_id=unknown.
+
+    python archive.py           # archive (and drop) detached partitions
+    python archive.py --keep    # archive but keep the detached tables
+"""
+
+import logging
+import os
+import uuid
+from datetime import datetime, timezone
+from sqlalchemy import text
+from database import SessionLocal
+from partitions import PARENT_TABLE, PARTITION_NAME, partition_range
+
+# pyarrow is imported inside the functions that need it so that the API
+# does not pay for it at startup.
+
+logger = logging.getLogger("critikality.archive")
+
+SCAN_ARCHIVE_DIR = os.getenv("SCAN_ARCHIVE_DIR", "archive/scan_events")
+SCAN_ARCHIVE_ENABLED = os.getenv("SCAN_ARCHIVE_ENABLED", "false").lower() == "true"
+
+# Rows fetched per round trip from the server-side cursor
+ARCHIVE_BATCH_ROWS = 50_000
+UNKNOWN_COMPANY = "unknown"
+
+ARCHIVE_COLUMNS = ["id", "worker_id", "device_id", "zone_id", "direction", "scanned_at", "created_at", "flagged"]
+# Written as-is rather than as strings
+NATIVE_COLUMNS = ("scanned_at", "created_at", "flagged")
+
+
+def archive_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("id", pa.string()),
+        ("worker_id", pa.string()),
+        ("device_id", pa.string()),
+        ("zone_id", pa.string()),
+        ("direction", pa.dictionary(pa.int8(), pa.string())),
+        ("scanned_at", pa.timestamp("us", tz="UTC")),
+        ("created_at", pa.timestamp("us", tz="UTC")),
+        # Passback-flagged scan (scan_flags.sql); null in files archived before it
+        ("flagged", pa.bool_()),
+    ])
+
+
+def detached_partitions(db):
+    """Return names of scan_events partition tables no longer attached to the parent"""
+    result = db.execute(text("""
+        SELECT c.relname
+        FROM pg_class c
+        WHERE c.relkind = 'r'
+          AND c.relnamespace = 'public'::regnamespace
+          AND c.relname LIKE :prefix
+          AND NOT c.relispartition
+    """), {"prefix": f"{PARENT_TABLE}\\_p%"})
+    return sorted(name for (name,) in result.fetchall() if PARTITION_NAME.match(name))
+
+
+def _company_file(archive_dir, company_id, month, table):
+    directory = os.path.join(archive_dir, f"company={company_id}", f"month={month}")
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{table}.parquet")
+
+
+def archive_partition(db, table, archive_dir=SCAN_ARCHIVE_DIR):
+    """Stream one detached partition to Parquet; returns rows written per company"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    lower, _ = partition_range(table)
+    month = f"{lower:%Y-%m}"
+    schema = archive_schema()
+
+    # Deleted workers keep their company through their tombstone, if any
+    company = "w.client_company_id"
+    deleted = ""
+    if db.execute(text("SELECT to_regclass('sync_tombstones') IS NOT NULL")).scalar():
+        company = "COALESCE(w.client_company_id, t.client_company_id)"
+        deleted = """
+            LEFT JOIN LATERAL (
+                SELECT NULLIF(st.client_company_id, '00000000-0000-0000-0000-000000000000') AS client_company_id
+                FROM sync_tombstones st
+                WHERE w.id IS NULL AND st.table_name = 'workers'
+                  AND st.row_id = se.worker_id AND NOT st.moved
+                ORDER BY st.deleted_at DESC
+                LIMIT 1
+            ) t ON TRUE"""
+
+    # Ordered by company so one file is open at a time, and by time so
+    # row-group min/max statistics on scanned_at stay tight
+    result = db.execute(
+        text(f"""
+            SELECT {company} AS client_company_id, se.id, se.worker_id, se.device_id, se.zone_id,
+                   se.direction, se.scanned_at, se.created_at, se.flagged
+            FROM "{table}" se
+            LEFT JOIN workers w ON w.id = se.worker_id{deleted}
+            ORDER BY 1, se.scanned_at
+        """),
+        execution_options={"stream_results": True}
+    )
+
+    written = {}
+    writer = None
+    current_company = None
+    paths = []
+
+    def close_writer():
+        if writer is not None:
+            writer.close()
+
+    try:
+        for rows in result.partitions(ARCHIVE_BATCH_ROWS):
+            # Split the batch at company boundaries
+            start = 0
+            while start < len(rows):
+                company = str(rows[start][0]) if rows[start][0] else UNKNOWN_COMPANY
+                end = start
+                while end < len(rows) and (str(rows[end][0]) if rows[end][0] else UNKNOWN_COMPANY) == company:
+                    end += 1
+
+                if company != current_company:
+                    close_writer()
+                    path = _company_file(archive_dir, company, month, table)
+                    paths.append(path)
+                    writer = pq.ParquetWriter(path + ".tmp", schema, compression="zstd")
+                    current_company = company
+
+                chunk = rows[start:end]
+                columns = {
+                    name: [None if row[i + 1] is None else (
+                        row[i + 1] if name in NATIVE_COLUMNS else str(row[i + 1])
+                    ) for row in chunk]
+                    for i, name in enumerate(ARCHIVE_COLUMNS)
+                }
+                writer.write_table(pa.table(columns, schema=schema))
+                written[company] = written.get(company, 0) + len(chunk)
+                start = end
+    except Exception:
+        close_writer()
+        for path in paths:
+            if os.path.exists(path + ".tmp"):
+                os.remove(path + ".tmp")
+        raise
+
+    close_writer()
+    # Publish only once every company file is complete
+    for path in paths:
+        os.replace(path + ".tmp", path)
+
+    return written
+
+
+def archive_detached(db, archive_dir=SCAN_ARCHIVE_DIR, drop=True):
+    """Archive every detached partition, dropping each table once its files exist"""
+    archived = {}
+    for table in detached_partitions(db):
+        written = archive_partition(db, table, archive_dir)
+        db.rollback()  # end the read transaction before DDL
+        if drop:
+            db.execute(text(f'DROP TABLE "{table}"'))
+            db.commit()
+        archived[table] = sum(written.values())
+        logger.info("Archived %s (%d rows, %d companies)", table, archived[table], len(written))
+    return archived
+
+
+def run_archive():
+    db = SessionLocal()
+    try:
+        return archive_detached(db)
+    finally:
+        db.close()
+
+
+def _month_range(start, end):
+    """Return the YYYY-MM month directory names overlapping [start, end]"""
+    months = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def query_archive(client_company_id, start=None, end=None, worker_id=None, device_id=None,
+                  zone_id=None, direction=None, limit=1000, archive_dir=SCAN_ARCHIVE_DIR):
+    """
+    Read archived scan events for one company (or UNKNOWN_COMPANY)
+    Only the company's month directories overlapping [start, end] are opened;
+    the remaining predicates are pushed down to Parquet row-group statistics.
+    """
+    import pyarrow.dataset as ds
+
+    # Part of a filesystem path: only a UUID (or "unknown") may get there (ValueError otherwise)
+    if client_company_id != UNKNOWN_COMPANY:
+        client_company_id = uuid.UUID(str(client_company_id))
+    company_dir = os.path.join(archive_dir, f"company={client_company_id}")
+    if not os.path.isdir(company_dir):
+        return []
+
+    # Naive datetimes are taken as UTC, matching how partitions are bounded
+    if start and start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if end and end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+
+    wanted_months = None
+    if start or end:
+        start = start or datetime(1970, 1, 1, tzinfo=timezone.utc)
+        end = end or datetime.now(timezone.utc)
+        wanted_months = set(_month_range(start, end))
+
+    files = []
+    for month_dir in sorted(os.listdir(company_dir)):
+        month = month_dir.split("=", 1)[-1]
+        if wanted_months is not None and month not in wanted_months:
+            continue
+        directory = os.path.join(company_dir, month_dir)
+        files.extend(
+            os.path.join(directory, name)
+            for name in sorted(os.listdir(directory)) if name.endswith(".parquet")
+        )
+    if not files:
+        return []
+
+    predicate = None
+    conditions = []
+    if start:
+        conditions.append(ds.field("scanned_at") >= start)
+    if end:
+        conditions.append(ds.field("scanned_at") <= end)
+    for name, value in (("worker_id", worker_id), ("device_id", device_id),
+                        ("zone_id", zone_id), ("direction", direction)):
+        if value:
+            conditions.append(ds.field(name) == value)
+    for condition in conditions:
+        predicate = condition if predicate is None else predicate & condition
+
+    dataset = ds.dataset(files, format="parquet", schema=archive_schema())
+    table = dataset.head(limit, filter=predicate)
+    return table.to_pylist()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Archive detached scan_events partitions to Parquet')
+    parser.add_argument('--keep', action='store_true', help='Keep detached tables after archiving')
+    parser.add_argument('--archive-dir', default=SCAN_ARCHIVE_DIR, help='Archive root directory')
+
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        archived = archive_detached(db, archive_dir=args.archive_dir, drop=not args.keep)
+    finally:
+        db.close()
+
+    if not archived:
+        print("No detached scan_events partitions to archive")
+    for table, rows in archived.items():
+        print(f"✅ {table}: {rows} rows archived")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
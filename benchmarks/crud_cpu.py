@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Critikality CRUD CPU Micro-benchmark
+Compares API-process CPU per call of the previous inline worker handlers
+(SQL formatted per request, rows zipped into dicts) with repository.py
+(prebuilt statements, RowMappings). Both run the same operations against a
+seeded database, including FastAPI's response encoding; CPU is measured
+with time.process_time, so database time is excluded. Everything runs in
+one transaction that is rolled back at the end.
+
+    python benchmarks/crud_cpu.py --database-url postgresql://... --iterations 2000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from fixtures import scaled_volumes, seed_uuid
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import repository  # noqa: E402
+
+UPDATE_FIELDS = ['first_name', 'last_name', 'email', 'phone', 'employee_id', 'status']
+
+
+# The handler bodies from routes/workers.py before repository.py
+
+def legacy_get(db, worker_id):
+    query = text("SELECT * FROM workers WHERE id = :worker_id")
+    result = db.execute(query, {"worker_id": worker_id})
+    row = result.fetchone()
+    columns = result.keys()
+    return dict(zip(columns, row))
+
+
+def legacy_create(db, worker_data):
+    query = text("""
+        INSERT INTO workers (
+            id, first_name, last_name, email, phone, employee_id,
+            client_company_id, status, created_at, updated_at
+        ) VALUES (
+            :id, :first_name, :last_name, :email, :phone, :employee_id,
+            :client_company_id, :status, :created_at, :updated_at
+        )
+        RETURNING *
+    """)
+    params = {
+        'id': worker_data.get('id') or str(uuid.uuid4()),
+        'first_name': worker_data.get('first_name', ''),
+        'last_name': worker_data.get('last_name', ''),
+        'email': worker_data.get('email'),
+        'phone': worker_data.get('phone'),
+        'employee_id': worker_data.get('employee_id'),
+        'client_company_id': worker_data.get('client_company_id'),
+        'status': worker_data.get('status', 'active'),
+        'created_at': datetime.utcnow(),
+        'updated_at': datetime.utcnow()
+    }
+    result = db.execute(query, params)
+    db.commit()
+    row = result.fetchone()
+    columns = result.keys()
+    return dict(zip(columns, row))
+
+
+def legacy_update(db, worker_id, updates):
+    update_fields = []
+    params = {'id': worker_id, 'updated_at': datetime.utcnow()}
+    for field in UPDATE_FIELDS:
+        if field in updates:
+            update_fields.append(f"{field} = :{field}")
+            params[field] = updates[field]
+    update_fields.append("updated_at = :updated_at")
+    query = text(f"""
+        UPDATE workers SET {', '.join(update_fields)}
+        WHERE id = :id RETURNING *
+    """)
+    result = db.execute(query, params)
+    db.commit()
+    row = result.fetchone()
+    columns = result.keys()
+    return dict(zip(columns, row))
+
+
+def legacy_delete(db, worker_id):
+    result = db.execute(text("DELETE FROM workers WHERE id = :id RETURNING id"), {"id": worker_id})
+    db.commit()
+    return result.fetchone() is not None
+
+
+IMPLEMENTATIONS = {
+    "legacy": {
+        "get": legacy_get,
+        "create": legacy_create,
+        "update": legacy_update,
+        "delete": legacy_delete,
+    },
+    "repository": {
+        "get": repository.WORKERS.get,
+        "create": repository.WORKERS.create,
+        "update": repository.WORKERS.update,
+        "delete": repository.WORKERS.delete,
+    },
+}
+
+
+def operations(volumes, rng, iterations):
+    """The same (op, args) sequence for both implementations"""
+    ops = []
+    for i in range(iterations):
+        worker_id = seed_uuid("worker", rng.randrange(volumes["workers"]))
+        ops.append(("get", (worker_id,)))
+        fields = rng.sample(UPDATE_FIELDS, rng.randint(1, 3))
+        ops.append(("update", (worker_id, {f: "active" if f == "status" else f"bench{i}" for f in fields})))
+        new_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        ops.append(("create", ({"id": new_id, "first_name": "Bench", "last_name": f"W{i}",
+                                "client_company_id": seed_uuid("company", i % volumes["companies"])},)))
+        ops.append(("delete", (new_id,)))
+    return ops
+
+
+def run(engine, implementation, ops):
+    """CPU seconds per operation name"""
+    cpu = {}
+    with engine.connect() as conn:
+        outer = conn.begin()
+        # Handler commits release a savepoint; the outer rollback undoes everything
+        db = Session(bind=conn, join_transaction_mode="create_savepoint")
+        try:
+            for name, args in ops:
+                started = time.process_time()
+                data = implementation[name](db, *args)
+                jsonable_encoder({"data": data, "error": None})
+                cpu[name] = cpu.get(name, 0.0) + time.process_time() - started
+        finally:
+            db.close()
+            outer.rollback()
+    return cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare CPU per call of the CRUD handler implementations')
+    parser.add_argument('--database-url', required=True, help='Seeded database (see benchmarks/seed.py)')
+    parser.add_argument('--scale', type=float, default=1.0, help='Scale the database was seeded with')
+    parser.add_argument('--iterations', type=int, default=2000, help='get/update/create/delete rounds per run')
+    parser.add_argument('--rounds', type=int, default=3, help='Alternating runs per implementation (best is kept)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for ids and field subsets')
+
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    ops = operations(scaled_volumes(args.scale), random.Random(args.seed), args.iterations)
+
+    # Warm up connections, imports and compiled caches for both
+    for implementation in IMPLEMENTATIONS.values():
+        run(engine, implementation, ops[:200])
+
+    best = {}
+    for _ in range(args.rounds):
+        for label, implementation in IMPLEMENTATIONS.items():
+            for name, seconds in run(engine, implementation, ops).items():
+                per_call = seconds / args.iterations * 1e6
+                best.setdefault(label, {})[name] = min(best.get(label, {}).get(name, per_call), per_call)
+
+    print(f"CPU µs per call (best of {args.rounds}, {args.iterations} calls each)")
+    print(f"{'operation':<10} {'legacy':>10} {'repository':>12} {'change':>9}")
+    for name in ("get", "update", "create", "delete"):
+        old, new = best["legacy"][name], best["repository"][name]
+        print(f"{name:<10} {old:>10.1f} {new:>12.1f} {(new - old) / old * 100:>+8.1f}%")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,36 @@
+"""
+Shared benchmark dataset definition
+IDs are deterministic (md5 of kind + ordinal, read as a UUID) so the seed
+script and the load driver agree on which rows exist without querying.
+"""
+
+import hashlib
+import uuid
+
+# Row counts at --scale 1.0
+VOLUMES = {
+    "companies": 20,
+    "workers": 100_000,
+    "devices": 1_000,
+    "zones": 5_000,
+    "scan_events": 10_000_000,
+    "emergency_events": 2_000,
+    "user_profiles": 500,
+    "enrollment_invites": 50_000,
+    "team_invites": 200,
+}
+
+# Scan history spread over this many days before seeding time
+SCAN_HISTORY_DAYS = 90
+
+
+def scaled_volumes(scale):
+    """Row counts for a scale factor (companies are never scaled)"""
+    volumes = {name: max(1, int(count * scale)) for name, count in VOLUMES.items()}
+    volumes["companies"] = VOLUMES["companies"]
+    return volumes
+
+
+def seed_uuid(kind, n):
+    """Same value as md5(kind || n)::uuid in the seed SQL"""
+    return str(uuid.UUID(hashlib.md5(f"{kind}{n}".encode()).hexdigest()))
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Critikality Face Index Benchmark
+Measures face_index.FaceIndex on synthetic identities (random unit
+vectors, queries are noisy copies of enrolled ones): load time, batched
+/api/identify search latency and throughput, top-1 accuracy, incremental
+add/remove cost, a row-by-row baseline, and the size and accuracy of the
+quantized edge snapshots (embedding_snapshots.py). No database is needed.
+
+    python benchmarks/identify.py --identities 100000 --dim 512
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import embedding_snapshots  # noqa: E402
+from face_index import FaceIndex, normalize  # noqa: E402
+
+
+def timed(fn, repeat):
+    """Per-call seconds for repeat calls"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the in-memory face embedding index')
+    parser.add_argument('--identities', type=int, default=100_000, help='Enrolled workers')
+    parser.add_argument('--dim', type=int, default=512, help='Embedding dimensions')
+    parser.add_argument('--batches', type=int, nargs='+', default=[1, 8, 32, 128], help='Query batch sizes')
+    parser.add_argument('--k', type=int, default=1, help='Matches per query')
+    parser.add_argument('--repeat', type=int, default=20, help='Timed searches per batch size')
+    parser.add_argument('--noise', type=float, default=0.5, help='Query noise relative to the enrolled vector')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    print(f"Face index: {args.identities:,} identities x {args.dim} dims "
+          f"({args.identities * args.dim * 4 / 2**20:.0f} MB float32)")
+
+    ids = [f"worker-{i}" for i in range(args.identities)]
+    vectors = normalize(rng.standard_normal((args.identities, args.dim), dtype=np.float32), args.dim)
+
+    index = FaceIndex(args.dim)
+    started = time.perf_counter()
+    index.load(ids, vectors)
+    print(f"load           {(time.perf_counter() - started) * 1000:8.1f} ms")
+
+    def queries_for(targets):
+        noise = rng.standard_normal((len(targets), args.dim), dtype=np.float32) / np.sqrt(args.dim)
+        return normalize(vectors[targets] + args.noise * noise, args.dim)
+
+    print(f"\n{'batch':>6} {'p50 ms':>9} {'p95 ms':>9} {'queries/s':>11} {'top-1':>7}")
+    for batch in args.batches:
+        targets = rng.integers(0, args.identities, size=batch)
+        queries = queries_for(targets)
+        index.search(queries, args.k)   # warm up
+        samples = sorted(timed(lambda: index.search(queries, args.k), args.repeat))
+        results = index.search(queries, args.k)
+        correct = sum(1 for t, r in zip(targets, results) if r and r[0]["worker_id"] == ids[t])
+        p50 = statistics.median(samples)
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        print(f"{batch:>6} {p50 * 1000:>9.2f} {p95 * 1000:>9.2f} {batch / p50:>11,.0f} {correct / batch:>7.1%}")
+
+    # Incremental enrollment changes
+    extra = normalize(rng.standard_normal((1000, args.dim), dtype=np.float32), args.dim)
+    add = timed(lambda: [index.add(f"new-{i}", extra[i]) for i in range(len(extra))], 1)[0]
+    remove = timed(lambda: [index.remove(f"new-{i}") for i in range(len(extra))], 1)[0]
+    print(f"\nadd            {add / len(extra) * 1e6:8.1f} µs per worker")
+    print(f"remove         {remove / len(extra) * 1e6:8.1f} µs per worker")
+
+    # What matching looks like without a matrix: one dot product per stored row
+    query = queries_for(rng.integers(0, args.identities, size=1))[0]
+    rows = list(vectors)
+    loop = statistics.median(timed(lambda: max(range(len(rows)), key=lambda i: float(rows[i] @ query)), 3))
+    single = statistics.median(timed(lambda: index.search(query[np.newaxis, :], 1), args.repeat))
+    print(f"row-by-row     {loop * 1000:8.1f} ms per query ({loop / single:,.0f}x the index)")
+
+    # Edge snapshots: file size, build time, and top-1 of the dequantized matrix
+    targets = rng.integers(0, args.identities, size=max(args.batches))
+    queries = queries_for(targets)
+    id_bytes = b"".join(i.to_bytes(16, "big") for i in range(args.identities))
+    print(f"\n{'snapshot':<9} {'MB':>7} {'build ms':>9} {'top-1':>7}")
+    for dtype in embedding_snapshots.DTYPES:
+        started = time.perf_counter()
+        quantized, scales = embedding_snapshots.quantize(vectors, dtype)
+        data = embedding_snapshots.encode(embedding_snapshots.FULL, dtype, args.dim, 1, id_bytes, quantized, scales)
+        build = time.perf_counter() - started
+        snapshot = embedding_snapshots.read_snapshot(data)
+        quantized_index = FaceIndex(args.dim)
+        quantized_index.load(ids, snapshot.dequantized())
+        results = quantized_index.search(queries, 1)
+        correct = sum(1 for t, r in zip(targets, results) if r[0]["worker_id"] == ids[t])
+        print(f"{dtype:<9} {len(data) / 2**20:>7.1f} {build * 1000:>9.1f} {correct / len(targets):>7.1%}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Critikality API Load Benchmark
+Drives each endpoint in routes/ at fixed concurrency against a seeded
+database (see benchmarks/seed.py) and records latency percentiles,
+throughput and DB query counts (from the X-DB-Query-Count and
+Server-Timing response headers) as JSON for comparison between runs.
+
+    python benchmarks/run.py --database-url postgresql://...  # starts uvicorn
+    python benchmarks/run.py --base-url http://localhost:8000  # running API
+    python benchmarks/run.py ... --baseline benchmarks/results/before.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime
+
+import httpx
+
+from fixtures import scaled_volumes, seed_uuid
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+SERVER_TIMING_DB = re.compile(r"db;dur=([0-9.]+)")
+
+
+def build_scenarios(volumes, rng, include_writes):
+    """Return [(name, request_factory)] where a factory returns (method, path, json)"""
+    def worker():
+        return seed_uuid("worker", rng.randrange(volumes["workers"]))
+
+    def company():
+        return seed_uuid("company", rng.randrange(volumes["companies"]))
+
+    scenarios = [
+        ("health", lambda: ("GET", "/health", None)),
+        ("workers.list", lambda: ("GET", "/api/workers", None)),
+        ("workers.list_company", lambda: ("GET", f"/api/workers?client_company_id={company()}", None)),
+        ("workers.get", lambda: ("GET", f"/api/workers/{worker()}", None)),
+        ("workers.detail", lambda: ("GET", f"/api/workers/{worker()}/detail", None)),
+        ("workers.search", lambda: ("GET", f"/api/workers/search?q=khan{rng.randrange(volumes['workers'])}&client_company_id={company()}", None)),
+        ("workers.snapshot", lambda: ("GET", f"/api/workers/snapshot?client_company_id={company()}", None)),
+        ("workers.autocomplete", lambda: ("GET", f"/api/workers/search?q={rng.choice(['ma', 'jo', 'fat', 'wei'])}&mode=autocomplete&client_company_id={company()}", None)),
+        ("devices.list", lambda: ("GET", "/api/devices", None)),
+        ("devices.get", lambda: ("GET", f"/api/devices/{seed_uuid('device', rng.randrange(volumes['devices']))}", None)),
+        ("zones.list", lambda: ("GET", "/api/zones", None)),
+        ("zones.list_type", lambda: ("GET", "/api/zones?zone_type=hazard_zone", None)),
+        ("zones.get", lambda: ("GET", f"/api/zones/{seed_uuid('zone', rng.randrange(volumes['zones']))}", None)),
+        ("dashboard.stats", lambda: ("GET", "/api/dashboard/stats", None)),
+        ("dashboard.last_seen", lambda: ("POST", "/api/rpc/get_worker_last_seen",
+                                         {"worker_ids": [worker() for _ in range(25)]})),
+        ("dashboard.activity_1h", lambda: ("GET", "/api/dashboard/activity?bucket=1h", None)),
+        ("dashboard.activity_zone", lambda: ("GET", f"/api/dashboard/activity?bucket=5m&zone_id={seed_uuid('zone', rng.randrange(volumes['zones']))}", None)),
+        ("team.user_roles", lambda: ("GET", f"/api/user_roles?client_company_id={company()}", None)),
+        ("team.invites", lambda: ("GET", "/api/team_invites", None)),
+        ("enrollment.templates", lambda: ("GET", f"/api/worker_templates?client_company_id={company()}", None)),
+        ("enrollment.invites", lambda: ("GET", f"/api/enrollment_invites?worker_id={worker()}", None)),
+        ("enrollment.worker_sites", lambda: ("GET", f"/api/worker_sites?worker_id={worker()}", None)),
+        ("licenses.list", lambda: ("GET", "/api/licenses/list", None)),
+    ]
+
+    if include_writes:
+        scenarios += [
+            ("workers.create", lambda: ("POST", "/api/workers", {
+                "id": str(uuid.uuid4()), "first_name": "Bench", "last_name": "Worker",
+                "client_company_id": company()
+            })),
+            ("workers.update", lambda: ("PUT", f"/api/workers/{worker()}",
+                                        {"status": rng.choice(["active", "inactive"])})),
+            ("workers.upsert", lambda: ("POST", "/api/workers/upsert", [
+                {"id": worker(), "status": rng.choice(["active", "inactive"]),
+                 "updated_at": datetime.utcnow().isoformat()} for _ in range(500)
+            ])),
+            # Camera bursts: each face reported three times in the same second
+            ("scan_events.ingest", lambda: ("POST", "/api/scan_events", [
+                {"worker_id": w, "device_id": d, "zone_id": z, "direction": rng.choice(["in", "out"]),
+                 "scanned_at": datetime.utcnow().isoformat() + "Z"}
+                for w, d, z in [(worker(), seed_uuid("device", rng.randrange(volumes["devices"])),
+                                 seed_uuid("zone", rng.randrange(volumes["zones"]))) for _ in range(20)]
+                for _ in range(3)
+            ])),
+            ("devices.heartbeat", lambda: ("POST", f"/api/devices/{seed_uuid('device', rng.randrange(volumes['devices']))}/heartbeat", None)),
+            ("enrollment.create_sites", lambda: ("POST", "/api/worker_sites", [
+                {"worker_id": worker(), "site_id": seed_uuid("site", rng.randrange(50))} for _ in range(10)
+            ])),
+        ]
+
+    return scenarios
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run_scenario(client, factory, total_requests, concurrency):
+    latencies = []
+    query_counts = []
+    db_times = []
+    errors = 0
+    remaining = total_requests
+
+    async def user():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            method, path, body = factory()
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                await response.aread()
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+            # Older builds answer 200 with an "error" field on DB failures
+            failed = response.status_code >= 400
+            if not failed and response.headers.get("content-type", "").startswith("application/json"):
+                payload = response.json()
+                failed = isinstance(payload, dict) and bool(payload.get("error"))
+            if failed:
+                errors += 1
+
+            if "x-db-query-count" in response.headers:
+                query_counts.append(int(response.headers["x-db-query-count"]))
+            match = SERVER_TIMING_DB.search(response.headers.get("server-timing", ""))
+            if match:
+                db_times.append(float(match.group(1)))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ms = lambda value: round(value * 1000, 2) if value is not None else None
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed > 0 else 0.0,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1] if latencies else None),
+        "db_queries_mean": round(sum(query_counts) / len(query_counts), 2) if query_counts else None,
+        "db_time_ms_mean": round(sum(db_times) / len(db_times), 2) if db_times else None,
+    }
+
+
+async def run_all(args, volumes):
+    rng = random.Random(args.seed)
+    scenarios = build_scenarios(volumes, rng, args.writes)
+    if args.only:
+        scenarios = [s for s in scenarios if any(s[0].startswith(prefix) for prefix in args.only)]
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results = {}
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        for name, factory in scenarios:
+            await run_scenario(client, factory, args.warmup, args.concurrency)
+            result = await run_scenario(client, factory, args.requests, args.concurrency)
+            results[name] = result
+            print(f"  {name:<26} {result['throughput_rps']:>8} rps  "
+                  f"p50 {result['p50_ms']:>8} ms  p95 {result['p95_ms']:>8} ms  "
+                  f"p99 {result['p99_ms']:>8} ms  queries {result['db_queries_mean']}  "
+                  f"errors {result['errors']}")
+    return results
+
+
+def compare(results, baseline_path):
+    """Print % change against a previous results file (negative latency = faster)"""
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)["results"]
+
+    def change(new, old):
+        if new is None or not old:
+            return "     n/a"
+        return f"{(new - old) / old * 100:+7.1f}%"
+
+    print(f"\nCompared with {baseline_path}:")
+    for name, result in results.items():
+        old = baseline.get(name)
+        if not old:
+            print(f"  {name:<26} (not in baseline)")
+            continue
+        print(f"  {name:<26} rps {change(result['throughput_rps'], old['throughput_rps'])}  "
+              f"p50 {change(result['p50_ms'], old['p50_ms'])}  "
+              f"p95 {change(result['p95_ms'], old['p95_ms'])}  "
+              f"p99 {change(result['p99_ms'], old['p99_ms'])}")
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(database_url, workers):
+    """Run uvicorn from the repo root against the benchmark database"""
+    port = free_port()
+    env = {**os.environ, "DATABASE_URL": database_url}
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1',
+         '--port', str(port), '--workers', str(workers), '--log-level', 'warning'],
+        cwd=REPO_DIR, env=env
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return server, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("API server did not become healthy")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Critikality API')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--base-url', help='URL of an already running API')
+    target.add_argument('--database-url', help='Start uvicorn against this (seeded) database')
+    parser.add_argument('--server-workers', type=int, default=1, help='uvicorn workers when starting the API')
+    parser.add_argument('--scale', type=float, default=1.0, help='Scale the database was seeded with')
+    parser.add_argument('--concurrency', type=int, default=32, help='Concurrent clients per endpoint')
+    parser.add_argument('--requests', type=int, default=2000, help='Measured requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=100, help='Unmeasured requests per endpoint')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout (seconds)')
+    parser.add_argument('--writes', action='store_true', help='Also benchmark mutating endpoints')
+    parser.add_argument('--only', nargs='+', help='Scenario name prefixes to run (e.g. workers dashboard)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for request parameters')
+    parser.add_argument('--output', help='Results JSON path (default: benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--baseline', help='Previous results JSON to compare against')
+
+    args = parser.parse_args()
+
+    server = None
+    if args.database_url:
+        server, args.base_url = start_server(args.database_url, args.server_workers)
+
+    try:
+        print(f"Benchmarking {args.base_url} (concurrency {args.concurrency}, {args.requests} requests/endpoint)")
+        results = asyncio.run(run_all(args, scaled_volumes(args.scale)))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    output = args.output or os.path.join(
+        BENCH_DIR, 'results', datetime.now().strftime('%Y%m%d-%H%M%S') + '.json'
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            "meta": {
+                "timestamp": datetime.now().isoformat(timespec='seconds'),
+                "git_revision": git_revision(),
+                "scale": args.scale,
+                "concurrency": args.concurrency,
+                "requests": args.requests,
+                "writes": args.writes,
+                "seed": args.seed,
+            },
+            "results": results
+        }, f, indent=2)
+    print(f"\n✅ Results saved to {output}")
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+-- Minimal schema for local benchmarking
+-- Mirrors the columns the routers in routes/ read and write; production
+-- tables live in Supabase. Indexes come from add_indexes.sql after seeding.
+
+CREATE TABLE IF NOT EXISTS workers (
+    id UUID PRIMARY KEY,
+    first_name TEXT NOT NULL DEFAULT '',
+    last_name TEXT NOT NULL DEFAULT '',
+    email TEXT,
+    phone TEXT,
+    employee_id TEXT,
+    client_company_id UUID,
+    status TEXT NOT NULL DEFAULT 'active',
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS devices (
+    id UUID PRIMARY KEY,
+    name TEXT NOT NULL DEFAULT '',
+    device_type TEXT NOT NULL DEFAULT 'camera',
+    ip_address TEXT,
+    port INTEGER DEFAULT 80,
+    location TEXT,
+    status TEXT NOT NULL DEFAULT 'active',
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS location_zones (
+    id UUID PRIMARY KEY,
+    name TEXT NOT NULL DEFAULT '',
+    zone_type TEXT NOT NULL DEFAULT 'general',
+    description TEXT,
+    capacity INTEGER,
+    status TEXT NOT NULL DEFAULT 'active',
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS scan_events (
+    id UUID PRIMARY KEY,
+    worker_id UUID,
+    device_id UUID,
+    zone_id UUID,
+    direction TEXT,
+    scanned_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS emergency_events (
+    id UUID PRIMARY KEY,
+    event_type TEXT,
+    status TEXT NOT NULL DEFAULT 'active',
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS user_profiles (
+    id UUID PRIMARY KEY,
+    email TEXT,
+    full_name TEXT,
+    client_company_id UUID
+);
+
+CREATE TABLE IF NOT EXISTS user_roles (
+    id UUID PRIMARY KEY,
+    user_id UUID,
+    client_company_id UUID,
+    role TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS team_invites (
+    id UUID PRIMARY KEY,
+    email TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS worker_templates (
+    id UUID PRIMARY KEY,
+    client_company_id UUID,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS enrollment_invites (
+    id UUID PRIMARY KEY,
+    worker_id UUID,
+    status TEXT NOT NULL DEFAULT 'pending',
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS worker_sites (
+    id UUID PRIMARY KEY,
+    worker_id UUID,
+    site_id UUID,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
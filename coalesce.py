@@ -0,0 +1,47 @@
+"""
+Single-flight coalescing for identical concurrent reads
+Routers opt in by moving the read into a loader function and awaiting
+coalesced(name, loader, *args). Concurrent calls with the same name and
+arguments share one execution of the loader (in a worker thread, with
+its own session) and its result, so a thundering herd at shift start
+costs one query per key instead of one per request.
+
+Nothing is cached: the key is forgotten as soon as the execution ends.
+A request may still join an execution that started before it arrived, and
+so miss a write that committed in between. Routers therefore pass
+share=False for clients that must read their own writes (prefers_primary),
+which always run their own query. Results are shared between requests and
+must not be mutated. Coalescing is per API process.
+"""
+
+import asyncio
+
+from metrics import COALESCE_IN_FLIGHT, COALESCE_REQUESTS_TOTAL
+
+_in_flight = {}  # (name, args) -> asyncio.Task
+
+
+async def coalesced(name, loader, *args, share=True):
+    """Return loader(*args), sharing an in-flight execution for the same key unless share is False"""
+    if not share:
+        COALESCE_REQUESTS_TOTAL.labels(name=name, result="bypassed").inc()
+        return await asyncio.to_thread(loader, *args)
+
+    key = (name, args)
+    task = _in_flight.get(key)
+    if task is None:
+        COALESCE_REQUESTS_TOTAL.labels(name=name, result="executed").inc()
+        task = asyncio.ensure_future(asyncio.to_thread(loader, *args))
+        _in_flight[key] = task
+        COALESCE_IN_FLIGHT.labels(name=name).inc()
+
+        def forget(_):
+            _in_flight.pop(key, None)
+            COALESCE_IN_FLIGHT.labels(name=name).dec()
+
+        task.add_done_callback(forget)
+    else:
+        COALESCE_REQUESTS_TOTAL.labels(name=name, result="merged").inc()
+
+    # shield: one caller disconnecting must not cancel the shared execution
+    return await asyncio.shield(task)
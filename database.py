@@ -1,8 +1,16 @@
 import os
-from sqlalchemy import create_engine
+import time
+import asyncio
+import itertools
+import logging
+from contextvars import ContextVar
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
+from starlette.requests import Request
+
+from metrics import DB_READ_ROUTING_TOTAL, REPLICA_LAG_SECONDS
 
 load_dotenv()
 
@@ -12,8 +20,207 @@ engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
+logger = logging.getLogger("critikality.sql")
+
+# Optional read replicas (comma-separated URLs). GET requests read from a
+# replica whose measured lag is within REPLICA_MAX_LAG_SECONDS, else from
+# the primary.
+REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", "2"))
+
+# A client that wrote within this window reads from the primary. After it,
+# every replica still being routed to has replayed the write.
+READ_YOUR_WRITES_SECONDS = REPLICA_MAX_LAG_SECONDS + REPLICA_LAG_CHECK_INTERVAL
+PRIMARY_COOKIE = "crit_primary_until"
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+replica_engines = [create_engine(url, pool_pre_ping=True) for url in REPLICA_URLS]
+_replica_lag = [None] * len(replica_engines)  # seconds; None until measured or when unreachable
+_replicas_down = set()
+_replica_turn = itertools.count()
+
+# statement_timeout for request sessions; admission groups override it
+STATEMENT_TIMEOUT_MS = int(os.getenv("STATEMENT_TIMEOUT_MS", "10000"))
+
+# Statements slower than this are logged (optionally with their plan)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "false").lower() == "true"
+
+# Per-request statement trace is capped; counts and time keep accumulating
+MAX_TRACED_STATEMENTS = 500
+
+
+class DBStats:
+    """Database work done on behalf of one request"""
+
+    def __init__(self):
+        self.query_count = 0
+        self.db_time = 0.0
+        self.statements = []
+
+    def record(self, statement, duration):
+        self.query_count += 1
+        self.db_time += duration
+        if len(self.statements) < MAX_TRACED_STATEMENTS:
+            self.statements.append((statement, duration))
+
+    def by_template(self):
+        """Return [(statement, count, total_seconds)] sorted by count"""
+        grouped = {}
+        for statement, duration in self.statements:
+            count, total = grouped.get(statement, (0, 0.0))
+            grouped[statement] = (count + 1, total + duration)
+        return sorted(
+            ((stmt, count, total) for stmt, (count, total) in grouped.items()),
+            key=lambda item: item[1],
+            reverse=True
+        )
+
+
+# Set by the request middleware; None outside a request (scripts, jobs)
+request_db_stats: ContextVar = ContextVar("request_db_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started_at = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - context._query_started_at
+
+    stats = request_db_stats.get()
+    if stats is not None:
+        stats.record(statement, duration)
+
+    if duration * 1000 >= SLOW_QUERY_MS:
+        _log_slow_query(conn, cursor, statement, parameters, duration, executemany)
+
+
+def _log_slow_query(conn, cursor, statement, parameters, duration, executemany):
+    """Log a slow statement template, with EXPLAIN output when enabled"""
+    logger.warning("Slow query (%.1f ms): %s", duration * 1000, " ".join(statement.split()))
+
+    # EXPLAIN ANALYZE re-runs the statement, so only read-only SELECTs qualify
+    if (
+        not SLOW_QUERY_EXPLAIN
+        or executemany
+        or conn.dialect.name != "postgresql"
+        or not statement.lstrip().upper().startswith("SELECT")
+    ):
+        return
+
+    # Separate raw cursor: the original still holds its results, and the
+    # savepoint keeps a failed EXPLAIN from aborting the caller's transaction
+    explain_cursor = cursor.connection.cursor()
+    try:
+        explain_cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            explain_cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + statement, parameters)
+            plan = "\n".join(row[0] for row in explain_cursor.fetchall())
+            explain_cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+            logger.warning("Plan for slow query:\n%s", plan)
+        except Exception as e:
+            explain_cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            logger.warning("EXPLAIN failed for slow query: %s", e)
+    except Exception as e:
+        logger.warning("Could not explain slow query: %s", e)
+    finally:
+        explain_cursor.close()
+
+
+for _engine in [engine, *replica_engines]:
+    event.listen(_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        -- Fully replayed: the replay timestamp goes stale while the primary is idle
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+def measure_replica_lag():
+    """Refresh the lag of every replica; unreachable replicas are marked None"""
+    for index, replica in enumerate(replica_engines):
+        try:
+            with replica.connect() as conn:
+                lag = float(conn.execute(REPLICA_LAG_SQL).scalar())
+        except Exception as e:
+            if index not in _replicas_down:
+                logger.warning("Replica %d unreachable, reading from the primary: %s", index, str(e).splitlines()[0])
+            _replicas_down.add(index)
+            lag = None
+        else:
+            if index in _replicas_down:
+                logger.warning("Replica %d reachable again", index)
+            _replicas_down.discard(index)
+        _replica_lag[index] = lag
+        REPLICA_LAG_SECONDS.labels(replica=str(index)).set(-1 if lag is None else lag)
+
+
+async def replica_lag_loop():
+    """Background task started with the API when replicas are configured"""
+    while True:
+        await asyncio.to_thread(measure_replica_lag)
+        await asyncio.sleep(REPLICA_LAG_CHECK_INTERVAL)
+
+
+@event.listens_for(SessionLocal, "after_begin")
+def _apply_statement_timeout(session, transaction, connection):
+    timeout_ms = session.info.get("statement_timeout_ms")
+    if timeout_ms:
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+
+
+def _session(bind=None, statement_timeout_ms=None):
+    db = SessionLocal(bind=bind) if bind is not None else SessionLocal()
+    if statement_timeout_ms:
+        db.info["statement_timeout_ms"] = statement_timeout_ms
+    return db
+
+
+def read_session(primary=False, statement_timeout_ms=None):
+    """Session on a replica within the lag threshold, for read-only work
+
+    Falls back to the primary when primary is requested, no replicas are
+    configured or every replica is lagging or unreachable.
+    """
+    if not primary:
+        healthy = [
+            index for index, lag in enumerate(_replica_lag)
+            if lag is not None and lag <= REPLICA_MAX_LAG_SECONDS
+        ]
+        if healthy:
+            DB_READ_ROUTING_TOTAL.labels(target="replica").inc()
+            replica = replica_engines[healthy[next(_replica_turn) % len(healthy)]]
+            return _session(replica, statement_timeout_ms)
+    if replica_engines:
+        DB_READ_ROUTING_TOTAL.labels(target="primary").inc()
+    return _session(statement_timeout_ms=statement_timeout_ms)
+
+
+def prefers_primary(request):
+    """Writes, and reads shortly after the same client wrote, use the primary"""
+    if request.method not in SAFE_METHODS:
+        return True
+    try:
+        return float(request.cookies.get(PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def statement_timeout(request):
+    """statement_timeout (ms) for the request, set by AdmissionMiddleware"""
+    return getattr(request.state, "statement_timeout_ms", STATEMENT_TIMEOUT_MS)
+
+
+def get_db(request: Request):
+    db = read_session(prefers_primary(request), statement_timeout(request))
     try:
         yield db
     finally:
@@ -0,0 +1,132 @@
+"""
+Delta sync ("changes since") for edge nodes and dashboards
+Rows in workers, devices and location_zones carry the id of the
+transaction that last wrote them, and deletes leave tombstones (see
+delta_sync.sql). A sync token is "<snapshot xmin>.<issued unix time>";
+the next sync returns rows and tombstones written by any transaction at
+or after that xmin, so periodic sync costs as much as what changed.
+A change can be returned twice across syncs but is never skipped, so
+clients apply results as upserts. A company-scoped sync also lists, as
+deleted, workers moved to another company.
+
+Tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS are pruned; a token
+older than that gets a full sync instead ("full": true in the response).
+"""
+
+import asyncio
+import logging
+import os
+import time
+from sqlalchemy import text
+from database import SessionLocal
+
+logger = logging.getLogger("critikality.sync")
+
+# Public name -> table
+SYNC_TABLES = {"workers": "workers", "devices": "devices", "zones": "location_zones"}
+
+TOMBSTONE_RETENTION_DAYS = int(os.getenv("SYNC_TOMBSTONE_RETENTION_DAYS", "30"))
+PRUNE_INTERVAL_SECONDS = int(os.getenv("SYNC_PRUNE_INTERVAL", "3600"))
+
+
+def encode_token(xmin, issued_at):
+    return f"{xmin}.{int(issued_at)}"
+
+
+def decode_token(token):
+    """Token -> (xmin, issued unix time); raises ValueError when malformed"""
+    try:
+        xmin, issued_at = token.split(".")
+        return int(xmin), int(issued_at)
+    except (AttributeError, ValueError):
+        raise ValueError("Invalid sync token")
+
+
+def current_token(db):
+    # Taken before any rows are read: a transaction below the snapshot xmin
+    # has finished, so the reads that follow include its changes.
+    row = db.execute(text("""
+        SELECT CAST(pg_snapshot_xmin(pg_current_snapshot()) AS text) AS xmin,
+               CAST(extract(epoch FROM NOW()) AS bigint) AS issued_at
+    """)).fetchone()
+    return encode_token(row.xmin, row.issued_at)
+
+
+def token_expired(issued_at):
+    return time.time() - issued_at > TOMBSTONE_RETENTION_DAYS * 86400
+
+
+def changes_since(db, since=None, tables=None, client_company_id=None):
+    """Rows changed and ids deleted since a token; a full sync when since is None"""
+    tables = tables or list(SYNC_TABLES)
+    full = since is None
+    if since is not None:
+        since_xmin, issued_at = decode_token(since)
+        full = token_expired(issued_at)
+
+    token = current_token(db)
+    changes = {}
+    deleted = {}
+
+    for name in tables:
+        table = SYNC_TABLES[name]
+        clauses = []
+        params = {}
+        if not full:
+            clauses.append("sync_txid >= CAST(:since AS xid8)")
+            params["since"] = str(since_xmin)
+        if name == "workers" and client_company_id:
+            clauses.append("client_company_id = :client_company_id")
+            params["client_company_id"] = client_company_id
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        result = db.execute(text(f"SELECT * FROM {table} {where}"), params)
+        columns = [c for c in result.keys() if c != "sync_txid"]
+        changes[name] = [{c: row._mapping[c] for c in columns} for row in result.fetchall()]
+
+        if not full:
+            if name == "workers" and client_company_id:
+                # Deleted from, or moved out of, this company only
+                scope = "client_company_id = :client_company_id"
+            else:
+                # Moved rows still exist
+                scope = "NOT moved"
+            result = db.execute(text(f"""
+                SELECT row_id FROM sync_tombstones
+                WHERE table_name = :table AND sync_txid >= CAST(:since AS xid8) AND {scope}
+            """), {"table": table, "since": str(since_xmin), "client_company_id": client_company_id})
+            deleted[name] = [str(row.row_id) for row in result.fetchall()]
+        else:
+            deleted[name] = []
+
+    return {"token": token, "full": full, "changes": changes, "deleted": deleted}
+
+
+def prune_tombstones(db):
+    """Drop tombstones past retention; returns the number removed"""
+    result = db.execute(
+        text("DELETE FROM sync_tombstones WHERE deleted_at < NOW() - make_interval(days => :days)"),
+        {"days": TOMBSTONE_RETENTION_DAYS}
+    )
+    db.commit()
+    return result.rowcount
+
+
+def _prune_once():
+    db = SessionLocal()
+    try:
+        return prune_tombstones(db)
+    finally:
+        db.close()
+
+
+async def prune_loop():
+    """Background task started with the API"""
+    while True:
+        try:
+            removed = await asyncio.to_thread(_prune_once)
+            if removed:
+                logger.info("Pruned %d sync tombstones", removed)
+        except Exception as e:
+            logger.warning("Sync tombstone pruning failed: %s", e)
+        await asyncio.sleep(PRUNE_INTERVAL_SECONDS)
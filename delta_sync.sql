@@ -0,0 +1,146 @@
+-- Change tracking for /api/sync (see delta_sync.py)
+-- Inserts and updates on workers, devices and location_zones stamp the row
+-- with the writing transaction's id (sync_txid); deletes leave a tombstone
+-- in sync_tombstones, under the company the row belonged to (the nil UUID
+-- for rows without one). A worker moved to another company leaves a
+-- "moved" tombstone for the old company, so a company-scoped sync drops
+-- it; unscoped syncs ignore moved tombstones since the row still exists. A sync token carries the xmin of the reader's
+-- snapshot: every transaction below it had already finished, so
+-- "sync_txid >= token" never misses a change that committed late.
+-- updated_at alone can't be the watermark: it is set before commit, and
+-- edge upserts carry the device's own edit time.
+--
+-- An UPDATE only stamps the row when a synced column changed. Device
+-- telemetry (last_seen, connection_status), rewritten by every heartbeat
+-- flush and offline sweep, is not tracked, so heartbeats don't put the
+-- whole fleet into every delta; live status comes from the device
+-- endpoints, and a synced row still carries the latest values.
+--
+-- Needs PostgreSQL 13+ (xid8). Rows written before this migration have a
+-- NULL sync_txid and are only returned by a full sync.
+
+BEGIN;
+
+ALTER TABLE workers ADD COLUMN IF NOT EXISTS sync_txid xid8;
+ALTER TABLE devices ADD COLUMN IF NOT EXISTS sync_txid xid8;
+ALTER TABLE location_zones ADD COLUMN IF NOT EXISTS sync_txid xid8;
+
+CREATE INDEX IF NOT EXISTS idx_workers_sync_txid ON workers(sync_txid);
+CREATE INDEX IF NOT EXISTS idx_devices_sync_txid ON devices(sync_txid);
+CREATE INDEX IF NOT EXISTS idx_location_zones_sync_txid ON location_zones(sync_txid);
+
+CREATE TABLE IF NOT EXISTS sync_tombstones (
+    table_name TEXT NOT NULL,
+    row_id UUID NOT NULL,
+    client_company_id UUID NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000',
+    moved BOOLEAN NOT NULL DEFAULT false,      -- row left this company, not deleted
+    sync_txid xid8 NOT NULL DEFAULT pg_current_xact_id(),
+    deleted_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (table_name, row_id, client_company_id)
+);
+
+-- Tables created before tombstones were kept per company
+ALTER TABLE sync_tombstones
+    ADD COLUMN IF NOT EXISTS client_company_id UUID NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000';
+ALTER TABLE sync_tombstones ADD COLUMN IF NOT EXISTS moved BOOLEAN NOT NULL DEFAULT false;
+ALTER TABLE sync_tombstones DROP CONSTRAINT IF EXISTS sync_tombstones_pkey;
+ALTER TABLE sync_tombstones ADD PRIMARY KEY (table_name, row_id, client_company_id);
+
+CREATE INDEX IF NOT EXISTS idx_sync_tombstones_txid ON sync_tombstones(sync_txid);
+CREATE INDEX IF NOT EXISTS idx_sync_tombstones_deleted_at ON sync_tombstones(deleted_at);
+
+CREATE OR REPLACE FUNCTION sync_stamp() RETURNS trigger AS $$
+BEGIN
+    NEW.sync_txid := pg_current_xact_id();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- The tombstone's company; the nil UUID for tables or rows without one
+CREATE OR REPLACE FUNCTION sync_row_company(row_data jsonb) RETURNS uuid AS $$
+    SELECT COALESCE(CAST(row_data ->> 'client_company_id' AS uuid), '00000000-0000-0000-0000-000000000000')
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION sync_record_deletes() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO sync_tombstones AS t (table_name, row_id, client_company_id)
+    SELECT TG_TABLE_NAME, o.id, sync_row_company(to_jsonb(o)) FROM old_rows o
+    ORDER BY o.id
+    ON CONFLICT (table_name, row_id, client_company_id) DO UPDATE
+    SET sync_txid = EXCLUDED.sync_txid, deleted_at = EXCLUDED.deleted_at, moved = false;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- A row re-created under a deleted id must not be followed by its old
+-- tombstone; under another company, the old company still sees it go
+CREATE OR REPLACE FUNCTION sync_clear_tombstones() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM sync_tombstones t
+    USING new_rows n
+    WHERE t.table_name = TG_TABLE_NAME AND t.row_id = n.id
+      AND t.client_company_id = sync_row_company(to_jsonb(n));
+    UPDATE sync_tombstones t SET moved = true
+    FROM new_rows n
+    WHERE t.table_name = TG_TABLE_NAME AND t.row_id = n.id AND NOT t.moved;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- A row that changes company is gone for the old one and back for the new one
+CREATE OR REPLACE FUNCTION sync_record_moves() RETURNS trigger AS $$
+BEGIN
+    IF OLD.client_company_id IS NOT NULL THEN
+        INSERT INTO sync_tombstones AS t (table_name, row_id, client_company_id, moved)
+        VALUES (TG_TABLE_NAME, OLD.id, OLD.client_company_id, true)
+        ON CONFLICT (table_name, row_id, client_company_id) DO UPDATE
+        SET sync_txid = EXCLUDED.sync_txid, deleted_at = EXCLUDED.deleted_at, moved = true;
+    END IF;
+    DELETE FROM sync_tombstones t
+    WHERE t.table_name = TG_TABLE_NAME AND t.row_id = NEW.id
+      AND t.client_company_id = sync_row_company(to_jsonb(NEW));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS workers_sync_moves ON workers;
+CREATE TRIGGER workers_sync_moves AFTER UPDATE ON workers
+    FOR EACH ROW
+    WHEN (OLD.client_company_id IS DISTINCT FROM NEW.client_company_id)
+    EXECUTE FUNCTION sync_record_moves();
+
+DO $$
+DECLARE
+    tbl TEXT;
+    untracked TEXT[];
+BEGIN
+    FOREACH tbl IN ARRAY ARRAY['workers', 'devices', 'location_zones'] LOOP
+        untracked := CASE tbl
+            WHEN 'devices' THEN ARRAY['sync_txid', 'last_seen', 'connection_status']
+            ELSE ARRAY['sync_txid']
+        END;
+
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tbl || '_sync_stamp', tbl);
+        EXECUTE format('CREATE TRIGGER %I BEFORE INSERT ON %I
+                        FOR EACH ROW EXECUTE FUNCTION sync_stamp()', tbl || '_sync_stamp', tbl);
+
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tbl || '_sync_stamp_update', tbl);
+        EXECUTE format('CREATE TRIGGER %I BEFORE UPDATE ON %I
+                        FOR EACH ROW
+                        WHEN ((to_jsonb(OLD) - %L::text[]) IS DISTINCT FROM (to_jsonb(NEW) - %L::text[]))
+                        EXECUTE FUNCTION sync_stamp()', tbl || '_sync_stamp_update', tbl, untracked, untracked);
+
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tbl || '_sync_deletes', tbl);
+        EXECUTE format('CREATE TRIGGER %I AFTER DELETE ON %I
+                        REFERENCING OLD TABLE AS old_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION sync_record_deletes()', tbl || '_sync_deletes', tbl);
+
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tbl || '_sync_undelete', tbl);
+        EXECUTE format('CREATE TRIGGER %I AFTER INSERT ON %I
+                        REFERENCING NEW TABLE AS new_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION sync_clear_tombstones()', tbl || '_sync_undelete', tbl);
+    END LOOP;
+END
+$$;
+
+COMMIT;
@@ -0,0 +1,9 @@
+-- Device liveness columns maintained by heartbeats.py
+-- status stays the admin state (active/inactive) used by the dashboard;
+-- connection_status is online/offline/unknown from heartbeats.
+
+ALTER TABLE devices ADD COLUMN IF NOT EXISTS last_seen TIMESTAMPTZ;
+ALTER TABLE devices ADD COLUMN IF NOT EXISTS connection_status TEXT NOT NULL DEFAULT 'unknown';
+
+-- Offline sweep only looks at devices currently online
+CREATE INDEX IF NOT EXISTS idx_devices_online_last_seen ON devices(last_seen) WHERE connection_status = 'online';
@@ -0,0 +1,332 @@
+"""
+Per-site face template snapshots for edge matching
+/api/sites/{site_id}/embeddings serves the templates (see face_index.py)
+of the workers assigned to a site as one flat binary file, quantized to
+int8 (per-row scale) or float16. Every section is 64-byte aligned
+little-endian data, so a device mmap()s the file and takes NumPy views of
+it without copying or parsing:
+
+    header    64 bytes (HEADER, below)
+    ids       count x 16 bytes       worker UUIDs, row order, ascending
+    scales    count x float32        int8 only: value = q * scale
+    vectors   count x dim x int8 | float16
+    removed   removed x 16 bytes     delta files only
+
+A delta file (kind 1) holds the rows added or changed since base_version
+plus the ids removed, and apply_delta() turns base + delta into the new
+full file, so devices only download what changed between versions.
+Versions are derived from the site's templates and sync_txids, so any
+API process computes the same version for the same content.
+
+Built files are kept under EMBEDDING_SNAPSHOT_DIR (the newest
+EMBEDDING_SNAPSHOT_KEEP versions per site and dtype), which is also what
+deltas are computed against.
+
+    import mmap, numpy as np
+    snapshot = embedding_snapshots.read_snapshot(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    scores = (snapshot.vectors.astype(np.float32) @ query) * snapshot.scales
+"""
+
+import hashlib
+import os
+import struct
+import threading
+import time
+import uuid
+
+import numpy as np
+from sqlalchemy import text
+
+from face_index import EMBEDDING_DIM, STORED_DTYPE
+
+EMBEDDING_SNAPSHOT_DIR = os.getenv("EMBEDDING_SNAPSHOT_DIR", "embedding_snapshots")
+EMBEDDING_SNAPSHOT_KEEP = int(os.getenv("EMBEDDING_SNAPSHOT_KEEP", "5"))
+
+MAGIC = b"CRITEMB\x00"
+# Bump when the layout changes; it is part of every version
+FORMAT_VERSION = 1
+# magic, format_version, kind, dtype, dim, count, removed, version,
+# base_version, created_at, ids/scales/vectors/removed offsets
+HEADER = struct.Struct("<8sHBBIIIQQqIIII")
+ALIGNMENT = 64
+
+FULL = 0
+DELTA = 1
+
+# dtype name -> (header code, numpy dtype)
+DTYPES = {
+    "int8": (1, np.dtype("i1")),
+    "float16": (2, np.dtype("<f2")),
+}
+DTYPE_NAMES = {code: name for name, (code, _) in DTYPES.items()}
+
+_build_locks = {}      # (site id, dtype) -> lock so one request builds at a time
+_build_locks_lock = threading.Lock()
+
+
+class EmbeddingSnapshot:
+    """Zero-copy views over a snapshot or delta file"""
+
+    def __init__(self, buffer):
+        (magic, format_version, self.kind, dtype_code, self.dim, self.count, removed,
+         self.version, self.base_version, self.created_at,
+         ids_offset, scales_offset, vectors_offset, removed_offset) = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError("Not a version %d embedding snapshot" % FORMAT_VERSION)
+
+        self.dtype = DTYPE_NAMES[dtype_code]
+        numpy_dtype = DTYPES[self.dtype][1]
+        self.ids = np.frombuffer(buffer, dtype="V16", count=self.count, offset=ids_offset)
+        self.scales = (
+            np.frombuffer(buffer, dtype="<f4", count=self.count, offset=scales_offset)
+            if self.dtype == "int8" else None
+        )
+        self.vectors = np.frombuffer(
+            buffer, dtype=numpy_dtype, count=self.count * self.dim, offset=vectors_offset
+        ).reshape(self.count, self.dim)
+        self.removed = np.frombuffer(buffer, dtype="V16", count=removed, offset=removed_offset)
+
+    def worker_ids(self):
+        return [str(uuid.UUID(bytes=bytes(value))) for value in self.ids]
+
+    def dequantized(self):
+        """float32 copy of the vectors"""
+        vectors = self.vectors.astype(np.float32)
+        if self.scales is not None:
+            vectors *= self.scales[:, np.newaxis]
+        return vectors
+
+
+def read_snapshot(buffer):
+    return EmbeddingSnapshot(buffer)
+
+
+def quantize(vectors, dtype):
+    """float32 rows -> (quantized rows, per-row scales or None)"""
+    if dtype == "float16":
+        return vectors.astype("<f2"), None
+    # Symmetric per-row scale: unit vectors spread their mass over many
+    # dimensions, so a global scale would waste most of the int8 range
+    peaks = np.abs(vectors).max(axis=1)
+    scales = np.where(peaks > 0, peaks / 127.0, 1.0).astype("<f4")
+    quantized = np.clip(np.rint(vectors / scales[:, np.newaxis]), -127, 127).astype("i1")
+    return quantized, scales
+
+
+def _aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def encode(kind, dtype, dim, version, ids, vectors, scales, removed=b"", base_version=0):
+    """Serialize raw sections (ids and removed as concatenated 16-byte UUIDs)"""
+    count = len(ids) // 16
+    sections = [ids, scales.tobytes() if scales is not None else b"", vectors.tobytes(), removed]
+    offsets = []
+    offset = HEADER.size
+    for section in sections:
+        offset = _aligned(offset)
+        offsets.append(offset if section else 0)
+        offset += len(section)
+
+    out = bytearray(_aligned(offset))
+    HEADER.pack_into(
+        out, 0, MAGIC, FORMAT_VERSION, kind, DTYPES[dtype][0], dim, count, len(removed) // 16,
+        version, base_version, int(time.time()), *offsets
+    )
+    for section, section_offset in zip(sections, offsets):
+        if section:
+            out[section_offset:section_offset + len(section)] = section
+    return bytes(out)
+
+
+# Per-template terms of the version fingerprint; any template or
+# assignment change moves it
+VERSION_TERMS = """
+    COUNT(*) {over} AS templates,
+    COALESCE(SUM(hashtextextended(
+        CAST(e.worker_id AS text) || ':' || COALESCE(CAST(e.sync_txid AS text), ''), 0
+    )) {over}, 0) AS digest
+"""
+
+SITE_TEMPLATES = """
+    FROM worker_embeddings e
+    WHERE octet_length(e.embedding) = :size
+      AND EXISTS (SELECT 1 FROM worker_sites ws WHERE ws.worker_id = e.worker_id AND ws.site_id = :site_id)
+"""
+
+
+def _version(templates, digest, dim):
+    key = f"{FORMAT_VERSION}:{dim}:{templates}:{digest}".encode()
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+def site_version(db, site_id, dim=EMBEDDING_DIM):
+    """Fingerprint of the site's templates, without reading them"""
+    row = db.execute(
+        text(f"SELECT {VERSION_TERMS.format(over='')} {SITE_TEMPLATES}"),
+        {"site_id": site_id, "size": 4 * dim},
+    ).fetchone()
+    return _version(row.templates, row.digest, dim)
+
+
+def build_snapshot(db, site_id, dtype, dim=EMBEDDING_DIM):
+    """(version, full file) from one statement, so the version names exactly the rows read"""
+    rows = db.execute(
+        text(f"""
+            SELECT e.worker_id, e.embedding, {VERSION_TERMS.format(over='OVER ()')}
+            {SITE_TEMPLATES}
+            ORDER BY e.worker_id
+        """),
+        {"site_id": site_id, "size": 4 * dim},
+    ).fetchall()
+    version = _version(rows[0].templates, rows[0].digest, dim) if rows else _version(0, 0, dim)
+
+    ids = b"".join(uuid.UUID(str(row.worker_id)).bytes for row in rows)
+    vectors = np.frombuffer(b"".join(row.embedding for row in rows), dtype=STORED_DTYPE).reshape(len(rows), dim)
+    quantized, scales = quantize(vectors, dtype)
+    return version, encode(FULL, dtype, dim, version, ids, quantized, scales)
+
+
+def build_delta(base, current):
+    """Delta file taking base (full) to current (full)"""
+    base_rows = {bytes(worker_id): row for row, worker_id in enumerate(base.ids)}
+    changed = []
+    for row, worker_id in enumerate(current.ids):
+        key = bytes(worker_id)
+        base_row = base_rows.pop(key, None)
+        if (base_row is None
+                or base.vectors[base_row].tobytes() != current.vectors[row].tobytes()
+                or (current.scales is not None and base.scales[base_row] != current.scales[row])):
+            changed.append(row)
+
+    rows = np.array(changed, dtype=np.intp)
+    return encode(
+        DELTA, current.dtype, current.dim, current.version,
+        current.ids[rows].tobytes(),
+        current.vectors[rows],
+        current.scales[rows] if current.scales is not None else None,
+        removed=b"".join(sorted(base_rows)),
+        base_version=base.version,
+    )
+
+
+def apply_delta(base_buffer, delta_buffer):
+    """Full file for delta.version from the full file at delta.base_version"""
+    base = read_snapshot(base_buffer)
+    delta = read_snapshot(delta_buffer)
+    if delta.kind != DELTA or delta.base_version != base.version or delta.dtype != base.dtype:
+        raise ValueError("Delta does not apply to this snapshot")
+
+    drop = {bytes(worker_id) for worker_id in delta.removed} | {bytes(worker_id) for worker_id in delta.ids}
+    keep = np.array([row for row, worker_id in enumerate(base.ids) if bytes(worker_id) not in drop], dtype=np.intp)
+
+    ids = np.concatenate([base.ids[keep], delta.ids])
+    # Same ascending byte order as the server's ORDER BY worker_id
+    order = np.argsort(ids.view("S16"), kind="stable")
+    vectors = np.concatenate([base.vectors[keep], delta.vectors])[order]
+    scales = None
+    if base.scales is not None:
+        scales = np.concatenate([base.scales[keep], delta.scales])[order]
+    return encode(FULL, base.dtype, base.dim, delta.version, ids[order].tobytes(), vectors, scales)
+
+
+def _site_dir(site_id):
+    return os.path.join(EMBEDDING_SNAPSHOT_DIR, str(uuid.UUID(site_id)))
+
+
+def _full_path(site_id, dtype, version):
+    return os.path.join(_site_dir(site_id), f"{dtype}-{version:016x}.emb")
+
+
+def _delta_path(site_id, dtype, base_version, version):
+    return os.path.join(_site_dir(site_id), f"{dtype}-{base_version:016x}-{version:016x}.delta")
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _open(path):
+    """Open file or None; an open file stays readable if it is pruned meanwhile"""
+    try:
+        return open(path, "rb")
+    except FileNotFoundError:
+        return None
+
+
+def _prune(site_id, dtype, keep):
+    """Keep the newest EMBEDDING_SNAPSHOT_KEEP full files (and keep) and the deltas between them"""
+    directory = _site_dir(site_id)
+    full = []
+    for entry in os.scandir(directory):
+        if entry.name.startswith(f"{dtype}-") and entry.name.endswith(".emb"):
+            try:
+                full.append((entry.stat().st_mtime, entry))
+            except FileNotFoundError:
+                pass   # pruned by another process
+    full.sort(key=lambda item: item[0], reverse=True)
+    kept = {entry.name[len(dtype) + 1:-len(".emb")] for _, entry in full[:EMBEDDING_SNAPSHOT_KEEP]}
+    kept.add(f"{keep:016x}")
+
+    stale = [entry for _, entry in full if entry.name[len(dtype) + 1:-len(".emb")] not in kept]
+    for entry in os.scandir(directory):
+        if entry.name.startswith(f"{dtype}-") and entry.name.endswith(".delta"):
+            base_version, version = entry.name[len(dtype) + 1:-len(".delta")].split("-")
+            if base_version not in kept or version not in kept:
+                stale.append(entry)
+    for entry in stale:
+        try:
+            os.unlink(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def iter_file(f, chunk_size=1024 * 1024):
+    """Stream an open snapshot file, closing it at the end"""
+    with f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            yield chunk
+
+
+def get_snapshot(db, site_id, dtype="int8", since=None):
+    """(version, kind, open file) to send: a delta from since when possible, else full
+
+    The file is opened before returning, so a concurrent build pruning it
+    can't break the response; the caller closes it (see iter_file).
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"dtype must be one of: {', '.join(DTYPES)}")
+
+    with _build_locks_lock:
+        build_lock = _build_locks.setdefault((site_id, dtype), threading.Lock())
+    with build_lock:
+        version = site_version(db, site_id)
+        current = _open(_full_path(site_id, dtype, version))
+        if current is None:
+            # The version is recomputed from the rows the build read, in case
+            # templates changed since site_version
+            version, data = build_snapshot(db, site_id, dtype)
+            path = _full_path(site_id, dtype, version)
+            _write(path, data)
+            _prune(site_id, dtype, keep=version)
+            current = open(path, "rb")
+
+        if since is None or since == version:
+            return version, FULL, current
+        base = _open(_full_path(site_id, dtype, since))
+        if base is None:
+            # Too old (or never built here): the device starts over from a full file
+            return version, FULL, current
+
+        with base:
+            delta_path = _delta_path(site_id, dtype, since, version)
+            delta = _open(delta_path)
+            if delta is None:
+                _write(delta_path, build_delta(read_snapshot(base.read()), read_snapshot(current.read())))
+                delta = open(delta_path, "rb")
+        current.close()
+        return version, DELTA, delta
@@ -0,0 +1,96 @@
+"""
+Error responses shared by the routers
+Failures keep the {"data": None, "error": message} envelope but carry a
+real status code, so load balancers, client retry logic and latency
+dashboards can tell them from successes:
+
+    503 + Retry-After   pool exhausted, statement/lock timeout, serialization
+                        failure or deadlock, database unreachable
+    409                 unique or foreign key violation
+    400                 invalid input rejected by the database (bad UUID, ...)
+    500                 anything else
+
+Only 503s are worth retrying, and clients should wait Retry-After seconds
+first instead of hammering a struggling database. Every error is counted
+by class in critikality_errors_total.
+"""
+
+import logging
+import os
+from fastapi.responses import JSONResponse
+from sqlalchemy import exc as sa_exc
+
+from metrics import ERRORS_TOTAL
+
+logger = logging.getLogger("critikality.errors")
+
+RETRY_AFTER_SECONDS = int(os.getenv("ERROR_RETRY_AFTER", "2"))
+
+# SQLSTATE -> (status, error class)
+TRANSIENT_SQLSTATES = {
+    "57014": "db_timeout",       # query_canceled (statement_timeout)
+    "55P03": "db_timeout",       # lock_not_available (lock_timeout)
+    "40001": "db_conflict",      # serialization_failure
+    "40P01": "db_conflict",      # deadlock_detected
+    "53300": "db_unavailable",   # too_many_connections
+    "57P01": "db_unavailable",   # admin_shutdown
+    "57P03": "db_unavailable",   # cannot_connect_now
+}
+CONFLICT_SQLSTATES = {"23505", "23503"}  # unique / foreign key violation
+
+
+def classify(exc):
+    """Return (status, error_class) for an exception raised by a handler"""
+    if isinstance(exc, sa_exc.TimeoutError):
+        return 503, "pool_exhausted"
+
+    sqlstate = getattr(getattr(exc, "orig", None), "pgcode", None)
+    if sqlstate in TRANSIENT_SQLSTATES:
+        return 503, TRANSIENT_SQLSTATES[sqlstate]
+    if sqlstate and sqlstate.startswith("08"):
+        return 503, "db_unavailable"
+    if isinstance(exc, sa_exc.OperationalError) and sqlstate is None:
+        # Connection refused / dropped before the server sent an error
+        return 503, "db_unavailable"
+    if isinstance(exc, sa_exc.DBAPIError) and exc.connection_invalidated:
+        return 503, "db_unavailable"
+
+    if sqlstate in CONFLICT_SQLSTATES:
+        return 409, "conflict"
+    if sqlstate and sqlstate[:2] in ("22", "23"):
+        return 400, "invalid_input"
+
+    if isinstance(exc, sa_exc.SQLAlchemyError):
+        return 500, "db_error"
+    return 500, "internal"
+
+
+def error_message(exc):
+    # The driver message, without the SQL text and bound parameters that
+    # str() of a SQLAlchemy error appends
+    orig = getattr(exc, "orig", None)
+    message = str(orig if orig is not None else exc).strip()
+    return message.splitlines()[0] if message else exc.__class__.__name__
+
+
+def error_response(exc):
+    """Envelope for a failed request with the status code it deserves"""
+    status, error_class = classify(exc)
+    ERRORS_TOTAL.labels(error_class=error_class, status=str(status)).inc()
+
+    headers = {}
+    if status == 503:
+        headers["Retry-After"] = str(RETRY_AFTER_SECONDS)
+    if status == 500:
+        logger.error("Unhandled %s", error_class, exc_info=exc)
+
+    return JSONResponse(
+        status_code=status,
+        content={"data": None, "error": error_message(exc)},
+        headers=headers
+    )
+
+
+async def handle_database_error(request, exc):
+    """Exception handler for database errors raised outside a handler's try block"""
+    return error_response(exc)
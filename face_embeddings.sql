@@ -0,0 +1,68 @@
+-- Face templates for server-side identity matching (see face_index.py)
+-- One template per worker: a unit-length float32 vector stored as raw
+-- little-endian bytes, so an index loads a whole company with one query
+-- and a single np.frombuffer. Rows are stamped and tombstoned like the
+-- delta_sync tables, which lets each API process refresh its in-memory
+-- index with only what changed.
+--
+-- Run after delta_sync.sql (uses sync_stamp() and sync_tombstones).
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS worker_embeddings (
+    worker_id UUID PRIMARY KEY REFERENCES workers(id) ON DELETE CASCADE,
+    client_company_id UUID,
+    embedding BYTEA NOT NULL,               -- float32 little-endian, unit length
+    model TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    sync_txid xid8
+);
+
+CREATE INDEX IF NOT EXISTS idx_worker_embeddings_company ON worker_embeddings(client_company_id);
+CREATE INDEX IF NOT EXISTS idx_worker_embeddings_sync_txid ON worker_embeddings(sync_txid);
+
+-- sync_record_deletes() keys tombstones on "id"; this table's key is worker_id
+CREATE OR REPLACE FUNCTION worker_embeddings_record_deletes() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO sync_tombstones AS t (table_name, row_id, client_company_id)
+    SELECT TG_TABLE_NAME, o.worker_id, sync_row_company(to_jsonb(o)) FROM old_rows o
+    ORDER BY o.worker_id
+    ON CONFLICT (table_name, row_id, client_company_id) DO UPDATE
+    SET sync_txid = EXCLUDED.sync_txid, deleted_at = EXCLUDED.deleted_at, moved = false;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS worker_embeddings_sync_stamp ON worker_embeddings;
+CREATE TRIGGER worker_embeddings_sync_stamp BEFORE INSERT OR UPDATE ON worker_embeddings
+    FOR EACH ROW EXECUTE FUNCTION sync_stamp();
+
+DROP TRIGGER IF EXISTS worker_embeddings_sync_deletes ON worker_embeddings;
+CREATE TRIGGER worker_embeddings_sync_deletes AFTER DELETE ON worker_embeddings
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION worker_embeddings_record_deletes();
+
+-- client_company_id is copied from workers; keep it in step when a worker
+-- moves (upserts, direct SQL), which also re-stamps the template so every
+-- process's index drops it from the old company and loads it in the new one
+CREATE OR REPLACE FUNCTION worker_embeddings_follow_company() RETURNS trigger AS $$
+BEGIN
+    UPDATE worker_embeddings SET client_company_id = NEW.client_company_id
+    WHERE worker_id = NEW.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS workers_embedding_company ON workers;
+CREATE TRIGGER workers_embedding_company AFTER UPDATE ON workers
+    FOR EACH ROW
+    WHEN (OLD.client_company_id IS DISTINCT FROM NEW.client_company_id)
+    EXECUTE FUNCTION worker_embeddings_follow_company();
+
+-- Templates copied before this trigger existed
+UPDATE worker_embeddings e SET client_company_id = w.client_company_id
+FROM workers w
+WHERE w.id = e.worker_id AND e.client_company_id IS DISTINCT FROM w.client_company_id;
+
+COMMIT;
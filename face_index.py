@@ -0,0 +1,279 @@
+"""
+In-memory face embedding index for /api/identify
+Each company's templates (worker_embeddings, see face_embeddings.sql) are
+held as one contiguous float32 matrix of unit vectors, so a batch of
+queries is a single matrix product (cosine similarity) followed by a
+top-k partial sort. Enrollment changes made through this process are
+applied to the index immediately. Changes made elsewhere (other API
+processes, direct SQL) are picked up incrementally from sync_txid and the
+sync tombstones, at most FACE_INDEX_REFRESH_SECONDS after they commit.
+
+Indexes are per API process and loaded on first use: about
+4 * EMBEDDING_DIM bytes per enrolled worker (200 MB for 100k at 512).
+The least recently used companies are dropped beyond FACE_INDEX_CACHE_SIZE.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from sqlalchemy import text
+
+import delta_sync
+
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "512"))
+FACE_MATCH_THRESHOLD = float(os.getenv("FACE_MATCH_THRESHOLD", "0.5"))
+FACE_INDEX_REFRESH_SECONDS = float(os.getenv("FACE_INDEX_REFRESH_SECONDS", "5"))
+FACE_INDEX_CACHE_SIZE = int(os.getenv("FACE_INDEX_CACHE_SIZE", "16"))
+MAX_IDENTIFY_BATCH = int(os.getenv("MAX_IDENTIFY_BATCH", "256"))
+MAX_IDENTIFY_K = 50
+
+# Stored byte order, whatever the host's
+STORED_DTYPE = np.dtype("<f4")
+
+
+def normalize(vectors, dim=EMBEDDING_DIM):
+    """Rows -> float32 unit vectors; ValueError for wrong shape, non-finite or zero rows"""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[np.newaxis, :]
+    if matrix.ndim != 2 or matrix.shape[1] != dim:
+        raise ValueError(f"embeddings must have {dim} dimensions")
+    if not np.isfinite(matrix).all():
+        raise ValueError("embeddings must be finite")
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    if (norms == 0).any():
+        raise ValueError("embeddings must be non-zero")
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+def to_bytes(vector):
+    return np.asarray(vector, dtype=STORED_DTYPE).tobytes()
+
+
+class FaceIndex:
+    """Nearest-neighbour index over one company's unit vectors"""
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+        self._matrix = np.empty((0, dim), dtype=np.float32)   # capacity rows; first len(self) used
+        self._ids = []        # row -> worker id
+        self._rows = {}       # worker id -> row
+        self._lock = threading.Lock()
+        self.token = None     # delta_sync token the contents are current to
+        self.refreshed_at = 0.0
+
+    def __len__(self):
+        return len(self._ids)
+
+    def load(self, ids, matrix):
+        """Replace the contents; matrix rows must already be unit length"""
+        with self._lock:
+            self._matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+            self._ids = list(ids)
+            self._rows = {worker_id: row for row, worker_id in enumerate(self._ids)}
+
+    def add(self, worker_id, vector):
+        """Insert or replace one worker's (unit) vector"""
+        with self._lock:
+            row = self._rows.get(worker_id)
+            if row is None:
+                row = len(self._ids)
+                if row == self._matrix.shape[0]:
+                    # Amortized growth; the used rows stay contiguous
+                    grown = np.empty((max(16, row * 2), self.dim), dtype=np.float32)
+                    grown[:row] = self._matrix[:row]
+                    self._matrix = grown
+                self._ids.append(worker_id)
+                self._rows[worker_id] = row
+            self._matrix[row] = vector
+
+    def remove(self, worker_id):
+        """Drop a worker; the last row moves into the gap"""
+        with self._lock:
+            row = self._rows.pop(worker_id, None)
+            if row is None:
+                return False
+            last = len(self._ids) - 1
+            if row != last:
+                moved = self._ids[last]
+                self._matrix[row] = self._matrix[last]
+                self._ids[row] = moved
+                self._rows[moved] = row
+            self._ids.pop()
+            return True
+
+    def search(self, queries, k=1, threshold=None):
+        """Top-k (worker id, cosine similarity) per query row, best first
+
+        queries must be unit vectors (see normalize); matches below
+        threshold are left out.
+        """
+        with self._lock:
+            count = len(self._ids)
+            if count == 0:
+                return [[] for _ in range(len(queries))]
+            # (queries x dim) @ (dim x count): one BLAS call for the batch
+            scores = queries @ self._matrix[:count].T
+            ids = self._ids[:]
+
+        k = min(k, count)
+        if k == 1:
+            # The common case, and one pass instead of a partition
+            top = scores.argmax(axis=1)[:, np.newaxis]
+        elif k < count:
+            top = np.argpartition(scores, count - k, axis=1)[:, count - k:]
+        else:
+            top = np.broadcast_to(np.arange(count), scores.shape)
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        results = []
+        for rows, row_scores in zip(top.tolist(), top_scores.tolist()):
+            results.append([
+                {"worker_id": ids[row], "score": round(score, 6)}
+                for row, score in zip(rows, row_scores)
+                if threshold is None or score >= threshold
+            ])
+        return results
+
+
+_indexes = OrderedDict()   # company id -> FaceIndex, least recently used first
+_indexes_lock = threading.Lock()
+_load_locks = {}           # company id -> lock so one request loads/refreshes at a time
+
+
+def _load(db, client_company_id, index):
+    token = delta_sync.current_token(db)
+    rows = db.execute(text("""
+        SELECT worker_id, embedding FROM worker_embeddings
+        WHERE client_company_id = :client_company_id AND octet_length(embedding) = :size
+    """), {"client_company_id": client_company_id, "size": 4 * index.dim}).fetchall()
+
+    matrix = np.frombuffer(b"".join(row.embedding for row in rows), dtype=STORED_DTYPE)
+    index.load([str(row.worker_id) for row in rows], matrix.reshape(len(rows), index.dim).astype(np.float32))
+    index.token = token
+
+
+def _refresh(db, client_company_id, index):
+    """Apply changes committed since the index's token"""
+    since_xmin, issued_at = delta_sync.decode_token(index.token)
+    if delta_sync.token_expired(issued_at):
+        # Tombstones may have been pruned
+        _load(db, client_company_id, index)
+        return
+
+    token = delta_sync.current_token(db)
+    # Deletes first: a template re-enrolled after its tombstone is re-added below
+    deleted = db.execute(text("""
+        SELECT row_id FROM sync_tombstones
+        WHERE table_name = 'worker_embeddings' AND sync_txid >= CAST(:since AS xid8)
+    """), {"since": str(since_xmin)}).fetchall()
+    for row in deleted:
+        index.remove(str(row.row_id))
+
+    # Other companies' changes only matter for workers moved out of this
+    # one, so their templates are not read
+    changed = db.execute(text("""
+        SELECT worker_id,
+               CASE WHEN client_company_id = :client_company_id THEN embedding END AS embedding
+        FROM worker_embeddings
+        WHERE sync_txid >= CAST(:since AS xid8)
+    """), {"since": str(since_xmin), "client_company_id": client_company_id}).fetchall()
+    for row in changed:
+        worker_id = str(row.worker_id)
+        if row.embedding is not None and len(row.embedding) == 4 * index.dim:
+            index.add(worker_id, np.frombuffer(row.embedding, dtype=STORED_DTYPE))
+        else:
+            # Another company's (no-op unless it moved from this one), or
+            # re-enrolled with another model size
+            index.remove(worker_id)
+    index.token = token
+
+
+def get_index(db, client_company_id):
+    """The company's index, loaded or refreshed as needed
+
+    A company with no templates is not cached, so arbitrary ids can't
+    evict real indexes from the LRU.
+    """
+    with _indexes_lock:
+        index = _indexes.get(client_company_id)
+        if index is not None:
+            _indexes.move_to_end(client_company_id)
+            if time.monotonic() - index.refreshed_at < FACE_INDEX_REFRESH_SECONDS:
+                return index
+        load_lock = _load_locks.setdefault(client_company_id, threading.Lock())
+
+    with load_lock:
+        if index is not None and time.monotonic() - index.refreshed_at < FACE_INDEX_REFRESH_SECONDS:
+            return index
+        if index is None:
+            index = FaceIndex()
+            _load(db, client_company_id, index)
+            if not len(index):
+                with _indexes_lock:
+                    _load_locks.pop(client_company_id, None)
+                return index
+        else:
+            _refresh(db, client_company_id, index)
+        index.refreshed_at = time.monotonic()
+
+        with _indexes_lock:
+            _indexes[client_company_id] = index
+            _indexes.move_to_end(client_company_id)
+            while len(_indexes) > FACE_INDEX_CACHE_SIZE:
+                evicted, _ = _indexes.popitem(last=False)
+                _load_locks.pop(evicted, None)
+        return index
+
+
+def identify(db, client_company_id, embeddings, k=1, threshold=FACE_MATCH_THRESHOLD):
+    """Best matches per query embedding within one company"""
+    queries = normalize(embeddings)
+    return get_index(db, client_company_id).search(queries, k, threshold)
+
+
+def enroll(db, worker_id, embedding, model=None):
+    """Store (or replace) a worker's template and apply it to the local index"""
+    vector = normalize(embedding)[0]
+    row = db.execute(text("""
+        INSERT INTO worker_embeddings (worker_id, client_company_id, embedding, model)
+        SELECT id, client_company_id, :embedding, :model FROM workers WHERE id = :worker_id
+        ON CONFLICT (worker_id) DO UPDATE
+        SET client_company_id = EXCLUDED.client_company_id, embedding = EXCLUDED.embedding,
+            model = EXCLUDED.model, updated_at = NOW()
+        RETURNING worker_id, client_company_id, model, created_at, updated_at
+    """), {"worker_id": worker_id, "embedding": to_bytes(vector), "model": model}).fetchone()
+    db.commit()
+    if row is None:
+        return None
+
+    company = str(row.client_company_id)
+    with _indexes_lock:
+        cached = list(_indexes.items())
+    for cached_company, index in cached:
+        if cached_company == company:
+            index.add(str(row.worker_id), vector)
+        else:
+            index.remove(str(row.worker_id))
+    return row
+
+
+def unenroll(db, worker_id):
+    """Delete a worker's template; returns whether one existed"""
+    row = db.execute(text("""
+        DELETE FROM worker_embeddings WHERE worker_id = :worker_id RETURNING worker_id
+    """), {"worker_id": worker_id}).fetchone()
+    db.commit()
+    if row is None:
+        return False
+    with _indexes_lock:
+        cached = list(_indexes.values())
+    for index in cached:
+        index.remove(str(row.worker_id))
+    return True
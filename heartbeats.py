@@ -0,0 +1,144 @@
+"""
+Device heartbeat tracking
+Heartbeats are recorded in memory only; a background task flushes
+coalesced last_seen values to devices in one UPDATE per interval, and a
+set-based sweep marks devices offline once their last_seen passes the
+timeout. Each device is persisted at most once per
+HEARTBEAT_PERSIST_INTERVAL (or when it comes back online), so 10k devices
+beating every 5s cost a few statements per flush instead of 2k UPDATEs/s.
+
+The offline sweep runs against the database, so it stays correct when
+heartbeats from one device land on different API workers.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from sqlalchemy import text
+from database import SessionLocal
+from metrics import HEARTBEATS_TOTAL, HEARTBEAT_FLUSHED_ROWS, HEARTBEAT_TRACKED_DEVICES
+
+logger = logging.getLogger("critikality.heartbeats")
+
+HEARTBEAT_FLUSH_INTERVAL = float(os.getenv("HEARTBEAT_FLUSH_INTERVAL", "5"))
+HEARTBEAT_PERSIST_INTERVAL = float(os.getenv("HEARTBEAT_PERSIST_INTERVAL", "30"))
+HEARTBEAT_TIMEOUT = float(os.getenv("HEARTBEAT_TIMEOUT", "90"))
+MAX_TRACKED_DEVICES = int(os.getenv("HEARTBEAT_MAX_DEVICES", "50000"))
+
+if HEARTBEAT_TIMEOUT <= HEARTBEAT_PERSIST_INTERVAL + HEARTBEAT_FLUSH_INTERVAL:
+    logger.warning("HEARTBEAT_TIMEOUT should exceed persist + flush intervals or live devices will flap offline")
+
+
+class HeartbeatTracker:
+    """In-memory last-seen table with dirty tracking for batched writes"""
+
+    def __init__(self, persist_interval=HEARTBEAT_PERSIST_INTERVAL, max_devices=MAX_TRACKED_DEVICES):
+        self.persist_interval = persist_interval
+        self.max_devices = max_devices
+        self._lock = threading.Lock()
+        self._last_seen = {}       # device_id -> (monotonic, wall clock datetime)
+        self._persisted_at = {}    # device_id -> monotonic time of last DB write
+        self._dirty = {}           # device_id -> wall clock datetime to write
+
+    def beat(self, device_id):
+        """Record a heartbeat; returns False when the table is full"""
+        now = time.monotonic()
+        seen_at = datetime.now(timezone.utc)
+        with self._lock:
+            if device_id not in self._last_seen and len(self._last_seen) >= self.max_devices:
+                return False
+            self._last_seen[device_id] = (now, seen_at)
+            persisted = self._persisted_at.get(device_id)
+            if persisted is None or now - persisted >= self.persist_interval:
+                self._dirty[device_id] = seen_at
+        HEARTBEATS_TOTAL.inc()
+        return True
+
+    def last_seen(self, device_id):
+        with self._lock:
+            entry = self._last_seen.get(device_id)
+        return entry[1] if entry else None
+
+    def take_dirty(self):
+        """Swap out pending writes and mark them persisted"""
+        now = time.monotonic()
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            for device_id in dirty:
+                self._persisted_at[device_id] = now
+        return dirty
+
+    def restore_dirty(self, dirty):
+        """Put back writes from a failed flush (newer beats win)"""
+        with self._lock:
+            for device_id, seen_at in dirty.items():
+                self._dirty.setdefault(device_id, seen_at)
+                self._persisted_at.pop(device_id, None)
+
+    def evict_stale(self, timeout=HEARTBEAT_TIMEOUT):
+        """Forget devices silent for longer than the timeout"""
+        cutoff = time.monotonic() - timeout
+        with self._lock:
+            stale = [d for d, (seen, _) in self._last_seen.items() if seen < cutoff]
+            for device_id in stale:
+                self._last_seen.pop(device_id, None)
+                self._persisted_at.pop(device_id, None)
+            HEARTBEAT_TRACKED_DEVICES.set(len(self._last_seen))
+        return len(stale)
+
+
+tracker = HeartbeatTracker()
+
+
+def flush(db, dirty):
+    """Write coalesced last_seen values and mark timed-out devices offline"""
+    if dirty:
+        device_ids = list(dirty)
+        db.execute(text("""
+            UPDATE devices d
+            SET last_seen = GREATEST(d.last_seen, v.seen_at),
+                connection_status = 'online'
+            FROM unnest(CAST(:device_ids AS uuid[]), CAST(:seen_at AS timestamptz[])) AS v(id, seen_at)
+            WHERE d.id = v.id
+        """), {"device_ids": device_ids, "seen_at": [dirty[d] for d in device_ids]})
+
+    offline = db.execute(text("""
+        UPDATE devices
+        SET connection_status = 'offline'
+        WHERE connection_status = 'online'
+          AND last_seen < NOW() - make_interval(secs => :timeout)
+        RETURNING id
+    """), {"timeout": HEARTBEAT_TIMEOUT}).fetchall()
+    db.commit()
+
+    HEARTBEAT_FLUSHED_ROWS.inc(len(dirty))
+    return len(offline)
+
+
+def _flush_once():
+    dirty = tracker.take_dirty()
+    db = SessionLocal()
+    try:
+        offline = flush(db, dirty)
+    except Exception:
+        db.rollback()
+        tracker.restore_dirty(dirty)
+        raise
+    finally:
+        db.close()
+    tracker.evict_stale()
+    if offline:
+        logger.info("Marked %d devices offline", offline)
+
+
+async def flush_loop():
+    """Background task started with the API"""
+    while True:
+        await asyncio.sleep(HEARTBEAT_FLUSH_INTERVAL)
+        try:
+            await asyncio.to_thread(_flush_once)
+        except Exception as e:
+            logger.warning("Heartbeat flush failed: %s", e)
@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""
+Critikality background jobs
+Long-running work (imports, report exports, license batches) is queued in
+the jobs table (see jobs.sql) by /api/jobs and executed by a pool of
+worker processes, off the request path and across cores. Workers claim
+jobs with FOR UPDATE SKIP LOCKED, report progress (which doubles as a
+heartbeat) and store a small JSON result, a result file, or both. Result
+files are written to local scratch space and then stored in job_results
+(in JOB_RESULT_CHUNK_BYTES pieces), so any API host can stream any job's
+download whichever host ran it.
+
+Workers run as their own service (`python jobs.py`, on as many hosts as
+needed). The API starts JOB_WORKERS processes of its own, 0 by default,
+so uvicorn workers and replicas don't each fork a pool.
+
+A job that raises ValueError fails immediately (bad parameters). Any
+other error, or a worker that stops heartbeating, puts the job back in
+the queue until JOB_MAX_ATTEMPTS is reached. A thread heartbeats every
+JOB_HEARTBEAT_SECONDS while a handler runs, so one long statement doesn't
+look like a dead worker. Every write about a job is fenced on the claim
+(worker and attempt): a run whose job was re-claimed can't overwrite the
+new run's progress or outcome, and its result is rolled back. Handlers
+must still be safe to re-run, since both runs may do their work.
+
+    python jobs.py               # run a pool of JOB_WORKERS processes
+    python jobs.py --workers 4
+"""
+
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import re
+import socket
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from contextlib import contextmanager
+from datetime import date, timedelta
+from sqlalchemy import text
+from database import SessionLocal
+
+logger = logging.getLogger("critikality.jobs")
+
+# Worker processes started with the API; workers normally run as `python jobs.py`
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "0"))
+JOB_RESULT_CHUNK_BYTES = int(os.getenv("JOB_RESULT_CHUNK_BYTES", str(1024 * 1024)))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "300"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", str(JOB_STALE_SECONDS / 5)))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+# Minimum seconds between progress writes
+PROGRESS_INTERVAL = 1.0
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+ASSIGN_BATCH_ROWS = 1000
+EXPORT_BATCH_ROWS = 5000
+SAFE_NAME = re.compile(r"[A-Za-z0-9_][A-Za-z0-9._-]*")
+
+
+# Matches a job only while this claim (worker, attempt) still holds it
+CLAIMED = "id = :id AND worker = :worker AND attempts = :attempts AND status = 'running'"
+
+
+def claim_params(job):
+    return {"id": str(job.id), "worker": job.worker, "attempts": job.attempts}
+
+
+class Progress:
+    """Throttled progress writer for one job; also refreshes its heartbeat"""
+
+    def __init__(self, job):
+        self.claim = claim_params(job)
+        self._last_write = 0.0
+
+    def __call__(self, fraction, message=None, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_write < PROGRESS_INTERVAL:
+            return
+        self._last_write = now
+        # Own session: the handler's transaction is still open
+        db = SessionLocal()
+        try:
+            db.execute(text(f"""
+                UPDATE jobs
+                SET progress = :progress, progress_message = :message, heartbeat_at = NOW()
+                WHERE {CLAIMED}
+            """), {**self.claim, "progress": max(0.0, min(1.0, fraction)), "message": message})
+            db.commit()
+        finally:
+            db.close()
+
+
+class Heartbeat:
+    """Refreshes a claimed job's heartbeat from a thread while its handler runs"""
+
+    def __init__(self, job):
+        self.claim = claim_params(job)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"heartbeat-{job.id}", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(JOB_HEARTBEAT_SECONDS):
+            db = SessionLocal()
+            try:
+                db.execute(text(f"UPDATE jobs SET heartbeat_at = NOW() WHERE {CLAIMED}"), self.claim)
+                db.commit()
+            except Exception as e:
+                logger.warning("Job %s heartbeat failed: %s", self.claim["id"], e)
+            finally:
+                db.close()
+
+
+def result_file(job_id, suffix):
+    """Local scratch path for a result file; run_job stores it and removes it"""
+    return os.path.join(tempfile.gettempdir(), f"critikality-job-{job_id}{suffix}")
+
+
+@contextmanager
+def scratch_file(path):
+    """Write to path + ".tmp" and move it into place on success; removed if the write fails"""
+    scratch = path + ".tmp"
+    try:
+        yield scratch
+        os.replace(scratch, path)
+    finally:
+        if os.path.exists(scratch):
+            os.remove(scratch)
+
+
+def store_result_file(db, job_id, path):
+    """Copy a result file into job_results in the caller's transaction; returns its size"""
+    db.execute(text("DELETE FROM job_results WHERE job_id = :id"), {"id": job_id})
+    size = 0
+    with open(path, "rb") as f:
+        for seq, chunk in enumerate(iter(lambda: f.read(JOB_RESULT_CHUNK_BYTES), b"")):
+            db.execute(text("""
+                INSERT INTO job_results (job_id, seq, data) VALUES (:id, :seq, :data)
+            """), {"id": job_id, "seq": seq, "data": chunk})
+            size += len(chunk)
+    return size
+
+
+def read_result_chunks(job_id):
+    """Yield a stored result file one chunk (and one short query) at a time"""
+    db = SessionLocal()
+    try:
+        seq = 0
+        while True:
+            chunk = db.execute(text("""
+                SELECT data FROM job_results WHERE job_id = :id AND seq = :seq
+            """), {"id": job_id, "seq": seq}).scalar()
+            db.rollback()   # don't sit in a transaction while the client reads
+            if chunk is None:
+                return
+            yield bytes(chunk)
+            seq += 1
+    finally:
+        db.close()
+
+
+# Job handlers: handler(db, job_id, params, progress) -> (result, result_path)
+
+def assign_worker_sites(db, job_id, params, progress):
+    """Bulk worker_sites insert; params: {"assignments": [{"worker_id", "site_id"}]}"""
+    assignments = params.get("assignments")
+    if not isinstance(assignments, list) or not all(isinstance(a, dict) for a in assignments):
+        raise ValueError("assignments must be a list of objects")
+
+    created = 0
+    for start in range(0, len(assignments), ASSIGN_BATCH_ROWS):
+        batch = assignments[start:start + ASSIGN_BATCH_ROWS]
+        result = db.execute(text("""
+            INSERT INTO worker_sites (id, worker_id, site_id, created_at)
+            SELECT gen_random_uuid(), a.worker_id, a.site_id, NOW()
+            FROM unnest(CAST(:worker_ids AS uuid[]), CAST(:site_ids AS uuid[])) AS a(worker_id, site_id)
+            ON CONFLICT (site_id, worker_id) DO NOTHING
+        """), {
+            "worker_ids": [a.get("worker_id") for a in batch],
+            "site_ids": [a.get("site_id") for a in batch],
+        })
+        created += result.rowcount
+        progress(created / len(assignments), f"{created} of {len(assignments)} assignments")
+
+    # One transaction, so a retried job never leaves half an import behind
+    db.commit()
+    return {"created": created}, None
+
+
+def import_workers(db, job_id, params, progress):
+    """Idempotent worker upserts in chunks; params: {"changes": [...]} (see upserts.py)"""
+    from upserts import MAX_UPSERT_BATCH, WORKERS, apply_changes
+
+    changes = params.get("changes")
+    if not isinstance(changes, list):
+        raise ValueError("changes must be a list")
+
+    counts = {}
+    for start in range(0, len(changes), MAX_UPSERT_BATCH):
+        outcome = apply_changes(db, WORKERS, changes[start:start + MAX_UPSERT_BATCH])
+        for status, count in outcome["counts"].items():
+            counts[status] = counts.get(status, 0) + count
+        done = min(start + MAX_UPSERT_BATCH, len(changes))
+        progress(done / len(changes), f"{done} of {len(changes)} changes")
+    return {"counts": counts}, None
+
+
+def export_report(db, job_id, params, progress):
+    """Presence report as CSV; params as /api/reports plus "report": attendance | zone_dwell"""
+    import reports
+
+    report = params.get("report")
+    try:
+        start = date.fromisoformat(params["from"])
+        end = date.fromisoformat(params["to"])
+        company_id = params["client_company_id"]
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("client_company_id, from and to (YYYY-MM-DD) are required")
+    if end < start:
+        raise ValueError("'to' must not be before 'from'")
+
+    worker_id = params.get("worker_id")
+    zone_id = params.get("zone_id")
+    live = bool(params.get("live"))
+    if report == "attendance":
+        query, columns = reports.attendance_query(worker_id, live), reports.ATTENDANCE_COLUMNS
+    elif report == "zone_dwell":
+        query, columns = reports.zone_dwell_query(worker_id, zone_id, live), reports.ZONE_DWELL_COLUMNS
+    else:
+        raise ValueError("report must be attendance or zone_dwell")
+
+    query_params = reports.presence_params(start, end + timedelta(days=1))
+    query_params.update({"company_id": company_id, "worker_id": worker_id, "zone_id": zone_id})
+
+    path = result_file(job_id, ".csv")
+    rows = 0
+    days = (end - start).days + 1
+    with scratch_file(path) as scratch:
+        with open(scratch, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            result = db.execute(query, query_params, execution_options={"stream_results": True})
+            for batch in result.partitions(EXPORT_BATCH_ROWS):
+                writer.writerows(batch)
+                rows += len(batch)
+                # Rows come ordered by day, so the last day written is how far along we are
+                done = (batch[-1].day - start).days + 1
+                progress(done / days, f"{rows} rows written, {done} of {days} days")
+    return {"rows": rows, "filename": f"{report}_{start}_{end}.csv"}, path
+
+
+def generate_licenses(db, job_id, params, progress):
+    """Sign a batch of licenses; params: {"licenses": [LicenseRequest fields]}"""
+    from license_system.generate_license import LicenseGenerator
+
+    requests = params.get("licenses")
+    if not isinstance(requests, list) or not requests:
+        raise ValueError("licenses must be a non-empty list")
+
+    generator = LicenseGenerator(os.getenv("LICENSE_PRIVATE_KEY_PATH", "private_key.pem"))
+    path = result_file(job_id, ".zip")
+    generated = []
+    with scratch_file(path) as scratch, zipfile.ZipFile(scratch, "w", zipfile.ZIP_DEFLATED) as archive:
+        for index, request in enumerate(requests):
+            try:
+                site_id = request["site_id"]
+                license_data = generator.sign_license(
+                    customer=request["customer_name"],
+                    site_id=site_id,
+                    jetson_serial=request["jetson_serial"],
+                    duration_months=request.get("duration_months", 12),
+                    max_cameras=request.get("max_cameras", 4),
+                    features=request.get("features", ["face_recognition", "liveness", "reports"])
+                )
+            except (KeyError, TypeError):
+                raise ValueError(f"licenses[{index}] needs customer_name, site_id and jetson_serial")
+            if not isinstance(site_id, str) or not SAFE_NAME.fullmatch(site_id):
+                raise ValueError(f"licenses[{index}].site_id may only contain letters, digits, '.', '_' and '-'")
+            # Signed straight into the archive; nothing is written to the working directory
+            filename = f"{site_id}.lic"
+            archive.writestr(filename, json.dumps(license_data, indent=2))
+            generated.append(filename)
+            progress((index + 1) / len(requests), f"{index + 1} of {len(requests)} licenses")
+    return {"generated": generated, "filename": f"licenses_{job_id}.zip"}, path
+
+
+JOB_KINDS = {
+    "worker_sites.assign": assign_worker_sites,
+    "workers.import": import_workers,
+    "reports.export": export_report,
+    "licenses.generate": generate_licenses,
+}
+
+
+def submit(db, kind, params):
+    """Queue a job and return its row"""
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind '{kind}' (expected one of: {', '.join(sorted(JOB_KINDS))})")
+    result = db.execute(text("""
+        INSERT INTO jobs (id, kind, params, status)
+        VALUES (:id, :kind, CAST(:params AS jsonb), 'queued')
+        RETURNING *
+    """), {"id": str(uuid.uuid4()), "kind": kind, "params": json.dumps(params)})
+    row = result.fetchone()
+    db.commit()
+    return row
+
+
+def claim(db, worker):
+    """Take the oldest runnable job (queued, or running with a stale heartbeat)"""
+    row = db.execute(text("""
+        UPDATE jobs
+        SET status = 'running', attempts = attempts + 1, worker = :worker,
+            started_at = NOW(), heartbeat_at = NOW(), progress = 0, progress_message = NULL
+        WHERE id = (
+            SELECT id FROM jobs
+            WHERE (status = 'queued'
+                   OR (status = 'running' AND heartbeat_at < NOW() - make_interval(secs => :stale)))
+              AND attempts < :max_attempts
+            ORDER BY created_at
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        RETURNING id, kind, params, attempts, worker
+    """), {"worker": worker, "stale": JOB_STALE_SECONDS, "max_attempts": JOB_MAX_ATTEMPTS}).fetchone()
+    db.commit()
+    return row
+
+
+def fail_abandoned(db):
+    """Fail stale running jobs that have no attempts left"""
+    db.execute(text("""
+        UPDATE jobs
+        SET status = 'failed', finished_at = NOW(),
+            error = COALESCE(error, 'Worker stopped responding')
+        WHERE status = 'running'
+          AND heartbeat_at < NOW() - make_interval(secs => :stale)
+          AND attempts >= :max_attempts
+    """), {"stale": JOB_STALE_SECONDS, "max_attempts": JOB_MAX_ATTEMPTS})
+    db.commit()
+
+
+def run_job(db, job):
+    progress = Progress(job)
+    handler = JOB_KINDS.get(job.kind)
+    result_path = None
+    try:
+        if handler is None:
+            raise ValueError(f"Unknown job kind '{job.kind}'")
+        with Heartbeat(job):
+            result, result_path = handler(db, str(job.id), job.params or {}, progress)
+            result_size = store_result_file(db, str(job.id), result_path) if result_path else None
+    except Exception as e:
+        db.rollback()
+        retry = not isinstance(e, ValueError) and job.attempts < JOB_MAX_ATTEMPTS
+        logger.warning("Job %s (%s) failed on attempt %d: %s", job.id, job.kind, job.attempts, e)
+        db.execute(text(f"""
+            UPDATE jobs
+            SET status = :status, error = :error,
+                finished_at = CASE WHEN :status = 'failed' THEN NOW() END
+            WHERE {CLAIMED}
+        """), {**claim_params(job), "status": QUEUED if retry else FAILED, "error": str(e)})
+        db.commit()
+        return
+    finally:
+        if result_path and os.path.exists(result_path):
+            os.unlink(result_path)
+
+    # Same transaction as the stored file: a job never succeeds without it
+    finished = db.execute(text(f"""
+        UPDATE jobs
+        SET status = 'succeeded', progress = 1, error = NULL, finished_at = NOW(),
+            result = CAST(:result AS jsonb), result_size = :result_size
+        WHERE {CLAIMED}
+    """), {**claim_params(job), "result": json.dumps(result, default=str), "result_size": result_size})
+    if finished.rowcount == 0:
+        # Re-claimed after a missed heartbeat; the newer run owns the outcome
+        db.rollback()
+        logger.warning("Job %s (%s) attempt %d lost its claim; result discarded", job.id, job.kind, job.attempts)
+        return
+    db.commit()
+
+
+def work(name):
+    """Worker process main loop"""
+    logging.basicConfig(level=logging.INFO)
+    while True:
+        db = SessionLocal()
+        try:
+            job = claim(db, name)
+            if job is None:
+                fail_abandoned(db)
+            else:
+                run_job(db, job)
+        except Exception as e:
+            logger.warning("Job worker %s: %s", name, e)
+            job = None
+        finally:
+            db.close()
+        if job is None:
+            time.sleep(JOB_POLL_INTERVAL)
+
+
+def start_pool(workers):
+    """Start worker processes; spawn keeps them clear of the parent's event loop and pool"""
+    context = multiprocessing.get_context("spawn")
+    host = socket.gethostname()
+    processes = []
+    for index in range(workers):
+        process = context.Process(
+            target=work, args=(f"{host}:{os.getpid()}:{index}",), name=f"job-worker-{index}", daemon=True
+        )
+        process.start()
+        processes.append(process)
+    return processes
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run background job workers')
+    parser.add_argument('--workers', type=int, default=max(JOB_WORKERS, os.cpu_count() or 1),
+                        help='Worker processes (default: JOB_WORKERS or CPU count)')
+
+    args = parser.parse_args()
+
+    processes = start_pool(args.workers)
+    print(f"✅ {len(processes)} job workers running")
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
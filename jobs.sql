@@ -0,0 +1,36 @@
+-- Background jobs for /api/jobs (see jobs.py)
+-- Workers claim queued jobs with FOR UPDATE SKIP LOCKED, so any number of
+-- worker processes on any number of hosts can share the table. A running
+-- job whose heartbeat goes stale (worker died) is claimed again until it
+-- runs out of attempts. Result files live in job_results, not on the
+-- worker's disk, so a download can be served by any API host.
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id UUID PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params JSONB NOT NULL DEFAULT '{}'::jsonb,
+    status TEXT NOT NULL DEFAULT 'queued',      -- queued | running | succeeded | failed
+    progress REAL NOT NULL DEFAULT 0,           -- 0..1
+    progress_message TEXT,
+    result JSONB,
+    result_size BIGINT,                         -- bytes in job_results; NULL when there is no file
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    started_at TIMESTAMPTZ,
+    heartbeat_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ
+);
+
+-- Claim order; running jobs are included for the stale-heartbeat check
+CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs(created_at) WHERE status IN ('queued', 'running');
+CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs(created_at DESC);
+
+-- Result files in chunks, streamed back in seq order on download
+CREATE TABLE IF NOT EXISTS job_results (
+    job_id UUID NOT NULL REFERENCES jobs(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    data BYTEA NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
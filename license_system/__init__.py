@@ -0,0 +1,17 @@
+"""
+Critikality license system
+LicenseGenerator signs licenses (server side), LicenseValidator checks them
+(Jetson side). Both load keys and the cryptography backends on first use.
+"""
+
+__all__ = ["LicenseGenerator", "LicenseValidator"]
+
+
+def __getattr__(name):
+    if name == "LicenseGenerator":
+        from license_system.generate_license import LicenseGenerator
+        return LicenseGenerator
+    if name == "LicenseValidator":
+        from license_system.validate_license import LicenseValidator
+        return LicenseValidator
+    raise AttributeError(f"module 'license_system' has no attribute {name!r}")
@@ -7,18 +7,23 @@ Run this on your development machine to create customer licenses
 import json
 import argparse
 from datetime import datetime, timedelta
-from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import rsa, padding
-from cryptography.hazmat.backends import default_backend
 import base64
 
+# cryptography is imported inside the methods that need it so that importing
+# this module (e.g. from the API routers) does not load the crypto backends.
+
 class LicenseGenerator:
-    def __init__(self):
+    def __init__(self, private_key_path='private_key.pem'):
+        self.private_key_path = private_key_path
         self.private_key = None
         self.public_key = None
     
     def generate_keys(self):
         """Generate RSA key pair (run once, save keys securely)"""
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        from cryptography.hazmat.backends import default_backend
+        
         print("Generating RSA-2048 key pair...")
         self.private_key = rsa.generate_private_key(
             public_exponent=65537,
@@ -28,7 +33,7 @@ class LicenseGenerator:
         self.public_key = self.private_key.public_key()
         
         # Save private key (KEEP SECRET!)
-        with open('private_key.pem', 'wb') as f:
+        with open(self.private_key_path, 'wb') as f:
             f.write(self.private_key.private_bytes(
                 encoding=serialization.Encoding.PEM,
                 format=serialization.PrivateFormat.PKCS8,
@@ -43,20 +48,29 @@ class LicenseGenerator:
             ))
         
         print("✅ Keys generated:")
-        print("   - private_key.pem (KEEP SECRET - used to generate licenses)")
+        print(f"   - {self.private_key_path} (KEEP SECRET - used to generate licenses)")
         print("   - public_key.pem (ship with software - used to validate)")
     
     def load_private_key(self):
         """Load existing private key"""
-        with open('private_key.pem', 'rb') as f:
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.backends import default_backend
+        
+        with open(self.private_key_path, 'rb') as f:
             self.private_key = serialization.load_pem_private_key(
                 f.read(),
                 password=None,
                 backend=default_backend()
             )
     
-    def create_license(self, customer, site_id, jetson_serial, duration_months, max_cameras, features):
-        """Create a signed license file"""
+    def sign_license(self, customer, site_id, jetson_serial, duration_months, max_cameras, features):
+        """Build and sign a license, returning it as a dict"""
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding
+        
+        # Key is loaded on first use rather than at construction
+        if self.private_key is None:
+            self.load_private_key()
         
         # Calculate dates
         issued = datetime.now()
@@ -86,10 +100,16 @@ class LicenseGenerator:
         )
         
         # Create final license with signature
-        final_license = {
+        return {
             **license_data,
             "signature": base64.b64encode(signature).decode()
         }
+    
+    def create_license(self, customer, site_id, jetson_serial, duration_months, max_cameras, features):
+        """Create a signed license file"""
+        final_license = self.sign_license(
+            customer, site_id, jetson_serial, duration_months, max_cameras, features
+        )
         
         # Save to file
         filename = f"{site_id}.lic"
@@ -101,7 +121,7 @@ class LicenseGenerator:
         print(f"   Site: {site_id}")
         print(f"   Jetson: {jetson_serial}")
         print(f"   Cameras: {max_cameras}")
-        print(f"   Valid until: {expiration.strftime('%Y-%m-%d')}")
+        print(f"   Valid until: {final_license['expiration_date']}")
         
         return filename
 
@@ -115,10 +135,11 @@ def main():
     parser.add_argument('--duration', type=int, default=12, help='License duration in months')
     parser.add_argument('--features', nargs='+', default=['face_recognition', 'liveness', 'reports'],
                        help='Enabled features')
+    parser.add_argument('--private-key', default='private_key.pem', help='Path to private key')
     
     args = parser.parse_args()
     
-    generator = LicenseGenerator()
+    generator = LicenseGenerator(args.private_key)
     
     if args.generate_keys:
         generator.generate_keys()
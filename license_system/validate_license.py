@@ -6,19 +6,39 @@ Runs on Jetson to validate license files
 
 import json
 import base64
+import csv
+import glob
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import padding
-from cryptography.hazmat.backends import default_backend
 from pathlib import Path
 
+# cryptography is imported where a key is parsed or a signature verified, so
+# importing this module stays cheap until a validator is actually built.
+
+# Audit statuses reported by check_license / batch mode
+STATUS_VALID = "valid"
+STATUS_GRACE = "grace"
+STATUS_EXPIRED = "expired"
+STATUS_WRONG_HARDWARE = "wrong_hardware"
+STATUS_TAMPERED = "tampered"
+STATUS_UNREADABLE = "unreadable"
+
 class LicenseValidator:
-    def __init__(self, public_key_path='public_key.pem'):
-        with open(public_key_path, 'rb') as f:
-            self.public_key = serialization.load_pem_public_key(
-                f.read(),
-                backend=default_backend()
-            )
+    def __init__(self, public_key_path='public_key.pem', public_key_pem=None):
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.backends import default_backend
+        
+        if public_key_pem is None:
+            with open(public_key_path, 'rb') as f:
+                public_key_pem = f.read()
+        self.public_key = serialization.load_pem_public_key(
+            public_key_pem,
+            backend=default_backend()
+        )
     
     def get_hardware_id(self):
         """Get Jetson serial number (hardware fingerprint)"""
@@ -46,30 +66,38 @@ class LicenseValidator:
         except:
             return "UNKNOWN"
     
+    def _verify(self, license_data, signature):
+        """Verify RSA signature, raising on failure"""
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding
+        
+        license_json = json.dumps(license_data, sort_keys=True)
+        signature_bytes = base64.b64decode(signature)
+        
+        self.public_key.verify(
+            signature_bytes,
+            license_json.encode(),
+            padding.PSS(
+                mgf=padding.MGF1(hashes.SHA256()),
+                salt_length=padding.PSS.MAX_LENGTH
+            ),
+            hashes.SHA256()
+        )
+    
     def validate_signature(self, license_data, signature):
         """Verify RSA signature"""
         try:
-            license_json = json.dumps(license_data, sort_keys=True)
-            signature_bytes = base64.b64decode(signature)
-            
-            self.public_key.verify(
-                signature_bytes,
-                license_json.encode(),
-                padding.PSS(
-                    mgf=padding.MGF1(hashes.SHA256()),
-                    salt_length=padding.PSS.MAX_LENGTH
-                ),
-                hashes.SHA256()
-            )
+            self._verify(license_data, signature)
             return True
         except Exception as e:
             print(f"❌ Signature validation failed: {e}")
             return False
     
-    def validate_license(self, license_path, grace_days=7):
+    def check_license(self, license_path, grace_days=7, hardware_id=None):
         """
-        Validate license file
-        Returns: (valid, status_message, license_data)
+        Check license file without printing
+        The hardware check is skipped when hardware_id is None
+        Returns: (status, status_message, license_data)
         """
         
         # Load license file
@@ -77,27 +105,33 @@ class LicenseValidator:
             with open(license_path, 'r') as f:
                 license_full = json.load(f)
         except Exception as e:
-            return False, f"Cannot read license file: {e}", None
+            return STATUS_UNREADABLE, f"Cannot read license file: {e}", None
+        if not isinstance(license_full, dict):
+            return STATUS_UNREADABLE, "License file is not a JSON object", None
         
         # Extract signature
         signature = license_full.pop('signature', None)
         if not signature:
-            return False, "License file is missing signature", None
+            return STATUS_TAMPERED, "License file is missing signature", None
         
         # Verify signature
-        if not self.validate_signature(license_full, signature):
-            return False, "License signature is invalid (tampered or corrupted)", None
+        try:
+            self._verify(license_full, signature)
+        except Exception:
+            return STATUS_TAMPERED, "License signature is invalid (tampered or corrupted)", None
         
         # Check hardware ID
-        current_hw_id = self.get_hardware_id()
         licensed_hw_id = license_full.get('jetson_serial', '')
         
-        if current_hw_id != licensed_hw_id and licensed_hw_id != "DEMO":
-            return False, f"License is for different hardware (expected {licensed_hw_id}, got {current_hw_id})", license_full
+        if hardware_id is not None and hardware_id != licensed_hw_id and licensed_hw_id != "DEMO":
+            return STATUS_WRONG_HARDWARE, f"License is for different hardware (expected {licensed_hw_id}, got {hardware_id})", license_full
         
         # Check expiration
         expiration_str = license_full.get('expiration_date')
-        expiration = datetime.strptime(expiration_str, "%Y-%m-%d")
+        try:
+            expiration = datetime.strptime(expiration_str, "%Y-%m-%d")
+        except (TypeError, ValueError):
+            return STATUS_UNREADABLE, f"License has invalid expiration date: {expiration_str}", license_full
         now = datetime.now()
         days_remaining = (expiration - now).days
         
@@ -105,15 +139,28 @@ class LicenseValidator:
             # Expired - check grace period
             days_expired = abs(days_remaining)
             if days_expired <= grace_days:
-                return True, f"⚠️  LICENSE EXPIRED {days_expired} days ago (grace period active)", license_full
+                return STATUS_GRACE, f"⚠️  LICENSE EXPIRED {days_expired} days ago (grace period active)", license_full
             else:
-                return False, f"License expired {days_expired} days ago (grace period ended)", license_full
+                return STATUS_EXPIRED, f"License expired {days_expired} days ago (grace period ended)", license_full
         
         # Valid license
         if days_remaining <= 30:
-            return True, f"✅ License valid ({days_remaining} days remaining - renewal recommended)", license_full
+            return STATUS_VALID, f"✅ License valid ({days_remaining} days remaining - renewal recommended)", license_full
         else:
-            return True, f"✅ License valid (expires {expiration_str})", license_full
+            return STATUS_VALID, f"✅ License valid (expires {expiration_str})", license_full
+    
+    def validate_license(self, license_path, grace_days=7):
+        """
+        Validate license file
+        Returns: (valid, status_message, license_data)
+        """
+        status, message, license_full = self.check_license(
+            license_path,
+            grace_days=grace_days,
+            hardware_id=self.get_hardware_id()
+        )
+        
+        return status in (STATUS_VALID, STATUS_GRACE), message, license_full
     
     def get_license_info(self, license_path):
         """Get license information for display"""
@@ -139,16 +186,128 @@ class LicenseValidator:
             "hardware_id": data.get('jetson_serial', 'Unknown')
         }
 
+# Columns emitted by batch mode, in report order
+BATCH_FIELDS = ['file', 'status', 'message', 'customer', 'site_id',
+                'jetson_serial', 'expiration_date']
+
+# Per-process validator for batch mode (public key is parsed once per worker)
+_batch_validator = None
+_batch_options = {}
+
+def _init_batch_worker(public_key_pem, grace_days, hardware_id):
+    global _batch_validator, _batch_options
+    _batch_validator = LicenseValidator(public_key_pem=public_key_pem)
+    _batch_options = {"grace_days": grace_days, "hardware_id": hardware_id}
+
+def _check_batch_file(license_path):
+    status, message, data = _batch_validator.check_license(license_path, **_batch_options)
+    data = data or {}
+    return {
+        "file": license_path,
+        "status": status,
+        "message": message,
+        "customer": data.get('customer'),
+        "site_id": data.get('site_id'),
+        "jetson_serial": data.get('jetson_serial'),
+        "expiration_date": data.get('expiration_date')
+    }
+
+def find_license_files(target):
+    """Expand a directory (searched recursively for .lic files) or a glob"""
+    if os.path.isdir(target):
+        return sorted(str(p) for p in Path(target).rglob('*.lic'))
+    return sorted(glob.glob(target, recursive=True))
+
+def validate_batch(license_files, public_key_path='public_key.pem', grace_days=7,
+                   hardware_id=None, workers=None):
+    """
+    Check many license files, loading the public key once per worker process
+    Yields one report row per file, in input order
+    """
+    with open(public_key_path, 'rb') as f:
+        public_key_pem = f.read()
+    
+    if workers == 1 or len(license_files) <= 1:
+        _init_batch_worker(public_key_pem, grace_days, hardware_id)
+        yield from map(_check_batch_file, license_files)
+        return
+    
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, min(64, len(license_files) // (workers * 4)))
+    
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_batch_worker,
+        initargs=(public_key_pem, grace_days, hardware_id)
+    ) as pool:
+        yield from pool.map(_check_batch_file, license_files, chunksize=chunksize)
+
+def run_batch(args):
+    """Stream a JSON Lines or CSV audit report and print a throughput summary"""
+    license_files = find_license_files(args.batch)
+    out = open(args.output, 'w', newline='') if args.output else sys.stdout
+    counts = Counter()
+    start = time.perf_counter()
+    
+    try:
+        writer = None
+        if args.format == 'csv':
+            writer = csv.DictWriter(out, fieldnames=BATCH_FIELDS)
+            writer.writeheader()
+        
+        for row in validate_batch(
+            license_files,
+            public_key_path=args.public_key,
+            grace_days=args.grace_days,
+            hardware_id=args.hardware_id,
+            workers=args.workers
+        ):
+            counts[row['status']] += 1
+            if writer:
+                writer.writerow(row)
+            else:
+                out.write(json.dumps(row) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    rate = total / elapsed if elapsed > 0 else 0.0
+    
+    print("=" * 60, file=sys.stderr)
+    print(f"Checked {total} license files in {elapsed:.2f}s ({rate:.1f} files/s)", file=sys.stderr)
+    for status in (STATUS_VALID, STATUS_GRACE, STATUS_EXPIRED, STATUS_WRONG_HARDWARE,
+                   STATUS_TAMPERED, STATUS_UNREADABLE):
+        print(f"  {status}: {counts.get(status, 0)}", file=sys.stderr)
+    print("=" * 60, file=sys.stderr)
+    
+    failed = total - counts.get(STATUS_VALID, 0) - counts.get(STATUS_GRACE, 0)
+    return 0 if failed == 0 else 1
+
 def main():
     import argparse
     
     parser = argparse.ArgumentParser(description='Validate Critikality license')
-    parser.add_argument('license_file', help='Path to license file (.lic)')
+    parser.add_argument('license_file', nargs='?', help='Path to license file (.lic)')
     parser.add_argument('--public-key', default='public_key.pem', help='Path to public key')
     parser.add_argument('--show-hw-id', action='store_true', help='Show current hardware ID')
+    parser.add_argument('--batch', metavar='DIR_OR_GLOB', help='Audit every license in a directory or glob')
+    parser.add_argument('--format', choices=['json', 'csv'], default='json', help='Batch report format (json = JSON Lines)')
+    parser.add_argument('--output', help='Write batch report to file instead of stdout')
+    parser.add_argument('--workers', type=int, help='Batch worker processes (default: CPU count)')
+    parser.add_argument('--hardware-id', help='Expected hardware ID in batch mode (hardware check skipped if omitted)')
+    parser.add_argument('--grace-days', type=int, default=7, help='Grace period after expiration')
     
     args = parser.parse_args()
     
+    if args.batch:
+        return run_batch(args)
+    
+    if not args.license_file and not args.show_hw_id:
+        parser.error('license_file is required unless --batch or --show-hw-id is given')
+    
     validator = LicenseValidator(args.public_key)
     
     if args.show_hw_id:
@@ -158,7 +317,7 @@ def main():
         return
     
     # Validate license
-    valid, message, data = validator.validate_license(args.license_file)
+    valid, message, data = validator.validate_license(args.license_file, grace_days=args.grace_days)
     
     print("=" * 60)
     print("CRITIKALITY LICENSE VALIDATION")
@@ -1,15 +1,30 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import os
 from dotenv import load_dotenv
+from sqlalchemy.exc import SQLAlchemyError
+
+from errors import handle_database_error
+from middleware import AdmissionMiddleware, MetricsMiddleware, ReadYourWritesMiddleware
+import admission
+import database
+import partitions
+import reports as presence_reports
+import heartbeats
+import delta_sync
+import jobs as job_runner
 
 # Import all route modules
-from routes import workers, devices, zones, dashboard, team, enrollment, licenses
+from routes import workers, devices, zones, dashboard, team, enrollment, licenses, metrics, scan_events, reports, sync, jobs, faces
 
 load_dotenv()
 
 app = FastAPI(title="Critikality API", version="1.0.0", redirect_slashes=False)
 
+# Database failures get a real status code (and Retry-After when transient)
+app.add_exception_handler(SQLAlchemyError, handle_database_error)
+
 @app.get("/health")
 async def health_check():
     return {
@@ -19,6 +34,57 @@ async def health_check():
     }
 
 
+@app.on_event("startup")
+async def start_partition_maintenance():
+    # Creates upcoming scan_events partitions and applies retention
+    if partitions.MAINTENANCE_ENABLED:
+        app.state.partition_task = asyncio.create_task(partitions.maintenance_loop())
+
+
+@app.on_event("startup")
+async def start_presence_rollup():
+    # Keeps worker_site_daily / worker_zone_daily current for /api/reports
+    if presence_reports.ROLLUP_ENABLED:
+        app.state.rollup_task = asyncio.create_task(presence_reports.rollup_loop())
+
+
+@app.on_event("startup")
+async def start_heartbeat_flush():
+    # Writes coalesced device heartbeats and marks silent devices offline
+    app.state.heartbeat_task = asyncio.create_task(heartbeats.flush_loop())
+
+
+@app.on_event("startup")
+async def start_replica_lag_checks():
+    # GET requests only go to replicas measured within REPLICA_MAX_LAG_SECONDS
+    if database.replica_engines:
+        app.state.replica_lag_task = asyncio.create_task(database.replica_lag_loop())
+
+
+@app.on_event("startup")
+async def start_tombstone_prune():
+    # Drops sync tombstones older than any token /api/sync still honours
+    app.state.tombstone_task = asyncio.create_task(delta_sync.prune_loop())
+
+
+@app.on_event("startup")
+async def start_job_workers():
+    # Off by default: job workers run as their own service (`python jobs.py`)
+    app.state.job_workers = job_runner.start_pool(job_runner.JOB_WORKERS)
+
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    # Interrupted jobs are requeued once their heartbeat goes stale
+    for process in app.state.job_workers:
+        process.terminate()
+
+
+# Load shedding per route group; added before CORS so 503s still carry
+# CORS headers
+if admission.ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware)
+
 # CORS Configuration
 origins = os.getenv("CORS_ORIGINS", "").split(",")
 app.add_middleware(
@@ -27,8 +93,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-DB-Query-Count", "Server-Timing"],
 )
 
+# Read replicas: clients that just wrote keep reading from the primary
+if database.replica_engines:
+    app.add_middleware(ReadYourWritesMiddleware)
+
+# Request timing / DB time per route, exposed at /metrics
+app.add_middleware(MetricsMiddleware)
+
 # Include all routers
 app.include_router(workers.router)
 app.include_router(devices.router)
@@ -37,6 +111,12 @@ app.include_router(dashboard.router)
 app.include_router(team.router)
 app.include_router(enrollment.router)
 app.include_router(licenses.router)
+app.include_router(scan_events.router)
+app.include_router(reports.router)
+app.include_router(sync.router)
+app.include_router(jobs.router)
+app.include_router(faces.router)
+app.include_router(metrics.router)
 
 @app.get("/")
 async def root():
@@ -0,0 +1,136 @@
+"""
+Prometheus metric definitions shared by the API
+Route labels are route templates (e.g. /api/workers/{worker_id}), never raw
+paths, so label cardinality stays bounded by the number of routes.
+"""
+
+from prometheus_client import Counter, Gauge, Histogram
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_LATENCY = Histogram(
+    "critikality_http_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS
+)
+
+REQUESTS_TOTAL = Counter(
+    "critikality_http_requests_total",
+    "HTTP requests handled",
+    ["method", "route", "status"]
+)
+
+REQUESTS_IN_FLIGHT = Gauge(
+    "critikality_http_requests_in_flight",
+    "HTTP requests currently being handled",
+    ["method", "route"]
+)
+
+RESPONSE_SIZE = Histogram(
+    "critikality_http_response_size_bytes",
+    "HTTP response body size",
+    ["method", "route"],
+    buckets=(100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+)
+
+REQUEST_DB_TIME = Histogram(
+    "critikality_http_request_db_duration_seconds",
+    "Time spent executing SQL per request",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS
+)
+
+REQUEST_DB_QUERIES = Histogram(
+    "critikality_http_request_db_queries",
+    "SQL statements executed per request",
+    ["method", "route"],
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250)
+)
+
+REPLICA_LAG_SECONDS = Gauge(
+    "critikality_db_replica_lag_seconds",
+    "Measured replay lag per read replica (-1 when unreachable)",
+    ["replica"]
+)
+
+DB_READ_ROUTING_TOTAL = Counter(
+    "critikality_db_session_routing_total",
+    "Sessions opened while replicas are configured, by the database that served them",
+    ["target"]
+)
+
+ADMISSION_ACTIVE = Gauge(
+    "critikality_admission_active",
+    "Admitted requests currently running, by route group",
+    ["group"]
+)
+
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "critikality_admission_queue_depth",
+    "Requests waiting for admission, by route group",
+    ["group"]
+)
+
+ADMISSION_WAIT_SECONDS = Histogram(
+    "critikality_admission_wait_seconds",
+    "Time requests spent waiting for admission",
+    ["group"],
+    buckets=(0, 0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+ADMISSION_REJECTED_TOTAL = Counter(
+    "critikality_admission_rejected_total",
+    "Requests shed with 503, by route group and reason (queue_full, timeout)",
+    ["group", "reason"]
+)
+
+ERRORS_TOTAL = Counter(
+    "critikality_errors_total",
+    "Failed requests by error class (pool_exhausted, db_timeout, conflict, ...)",
+    ["error_class", "status"]
+)
+
+COALESCE_REQUESTS_TOTAL = Counter(
+    "critikality_coalesce_requests_total",
+    "Coalesced reads, by whether they ran the query, joined one in flight or bypassed coalescing",
+    ["name", "result"]
+)
+
+COALESCE_IN_FLIGHT = Gauge(
+    "critikality_coalesce_in_flight",
+    "Coalesced reads currently executing",
+    ["name"]
+)
+
+HEARTBEATS_TOTAL = Counter(
+    "critikality_device_heartbeats_total",
+    "Device heartbeats received"
+)
+
+HEARTBEAT_FLUSHED_ROWS = Counter(
+    "critikality_device_heartbeat_rows_flushed_total",
+    "Coalesced device last_seen values written to the database"
+)
+
+HEARTBEAT_TRACKED_DEVICES = Gauge(
+    "critikality_device_heartbeat_tracked_devices",
+    "Devices currently tracked in the in-memory heartbeat table"
+)
+
+SCAN_EVENTS_TOTAL = Counter(
+    "critikality_scan_events_total",
+    "Ingested scan events by outcome (accepted, duplicate, passback_dropped, passback_flagged)",
+    ["result"]
+)
+
+SCAN_FILTER_TRACKED = Gauge(
+    "critikality_scan_filter_tracked_keys",
+    "Keys held by the in-memory scan filter (recent: worker+device, direction: worker+zone, outcomes: event id)",
+    ["state"]
+)
+
+SCAN_DEFAULT_PARTITION_ROWS = Gauge(
+    "critikality_scan_default_partition_rows",
+    "Rows left in the scan_events DEFAULT partition after maintenance (should be 0)"
+)
@@ -0,0 +1,186 @@
+"""
+ASGI middleware for the API
+"""
+
+import logging
+import math
+import os
+import time
+from starlette.responses import JSONResponse
+from starlette.routing import Match
+
+from admission import GROUPS, Rejected, controller as admission_controller, route_group
+from database import (
+    PRIMARY_COOKIE,
+    READ_YOUR_WRITES_SECONDS,
+    SAFE_METHODS,
+    DBStats,
+    request_db_stats,
+)
+from errors import RETRY_AFTER_SECONDS
+from metrics import (
+    ERRORS_TOTAL,
+    REQUEST_DB_QUERIES,
+    REQUEST_DB_TIME,
+    REQUEST_LATENCY,
+    REQUESTS_IN_FLIGHT,
+    REQUESTS_TOTAL,
+    RESPONSE_SIZE,
+)
+
+logger = logging.getLogger("critikality.sql")
+
+# Requests issuing at least this many statements are logged (N+1 detection)
+QUERY_COUNT_WARN = int(os.getenv("QUERY_COUNT_WARN", "50"))
+
+KNOWN_METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"}
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def route_template(scope):
+    """Return the path template of the route that serves this request"""
+    app = scope.get("app")
+    if app is None:
+        return UNMATCHED_ROUTE
+
+    partial = None
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+
+    return partial or UNMATCHED_ROUTE
+
+
+def _log_query_heavy_request(method, route, stats):
+    top = "\n".join(
+        f"  {count}x {total * 1000:.1f} ms  {' '.join(stmt.split())[:200]}"
+        for stmt, count, total in stats.by_template()[:5]
+    )
+    logger.warning(
+        "%s %s issued %d queries (%.1f ms DB time):\n%s",
+        method, route, stats.query_count, stats.db_time * 1000, top
+    )
+
+
+class MetricsMiddleware:
+    """
+    Records latency, in-flight requests, response size and DB time per route
+    Also reports the request's query count and DB time in response headers
+    (X-DB-Query-Count, Server-Timing) so regressions show up in the browser.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"] if scope["method"] in KNOWN_METHODS else "OTHER"
+        route = route_template(scope)
+        status = 500
+        response_size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, response_size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-query-count", str(stats.query_count).encode()))
+                headers.append((b"server-timing", f"db;dur={stats.db_time * 1000:.1f}".encode()))
+                message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        stats = DBStats()
+        token = request_db_stats.set(stats)
+        in_flight = REQUESTS_IN_FLIGHT.labels(method, route)
+        in_flight.inc()
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started_at
+            in_flight.dec()
+            request_db_stats.reset(token)
+
+            REQUEST_LATENCY.labels(method, route, str(status)).observe(elapsed)
+            REQUESTS_TOTAL.labels(method, route, str(status)).inc()
+            RESPONSE_SIZE.labels(method, route).observe(response_size)
+            REQUEST_DB_TIME.labels(method, route).observe(stats.db_time)
+            REQUEST_DB_QUERIES.labels(method, route).observe(stats.query_count)
+
+            if stats.query_count >= QUERY_COUNT_WARN:
+                _log_query_heavy_request(method, route, stats)
+
+
+class ReadYourWritesMiddleware:
+    """
+    Pins a client to the primary for a short window after it writes
+    Successful mutations set a cookie that get_db checks, so the client's
+    next reads see its own changes even while replicas catch up.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.max_age = math.ceil(READ_YOUR_WRITES_SECONDS)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = time.time() + READ_YOUR_WRITES_SECONDS
+                cookie = f"{PRIMARY_COOKIE}={until:.3f}; Max-Age={self.max_age}; Path=/; HttpOnly; SameSite=Lax"
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode())]}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class AdmissionMiddleware:
+    """
+    Sheds load per route group before requests pile up on the pool
+    Over-capacity requests get a fast 503 with Retry-After (see
+    admission.py); admitted ones pass their group's statement_timeout to
+    get_db through request.state.
+    """
+
+    def __init__(self, app, controller=admission_controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        group = route_group(scope["method"], route_template(scope))
+        if group is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.controller.acquire(group)
+        except Rejected as e:
+            ERRORS_TOTAL.labels(error_class="overloaded", status="503").inc()
+            response = JSONResponse(
+                {"data": None, "error": str(e)},
+                status_code=503,
+                headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+            )
+            await response(scope, receive, send)
+            return
+
+        scope.setdefault("state", {})["statement_timeout_ms"] = GROUPS[group]["timeout_ms"]
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(group)
@@ -0,0 +1,72 @@
+-- Convert scan_events to a table range-partitioned by month on scanned_at
+-- Run once, in a maintenance window (rows are copied into the new table).
+-- Afterwards partitions.py creates future partitions and applies retention.
+--
+-- Primary key becomes (id, scanned_at): Postgres requires the partition key
+-- in every unique constraint. Re-create any foreign keys pointing at
+-- scan_events(id) accordingly.
+
+BEGIN;
+
+LOCK TABLE scan_events IN ACCESS EXCLUSIVE MODE;
+
+ALTER TABLE scan_events RENAME TO scan_events_unpartitioned;
+
+-- Old indexes go away with the old table; free their names for the parent
+DROP INDEX IF EXISTS idx_scan_events_worker;
+DROP INDEX IF EXISTS idx_scan_events_device;
+DROP INDEX IF EXISTS idx_scan_events_zone;
+DROP INDEX IF EXISTS idx_scan_events_timestamp;
+DROP INDEX IF EXISTS idx_scan_events_direction;
+
+UPDATE scan_events_unpartitioned SET scanned_at = created_at WHERE scanned_at IS NULL;
+
+CREATE TABLE scan_events (LIKE scan_events_unpartitioned INCLUDING DEFAULTS)
+    PARTITION BY RANGE (scanned_at);
+
+ALTER TABLE scan_events ALTER COLUMN scanned_at SET NOT NULL;
+ALTER TABLE scan_events ADD PRIMARY KEY (id, scanned_at);
+
+-- Monthly partitions from the oldest event up to 3 months ahead
+-- (names follow partitions.py: scan_events_pYYYYMM, bounds in UTC). Fails if
+-- a table of that name already exists, e.g. a detached partition not yet
+-- archived - archive or rename it first.
+DO $$
+DECLARE
+    month_start TIMESTAMPTZ;
+BEGIN
+    FOR month_start IN
+        SELECT generate_series(
+            date_trunc('month', COALESCE(MIN(scanned_at), NOW()) AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+            date_trunc('month', NOW() AT TIME ZONE 'UTC') AT TIME ZONE 'UTC' + INTERVAL '3 months',
+            INTERVAL '1 month'
+        )
+        FROM scan_events_unpartitioned
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF scan_events FOR VALUES FROM (%L) TO (%L)',
+            'scan_events_p' || to_char(month_start AT TIME ZONE 'UTC', 'YYYYMM'),
+            month_start,
+            (month_start AT TIME ZONE 'UTC' + INTERVAL '1 month') AT TIME ZONE 'UTC'
+        );
+    END LOOP;
+END $$;
+
+-- Catches rows outside every partition so ingestion never fails. partitions.py
+-- moves rows out of it when it creates a partition covering them, and logs
+-- and exports critikality_scan_default_partition_rows for any left behind.
+CREATE TABLE IF NOT EXISTS scan_events_default PARTITION OF scan_events DEFAULT;
+
+-- Scan readers filter by entity and order by time, so lead with the entity
+CREATE INDEX IF NOT EXISTS idx_scan_events_worker ON scan_events(worker_id, scanned_at DESC);
+CREATE INDEX IF NOT EXISTS idx_scan_events_device ON scan_events(device_id, scanned_at DESC);
+CREATE INDEX IF NOT EXISTS idx_scan_events_zone ON scan_events(zone_id, scanned_at DESC);
+CREATE INDEX IF NOT EXISTS idx_scan_events_timestamp ON scan_events(scanned_at DESC);
+
+INSERT INTO scan_events SELECT * FROM scan_events_unpartitioned;
+
+DROP TABLE scan_events_unpartitioned;
+
+COMMIT;
+
+ANALYZE scan_events;
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Critikality scan_events partition manager
+Creates range partitions on scanned_at ahead of time and detaches or drops
+partitions that fall out of the retention window. Runs periodically inside
+the API (see main.py) and can be run by hand:
+
+    python partitions.py            # ensure future partitions + retention
+    python partitions.py --list
+"""
+
+import asyncio
+import logging
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+from database import SessionLocal
+from metrics import SCAN_DEFAULT_PARTITION_ROWS
+
+logger = logging.getLogger("critikality.partitions")
+
+PARENT_TABLE = "scan_events"
+
+# month | day - daily suits very high scan rates with short retention
+PARTITION_INTERVAL = os.getenv("SCAN_PARTITION_INTERVAL", "month")
+PARTITIONS_AHEAD = int(os.getenv("SCAN_PARTITIONS_AHEAD", "3"))
+
+# 0 keeps all history; detached partitions stay as plain tables for archival
+SCAN_RETENTION_DAYS = int(os.getenv("SCAN_RETENTION_DAYS", "0"))
+SCAN_RETENTION_ACTION = os.getenv("SCAN_RETENTION_ACTION", "detach")
+
+MAINTENANCE_ENABLED = os.getenv("SCAN_PARTITION_MAINTENANCE", "true").lower() == "true"
+MAINTENANCE_INTERVAL_SECONDS = int(os.getenv("SCAN_PARTITION_MAINTENANCE_INTERVAL", "3600"))
+
+# Serializes maintenance across uvicorn workers / replicas
+MAINTENANCE_LOCK_KEY = 7_203_001
+
+PARTITION_NAME = re.compile(rf"^{PARENT_TABLE}_p(\d{{6}}|\d{{8}})$")
+
+
+def period_start(moment, interval=PARTITION_INTERVAL):
+    moment = moment.astimezone(timezone.utc)
+    if interval == "day":
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_period(start, interval=PARTITION_INTERVAL):
+    if interval == "day":
+        return start + timedelta(days=1)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def partition_name(start, interval=PARTITION_INTERVAL):
+    suffix = start.strftime("%Y%m%d" if interval == "day" else "%Y%m")
+    return f"{PARENT_TABLE}_p{suffix}"
+
+
+def partition_range(name):
+    """Return (lower, upper) for a partition named by this module, else None"""
+    match = PARTITION_NAME.match(name)
+    if not match:
+        return None
+    suffix = match.group(1)
+    if len(suffix) == 8:
+        lower = datetime.strptime(suffix, "%Y%m%d").replace(tzinfo=timezone.utc)
+        return lower, next_period(lower, "day")
+    lower = datetime.strptime(suffix, "%Y%m").replace(tzinfo=timezone.utc)
+    return lower, next_period(lower, "month")
+
+
+def is_partitioned(db):
+    row = db.execute(text("""
+        SELECT 1 FROM pg_partitioned_table pt
+        JOIN pg_class c ON c.oid = pt.partrelid
+        WHERE c.relname = :table AND c.relnamespace = 'public'::regnamespace
+    """), {"table": PARENT_TABLE}).fetchone()
+    return row is not None
+
+
+def list_partitions(db):
+    """Return [(name, lower, upper)] of attached range partitions, oldest first"""
+    result = db.execute(text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST(:table AS regclass)
+    """), {"table": PARENT_TABLE})
+
+    partitions = []
+    for (name,) in result.fetchall():
+        bounds = partition_range(name)
+        if bounds:
+            partitions.append((name, *bounds))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def default_partition(db):
+    """Name of the DEFAULT partition attached to scan_events, or None"""
+    return db.execute(text("""
+        SELECT c.relname
+        FROM pg_partitioned_table pt
+        JOIN pg_class c ON c.oid = pt.partdefid
+        WHERE pt.partrelid = CAST(:table AS regclass)
+    """), {"table": PARENT_TABLE}).scalar()
+
+
+def _create_partition(db, name, start, end, default):
+    """
+    Create one range partition, first moving rows for it out of DEFAULT
+    Postgres refuses to create a partition whose range has rows in the
+    DEFAULT partition, so those are moved: detach DEFAULT, create the
+    partition, copy the rows across, delete them and re-attach. The copy
+    goes straight into the partition, so parent triggers (the scan_activity
+    rollup) do not count the rows a second time.
+    """
+    bounds = f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    in_range = f"scanned_at >= '{start.isoformat()}' AND scanned_at < '{end.isoformat()}'"
+    stranded = default is not None and db.execute(
+        text(f'SELECT EXISTS (SELECT 1 FROM "{default}" WHERE {in_range})')
+    ).scalar()
+    if not stranded:
+        db.execute(text(f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF {PARENT_TABLE} {bounds}'))
+        return
+
+    # Named columns: an attached table's column order may differ from the parent's
+    columns = ", ".join(f'"{column}"' for column in db.execute(text("""
+        SELECT attname FROM pg_attribute
+        WHERE attrelid = CAST(:table AS regclass) AND attnum > 0 AND NOT attisdropped
+        ORDER BY attnum
+    """), {"table": PARENT_TABLE}).scalars())
+    db.execute(text(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION "{default}"'))
+    db.execute(text(f'CREATE TABLE "{name}" PARTITION OF {PARENT_TABLE} {bounds}'))
+    moved = db.execute(text(
+        f'INSERT INTO "{name}" ({columns}) SELECT {columns} FROM "{default}" WHERE {in_range}'
+    )).rowcount
+    db.execute(text(f'DELETE FROM "{default}" WHERE {in_range}'))
+    db.execute(text(f'ALTER TABLE {PARENT_TABLE} ATTACH PARTITION "{default}" DEFAULT'))
+    logger.warning("Moved %d rows from %s into new partition %s", moved, default, name)
+
+
+def ensure_partitions(db, now=None, ahead=PARTITIONS_AHEAD, interval=PARTITION_INTERVAL):
+    """Create partitions for the current period and `ahead` periods after it"""
+    now = now or datetime.now(timezone.utc)
+    existing = list_partitions(db)
+    default = default_partition(db)
+    created = []
+
+    start = period_start(now, interval)
+    for _ in range(ahead + 1):
+        end = next_period(start, interval)
+        # Skip ranges already covered, e.g. daily mode over a monthly partition
+        if not any(lower < end and start < upper for _, lower, upper in existing):
+            name = partition_name(start, interval)
+            _create_partition(db, name, start, end, default)
+            existing.append((name, start, end))
+            created.append(name)
+        start = end
+
+    return created
+
+
+def check_default_partition(db):
+    """
+    Count rows left in DEFAULT; exported as a metric and logged when non-zero
+    Rows land there when scanned_at is outside every partition, e.g. a
+    device clock years off or a late backfill for a detached range, and
+    every query on scan_events has to scan them.
+    """
+    default = default_partition(db)
+    if default is None:
+        return 0
+    rows = db.execute(text(f'SELECT COUNT(*) FROM "{default}"')).scalar()
+    SCAN_DEFAULT_PARTITION_ROWS.set(rows)
+    if rows:
+        span = db.execute(text(f'SELECT MIN(scanned_at), MAX(scanned_at) FROM "{default}"')).one()
+        logger.warning("%s holds %d rows outside every partition (scanned_at %s to %s)",
+                       default, rows, span[0], span[1])
+    return rows
+
+
+def apply_retention(db, now=None, retention_days=SCAN_RETENTION_DAYS, action=SCAN_RETENTION_ACTION):
+    """Detach or drop partitions whose whole range is older than the retention window"""
+    if retention_days <= 0:
+        return []
+
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=retention_days)
+    expired = []
+
+    for name, _, upper in list_partitions(db):
+        if upper > cutoff:
+            continue
+        if action == "drop":
+            db.execute(text(f'DROP TABLE "{name}"'))
+        else:
+            db.execute(text(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION "{name}"'))
+        expired.append(name)
+
+    return expired
+
+
+def scan_window_start(now=None):
+    """
+    Oldest scanned_at still retained, or None when history is kept forever
+    Scan readers add `scanned_at >= :since` with this so the planner prunes
+    partitions that are about to be detached as well as detached ones.
+    """
+    if SCAN_RETENTION_DAYS <= 0:
+        return None
+    return (now or datetime.now(timezone.utc)) - timedelta(days=SCAN_RETENTION_DAYS)
+
+
+def run_maintenance(db):
+    """Create upcoming partitions and apply retention (no-op if unpartitioned)"""
+    if not is_partitioned(db):
+        return {"partitioned": False, "created": [], "expired": []}
+
+    locked = db.execute(
+        text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": MAINTENANCE_LOCK_KEY}
+    ).scalar()
+    if not locked:
+        db.rollback()
+        return {"partitioned": True, "created": [], "expired": [], "skipped": True}
+
+    try:
+        created = ensure_partitions(db)
+        expired = apply_retention(db)
+        stranded = check_default_partition(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    if created or expired:
+        logger.info("scan_events partitions created=%s expired=%s", created, expired)
+    return {"partitioned": True, "created": created, "expired": expired, "default_rows": stranded}
+
+
+def _run_maintenance_once():
+    db = SessionLocal()
+    try:
+        return run_maintenance(db)
+    finally:
+        db.close()
+
+
+async def maintenance_loop():
+    """Background task started with the API"""
+    import archive
+
+    while True:
+        try:
+            await asyncio.to_thread(_run_maintenance_once)
+            # Detached partitions move to Parquet and leave the database
+            if archive.SCAN_ARCHIVE_ENABLED:
+                await asyncio.to_thread(archive.run_archive)
+        except Exception as e:
+            logger.warning("scan_events partition maintenance failed: %s", e)
+        await asyncio.sleep(MAINTENANCE_INTERVAL_SECONDS)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Manage scan_events partitions')
+    parser.add_argument('--list', action='store_true', help='List attached partitions')
+
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if not is_partitioned(db):
+            print("scan_events is not partitioned - run partition_scan_events.sql first")
+            return 1
+
+        if args.list:
+            for name, lower, upper in list_partitions(db):
+                print(f"{name}  {lower:%Y-%m-%d} -> {upper:%Y-%m-%d}")
+            return 0
+
+        summary = run_maintenance(db)
+        print(f"Created: {', '.join(summary['created']) or 'none'}")
+        print(f"Expired ({SCAN_RETENTION_ACTION}): {', '.join(summary['expired']) or 'none'}")
+        if summary.get("default_rows"):
+            print(f"Warning: {summary['default_rows']} rows in the DEFAULT partition")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Critikality presence reports
+Pairs entry/exit scan_events into visits with window functions (LEAD over
+each worker's timeline for time on site, and over each worker+zone
+timeline for zone dwell) and keeps daily rollups in worker_site_daily /
+worker_zone_daily (see reports_schema.sql) for /api/reports.
+
+    python reports.py                                  # refresh yesterday + today
+    python reports.py --from 2026-01-01 --to 2026-02-01  # backfill
+"""
+
+import asyncio
+import logging
+import os
+from datetime import date, timedelta
+from sqlalchemy import text
+from database import SessionLocal
+
+logger = logging.getLogger("critikality.reports")
+
+REPORT_TIMEZONE = os.getenv("REPORT_TIMEZONE", "UTC")
+
+# An entry without an exit within this window is treated as unpaired
+MAX_VISIT = os.getenv("REPORT_MAX_VISIT", "16 hours")
+
+ROLLUP_ENABLED = os.getenv("REPORT_ROLLUP", "true").lower() == "true"
+ROLLUP_INTERVAL_SECONDS = int(os.getenv("REPORT_ROLLUP_INTERVAL", "900"))
+
+ROLLUP_LOCK_KEY = 7_203_002
+
+# One pass over scan_events for [start_day, end_day): both LEADs share the
+# scan, and GROUPING SETS emit site-level and zone-level rows together.
+# Events up to MAX_VISIT past the range are read so late exits still pair.
+# Passback-flagged scans are left out, so they never open or close a visit.
+PRESENCE_SQL = """
+    WITH events AS (
+        SELECT se.worker_id, se.zone_id, se.direction, se.scanned_at,
+               LEAD(se.direction) OVER by_worker AS next_site_direction,
+               LEAD(se.scanned_at) OVER by_worker AS next_site_scan,
+               LEAD(se.direction) OVER by_zone AS next_zone_direction,
+               LEAD(se.scanned_at) OVER by_zone AS next_zone_scan
+        FROM scan_events se
+        WHERE se.scanned_at >= CAST(:start_day AS timestamp) AT TIME ZONE :tz
+          AND se.scanned_at < (CAST(:end_day AS timestamp) AT TIME ZONE :tz) + CAST(:max_visit AS interval)
+          AND se.worker_id IS NOT NULL
+          AND NOT se.flagged
+          {worker_filter}
+        WINDOW by_worker AS (PARTITION BY se.worker_id ORDER BY se.scanned_at),
+               by_zone AS (PARTITION BY se.worker_id, se.zone_id ORDER BY se.scanned_at)
+    ),
+    visits AS (
+        SELECT worker_id, zone_id, scanned_at,
+               CAST(scanned_at AT TIME ZONE :tz AS date) AS day,
+               CASE WHEN next_site_direction = 'out'
+                         AND next_site_scan - scanned_at <= CAST(:max_visit AS interval)
+                    THEN next_site_scan END AS site_out,
+               CASE WHEN next_zone_direction = 'out'
+                         AND next_zone_scan - scanned_at <= CAST(:max_visit AS interval)
+                    THEN next_zone_scan END AS zone_out
+        FROM events
+        WHERE direction = 'in'
+          AND scanned_at < CAST(:end_day AS timestamp) AT TIME ZONE :tz
+    )
+    SELECT day, worker_id, zone_id,
+           GROUPING(zone_id) = 1 AS site_level,
+           COUNT(site_out) AS site_visits,
+           COALESCE(SUM(EXTRACT(EPOCH FROM site_out - scanned_at)), 0)::bigint AS on_site_seconds,
+           MIN(scanned_at) AS first_in,
+           MAX(site_out) AS last_out,
+           COUNT(zone_out) AS zone_visits,
+           COALESCE(SUM(EXTRACT(EPOCH FROM zone_out - scanned_at)), 0)::bigint AS dwell_seconds
+    FROM visits
+    GROUP BY GROUPING SETS ((day, worker_id), (day, worker_id, zone_id))
+"""
+
+
+def presence_params(start_day, end_day):
+    return {
+        "start_day": start_day,
+        "end_day": end_day,
+        "tz": REPORT_TIMEZONE,
+        "max_visit": MAX_VISIT,
+    }
+
+
+def presence_sql(worker_filter=""):
+    return PRESENCE_SQL.format(worker_filter=worker_filter)
+
+
+ATTENDANCE_COLUMNS = ["day", "worker_id", "first_name", "last_name", "employee_id",
+                      "on_site_seconds", "visits", "first_in", "last_out"]
+ZONE_DWELL_COLUMNS = ["day", "worker_id", "first_name", "last_name", "employee_id",
+                      "zone_id", "zone_name", "dwell_seconds", "visits"]
+
+
+def live_worker_filter(worker_id):
+    """scan_events predicate for live reports: only the company's workers are paired"""
+    worker_filter = "AND se.worker_id IN (SELECT id FROM workers WHERE client_company_id = :company_id)"
+    if worker_id:
+        worker_filter += " AND se.worker_id = :worker_id"
+    return worker_filter
+
+
+def attendance_query(worker_id, live):
+    worker_filter = "AND d.worker_id = :worker_id" if worker_id else ""
+    if live:
+        # Computed from scan_events for days not rolled up yet
+        source = f"""(
+            SELECT day, worker_id, on_site_seconds, site_visits AS visits, first_in, last_out
+            FROM ({presence_sql(live_worker_filter(worker_id))}) p
+            WHERE p.site_level
+        )"""
+        company = "w.client_company_id"
+    else:
+        # The rollups carry the company, so idx_worker_site_daily_company applies
+        source = "worker_site_daily"
+        company = "d.client_company_id"
+    return text(f"""
+        SELECT d.day, d.worker_id, w.first_name, w.last_name, w.employee_id,
+               d.on_site_seconds, d.visits, d.first_in, d.last_out
+        FROM {source} d
+        JOIN workers w ON w.id = d.worker_id
+        WHERE {company} = :company_id
+          AND d.day >= :start_day AND d.day < :end_day
+          {worker_filter}
+        ORDER BY d.day, w.last_name, w.first_name, d.worker_id
+    """)
+
+
+def zone_dwell_query(worker_id, zone_id, live):
+    filters = ""
+    if worker_id:
+        filters += " AND d.worker_id = :worker_id"
+    if zone_id:
+        filters += " AND d.zone_id = :zone_id"
+    if live:
+        source = f"""(
+            SELECT day, worker_id, zone_id, dwell_seconds, zone_visits AS visits
+            FROM ({presence_sql(live_worker_filter(worker_id))}) p
+            WHERE NOT p.site_level AND p.zone_id IS NOT NULL
+        )"""
+        company = "w.client_company_id"
+    else:
+        source = "worker_zone_daily"
+        company = "d.client_company_id"
+    return text(f"""
+        SELECT d.day, d.worker_id, w.first_name, w.last_name, w.employee_id,
+               d.zone_id, z.name AS zone_name, d.dwell_seconds, d.visits
+        FROM {source} d
+        JOIN workers w ON w.id = d.worker_id
+        LEFT JOIN location_zones z ON z.id = d.zone_id
+        WHERE {company} = :company_id
+          AND d.day >= :start_day AND d.day < :end_day
+          {filters}
+        ORDER BY d.day, w.last_name, w.first_name, d.worker_id, z.name
+    """)
+
+
+def refresh_daily(db, start_day, end_day):
+    """Recompute the rollups for days in [start_day, end_day) in one transaction"""
+    _rebuild_daily(db, start_day, end_day)
+    db.commit()
+
+
+def _rebuild_daily(db, start_day, end_day):
+    """refresh_daily's statements, left uncommitted"""
+    params = presence_params(start_day, end_day)
+
+    db.execute(text("DELETE FROM worker_site_daily WHERE day >= :start_day AND day < :end_day"), params)
+    db.execute(text("DELETE FROM worker_zone_daily WHERE day >= :start_day AND day < :end_day"), params)
+    db.execute(text(f"""
+        WITH presence AS ({presence_sql()}),
+        site_rows AS (
+            INSERT INTO worker_site_daily (
+                day, worker_id, client_company_id, on_site_seconds, visits, first_in, last_out
+            )
+            SELECT p.day, p.worker_id, w.client_company_id, p.on_site_seconds,
+                   p.site_visits, p.first_in, p.last_out
+            FROM presence p
+            LEFT JOIN workers w ON w.id = p.worker_id
+            WHERE p.site_level
+        )
+        INSERT INTO worker_zone_daily (
+            day, worker_id, zone_id, client_company_id, dwell_seconds, visits
+        )
+        SELECT p.day, p.worker_id, p.zone_id, w.client_company_id, p.dwell_seconds, p.zone_visits
+        FROM presence p
+        LEFT JOIN workers w ON w.id = p.worker_id
+        WHERE NOT p.site_level AND p.zone_id IS NOT NULL
+    """), params)
+
+
+def refresh_recent(db):
+    """Refresh yesterday (late exits) and today, once across all API workers"""
+    # Transaction-level lock: released by the refresh's own commit, so it
+    # cannot outlive the transaction on a pooled connection
+    locked = db.execute(
+        text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": ROLLUP_LOCK_KEY}
+    ).scalar()
+    if not locked:
+        db.rollback()
+        return False
+
+    try:
+        today = db.execute(
+            text("SELECT CAST(NOW() AT TIME ZONE :tz AS date)"), {"tz": REPORT_TIMEZONE}
+        ).scalar()
+        _rebuild_daily(db, today - timedelta(days=1), today + timedelta(days=1))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return True
+
+
+def _refresh_recent_once():
+    db = SessionLocal()
+    try:
+        return refresh_recent(db)
+    finally:
+        db.close()
+
+
+async def rollup_loop():
+    """Background task started with the API"""
+    while True:
+        try:
+            await asyncio.to_thread(_refresh_recent_once)
+        except Exception as e:
+            logger.warning("Presence rollup failed: %s", e)
+        await asyncio.sleep(ROLLUP_INTERVAL_SECONDS)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Refresh daily presence rollups')
+    parser.add_argument('--from', dest='start', type=date.fromisoformat, help='First day (YYYY-MM-DD)')
+    parser.add_argument('--to', dest='end', type=date.fromisoformat, help='Day after the last day (YYYY-MM-DD)')
+
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if not args.start:
+            refresh_recent(db)
+            print("✅ Refreshed yesterday and today")
+            return 0
+
+        end = args.end or args.start + timedelta(days=1)
+        day = args.start
+        while day < end:
+            refresh_daily(db, day, day + timedelta(days=1))
+            print(f"✅ {day}")
+            day += timedelta(days=1)
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,34 @@
+-- Daily pre-aggregated presence for /api/reports (maintained by reports.py)
+-- A visit is an 'in' scan whose next scan (in the worker's timeline for
+-- site time, in the worker+zone timeline for zone time) is an 'out' within
+-- REPORT_MAX_VISIT. Days are calendar days in REPORT_TIMEZONE; a visit
+-- counts toward the day it started on.
+
+CREATE TABLE IF NOT EXISTS worker_site_daily (
+    day DATE NOT NULL,
+    worker_id UUID NOT NULL,
+    client_company_id UUID,
+    on_site_seconds BIGINT NOT NULL DEFAULT 0,
+    visits INTEGER NOT NULL DEFAULT 0,
+    first_in TIMESTAMPTZ,
+    last_out TIMESTAMPTZ,
+    refreshed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (day, worker_id)
+);
+
+CREATE TABLE IF NOT EXISTS worker_zone_daily (
+    day DATE NOT NULL,
+    worker_id UUID NOT NULL,
+    zone_id UUID NOT NULL,
+    client_company_id UUID,
+    dwell_seconds BIGINT NOT NULL DEFAULT 0,
+    visits INTEGER NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (day, worker_id, zone_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_worker_site_daily_company ON worker_site_daily(client_company_id, day);
+CREATE INDEX IF NOT EXISTS idx_worker_site_daily_worker ON worker_site_daily(worker_id, day);
+CREATE INDEX IF NOT EXISTS idx_worker_zone_daily_company ON worker_zone_daily(client_company_id, day);
+CREATE INDEX IF NOT EXISTS idx_worker_zone_daily_worker ON worker_zone_daily(worker_id, day);
+CREATE INDEX IF NOT EXISTS idx_worker_zone_daily_zone ON worker_zone_daily(zone_id, day);
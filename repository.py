@@ -0,0 +1,201 @@
+"""
+Shared single-row CRUD for the workers, devices and location_zones routers
+Each table is described once (writable columns, insert defaults, fields a
+PUT may change) and every statement the routers need is built when the
+module loads: select/insert/delete, plus one UPDATE per subset of the
+updatable fields. A request only picks a prebuilt TextClause and fills a
+params dict, so no SQL is formatted or bind-parsed per request, and every
+variant keeps a stable statement text for SQLAlchemy's compiled cache and
+pg_stat_statements. Rows come back as RowMappings.
+
+Bulk status changes and deletes select rows by an id list, an equality
+filter on a few columns, or both, and run as one set-based statement;
+a bulk delete also removes the table's dependent rows in the same
+statement.
+"""
+
+import os
+import uuid
+from datetime import datetime
+from itertools import combinations
+from sqlalchemy import text
+
+MAX_BULK_IDS = int(os.getenv("MAX_BULK_IDS", "10000"))
+
+
+class Table:
+    """A table's CRUD statements, prebuilt"""
+
+    def __init__(self, name, label, columns, defaults, updatable, filters=(), scope=(), dependents=()):
+        self.name = name
+        self.label = label                  # "Worker" -> "Worker not found"
+        self.columns = columns              # writable on insert, in statement order
+        self.defaults = defaults            # insert values for omitted columns
+        self.updatable = updatable          # fields a PUT may change, in statement order
+        self.filters = filters              # columns bulk operations may filter on
+        self.scope = scope                  # filters a filtered bulk operation must include
+        self.dependents = dependents        # (table, column) rows removed with a bulk delete
+
+        self.select_by_id = text(f"SELECT * FROM {name} WHERE id = :id")
+        self.delete_by_id = text(f"DELETE FROM {name} WHERE id = :id RETURNING id")
+
+        insert_columns = ["id", *columns, "created_at", "updated_at"]
+        self.insert = text(f"""
+            INSERT INTO {name} ({', '.join(insert_columns)})
+            VALUES ({', '.join(':' + c for c in insert_columns)})
+            RETURNING *
+        """)
+        # Base params for inserts; copied per request
+        self._insert_params = {column: defaults.get(column) for column in columns}
+
+        # 2^n - 1 variants (n <= 7 here), keyed by the fields in updatable order
+        self._updates = {}
+        for size in range(1, len(updatable) + 1):
+            for fields in combinations(updatable, size):
+                assignments = ", ".join(f"{f} = :{f}" for f in (*fields, "updated_at"))
+                self._updates[fields] = text(f"UPDATE {name} SET {assignments} WHERE id = :id RETURNING *")
+
+        # Bulk statements per selection: "ids" and/or a subset of filters
+        self._bulk_status = {}
+        self._bulk_delete = {}
+        keys = ("ids", *filters)
+        for size in range(1, len(keys) + 1):
+            for selection in combinations(keys, size):
+                where = " AND ".join(
+                    "id = ANY(CAST(:ids AS uuid[]))" if key == "ids" else f"{key} = :{key}"
+                    for key in selection
+                )
+                # Rows already in the target status are left alone (no
+                # updated_at bump, no sync churn). The new value has its own
+                # bind name so it cannot collide with a status filter
+                self._bulk_status[selection] = text(f"""
+                    UPDATE {name} SET status = :new_status, updated_at = :updated_at
+                    WHERE {where} AND status IS DISTINCT FROM :new_status
+                """)
+                ctes = [f"deleted AS (DELETE FROM {name} WHERE {where} RETURNING id)"]
+                counts = ["(SELECT count(*) FROM deleted) AS deleted"]
+                for table, column in dependents:
+                    ctes.append(
+                        f"deleted_{table} AS (DELETE FROM {table} WHERE {column} IN (SELECT id FROM deleted) RETURNING 1)"
+                    )
+                    counts.append(f"(SELECT count(*) FROM deleted_{table}) AS {table}")
+                self._bulk_delete[selection] = text(f"WITH {', '.join(ctes)} SELECT {', '.join(counts)}")
+
+    @property
+    def not_found(self):
+        return f"{self.label} not found"
+
+    def get(self, db, row_id):
+        """Row by id, or None"""
+        return db.execute(self.select_by_id, {"id": row_id}).mappings().first()
+
+    def create(self, db, data):
+        """Insert (id from data, else generated) and commit; returns the row"""
+        now = datetime.utcnow()
+        params = self._insert_params.copy()
+        params.update((column, data[column]) for column in self.columns if column in data)
+        params["id"] = data.get("id") or str(uuid.uuid4())
+        params["created_at"] = now
+        params["updated_at"] = now
+
+        row = db.execute(self.insert, params).mappings().first()
+        db.commit()
+        return row
+
+    def update(self, db, row_id, updates):
+        """Apply the updatable fields present in updates and commit
+
+        Returns the row, None when it does not exist, or raises ValueError
+        when updates carries no updatable field.
+        """
+        fields = tuple(f for f in self.updatable if f in updates)
+        if not fields:
+            raise ValueError("No valid fields to update")
+
+        params = {f: updates[f] for f in fields}
+        params["id"] = row_id
+        params["updated_at"] = datetime.utcnow()
+
+        row = db.execute(self._updates[fields], params).mappings().first()
+        db.commit()
+        return row
+
+    def delete(self, db, row_id):
+        """Delete and commit; returns whether the row existed"""
+        deleted = db.execute(self.delete_by_id, {"id": row_id}).first() is not None
+        db.commit()
+        return deleted
+
+    def _selection(self, body):
+        """({"ids": [...], "filter": {...}}) -> (selection key, params); ValueError if invalid"""
+        params = {}
+        ids = body.get("ids")
+        if ids is not None:
+            if not isinstance(ids, list) or not ids:
+                raise ValueError("ids must be a non-empty list")
+            if len(ids) > MAX_BULK_IDS:
+                raise ValueError(f"At most {MAX_BULK_IDS} ids per request")
+            params["ids"] = ids
+
+        filters = body.get("filter") or {}
+        if not isinstance(filters, dict):
+            raise ValueError("filter must be an object")
+        unknown = [key for key in filters if key not in self.filters]
+        if unknown:
+            raise ValueError(f"Cannot filter on {', '.join(unknown)} (allowed: {', '.join(self.filters)})")
+        missing = [key for key in self.scope if key not in filters]
+        if filters and missing:
+            # A filter without the tenant would reach every company's rows
+            raise ValueError(f"filter must include {', '.join(missing)}")
+        params.update(filters)
+
+        if not params:
+            raise ValueError("ids or filter is required")
+        selection = tuple(key for key in ("ids", *self.filters) if key in params)
+        return selection, params
+
+    def bulk_set_status(self, db, body, status):
+        """Set status on the selected rows and commit; returns {"updated": n}"""
+        if not isinstance(status, str) or not status:
+            raise ValueError("status is required")
+        selection, params = self._selection(body)
+        params["new_status"] = status
+        params["updated_at"] = datetime.utcnow()
+
+        result = db.execute(self._bulk_status[selection], params)
+        db.commit()
+        return {"updated": result.rowcount}
+
+    def bulk_delete(self, db, body):
+        """Delete the selected rows and their dependents and commit; returns counts per table"""
+        selection, params = self._selection(body)
+        counts = db.execute(self._bulk_delete[selection], params).mappings().first()
+        db.commit()
+        return dict(counts)
+
+
+WORKERS = Table(
+    "workers", "Worker",
+    ["first_name", "last_name", "email", "phone", "employee_id", "client_company_id", "status"],
+    {"first_name": "", "last_name": "", "status": "active"},
+    ["first_name", "last_name", "email", "phone", "employee_id", "status"],
+    filters=("client_company_id", "status"),
+    scope=("client_company_id",),
+    dependents=(("worker_sites", "worker_id"), ("enrollment_invites", "worker_id")),
+)
+
+DEVICES = Table(
+    "devices", "Device",
+    ["name", "device_type", "ip_address", "port", "location", "status"],
+    {"name": "", "device_type": "camera", "port": 80, "status": "active"},
+    ["name", "device_type", "ip_address", "port", "location", "status"],
+    filters=("device_type", "location", "status"),
+)
+
+ZONES = Table(
+    "location_zones", "Zone",
+    ["name", "zone_type", "description", "capacity", "status"],
+    {"name": "", "zone_type": "general", "status": "active"},
+    ["name", "zone_type", "description", "capacity", "status"],
+    filters=("zone_type", "status"),
+)
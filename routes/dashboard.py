@@ -1,10 +1,23 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from database import get_db
+from database import get_db, prefers_primary, read_session, statement_timeout
+from partitions import scan_window_start
+from typing import Optional
+from datetime import datetime, timedelta, timezone
+from errors import error_response
+from coalesce import coalesced
 
 router = APIRouter(prefix="/api", tags=["dashboard"])
 
+# bucket -> (seconds, default range) for the scan_activity rollup tiers
+ACTIVITY_BUCKETS = {
+    "5m": (300, timedelta(hours=12)),
+    "1h": (3600, timedelta(days=7)),
+    "1d": (86400, timedelta(days=90)),
+}
+MAX_ACTIVITY_BUCKETS = 2000
+
 @router.post("/rpc/get_worker_last_seen")
 async def get_worker_last_seen(request_body: dict, db: Session = Depends(get_db)):
     """Get last seen timestamp for workers"""
@@ -18,16 +31,30 @@ async def get_worker_last_seen(request_body: dict, db: Session = Depends(get_db)
         placeholders = ','.join([f':id{i}' for i in range(len(worker_ids))])
         params = {f'id{i}': worker_id for i, worker_id in enumerate(worker_ids)}
         
+        # Newest scan per worker via the (worker_id, scanned_at) index; on a
+        # partitioned scan_events this reads the newest partitions first and
+        # stops, and the retention bound prunes expired ones entirely
+        window_clause = ""
+        since = scan_window_start()
+        if since:
+            window_clause = "AND se.scanned_at >= :since"
+            params['since'] = since
+        
         query = text(f"""
             SELECT 
                 w.id as worker_id,
                 w.first_name,
                 w.last_name,
-                MAX(se.created_at) as last_seen
+                ls.last_seen
             FROM workers w
-            LEFT JOIN scan_events se ON w.id = se.worker_id
+            LEFT JOIN LATERAL (
+                SELECT se.scanned_at as last_seen
+                FROM scan_events se
+                WHERE se.worker_id = w.id AND NOT se.flagged {window_clause}
+                ORDER BY se.scanned_at DESC
+                LIMIT 1
+            ) ls ON TRUE
             WHERE w.id IN ({placeholders})
-            GROUP BY w.id, w.first_name, w.last_name
         """)
         
         result = db.execute(query, params)
@@ -36,11 +63,10 @@ async def get_worker_last_seen(request_body: dict, db: Session = Depends(get_db)
         
         return {"data": data, "error": None}
     except Exception as e:
-        return {"data": None, "error": str(e)}
+        return error_response(e)
 
-@router.get("/dashboard/stats")
-async def get_dashboard_stats(db: Session = Depends(get_db)):
-    """Get dashboard statistics"""
+def _load_dashboard_stats(primary, timeout_ms):
+    db = read_session(primary, timeout_ms)
     try:
         # Get worker counts
         worker_stats = db.execute(text("""
@@ -77,13 +103,105 @@ async def get_dashboard_stats(db: Session = Depends(get_db)):
             WHERE created_at > NOW() - INTERVAL '30 days'
         """)).fetchone()
         
-        stats = {
-            "workers": dict(zip(worker_stats.keys(), worker_stats)) if worker_stats else {},
-            "devices": dict(zip(device_stats.keys(), device_stats)) if device_stats else {},
-            "zones": dict(zip(zone_stats.keys(), zone_stats)) if zone_stats else {},
-            "emergencies": dict(zip(emergency_stats.keys(), emergency_stats)) if emergency_stats else {}
+        return {
+            "workers": dict(worker_stats._mapping) if worker_stats else {},
+            "devices": dict(device_stats._mapping) if device_stats else {},
+            "zones": dict(zone_stats._mapping) if zone_stats else {},
+            "emergencies": dict(emergency_stats._mapping) if emergency_stats else {}
         }
-        
+    finally:
+        db.close()
+
+@router.get("/dashboard/stats")
+async def get_dashboard_stats(request: Request):
+    """Get dashboard statistics"""
+    try:
+        primary = prefers_primary(request)
+        stats = await coalesced(
+            "dashboard.stats", _load_dashboard_stats, primary, statement_timeout(request),
+            share=not primary
+        )
         return {"data": stats, "error": None}
     except Exception as e:
-        return {"data": None, "error": str(e)}
+        return error_response(e)
+
+@router.get("/dashboard/activity")
+async def get_scan_activity(
+    bucket: str = "1h",
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    zone_id: Optional[str] = None,
+    device_id: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Scan counts per time bucket as dense arrays, read from the scan_activity rollup"""
+    if bucket not in ACTIVITY_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of {', '.join(ACTIVITY_BUCKETS)}")
+    
+    seconds, default_range = ACTIVITY_BUCKETS[bucket]
+    end = end or datetime.now(timezone.utc)
+    start = start or end - default_range
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    
+    if end < start:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    if (end - start).total_seconds() / seconds > MAX_ACTIVITY_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Range exceeds {MAX_ACTIVITY_BUCKETS} buckets; use a larger bucket")
+    
+    try:
+        filters = ""
+        params = {"bucket": bucket, "seconds": seconds, "start": start, "end": end}
+        if zone_id:
+            filters += " AND zone_id = :zone_id"
+            params["zone_id"] = zone_id
+        if device_id:
+            filters += " AND device_id = :device_id"
+            params["device_id"] = device_id
+        
+        query = text(f"""
+            WITH series AS (
+                SELECT generate_series(
+                    to_timestamp(floor(extract(epoch FROM CAST(:start AS timestamptz)) / :seconds) * :seconds),
+                    CAST(:end AS timestamptz),
+                    make_interval(secs => :seconds)
+                ) AS bucket_start
+            ),
+            counts AS (
+                SELECT bucket_start,
+                       SUM(scans_in) AS scans_in,
+                       SUM(scans_out) AS scans_out,
+                       SUM(scans_total) AS scans_total
+                FROM scan_activity
+                WHERE bucket_size = :bucket
+                  AND bucket_start >= (SELECT MIN(bucket_start) FROM series)
+                  AND bucket_start <= :end
+                  {filters}
+                GROUP BY bucket_start
+            )
+            SELECT
+                array_agg(s.bucket_start ORDER BY s.bucket_start) AS buckets,
+                array_agg(COALESCE(c.scans_in, 0)::bigint ORDER BY s.bucket_start) AS scans_in,
+                array_agg(COALESCE(c.scans_out, 0)::bigint ORDER BY s.bucket_start) AS scans_out,
+                array_agg(COALESCE(c.scans_total, 0)::bigint ORDER BY s.bucket_start) AS total
+            FROM series s
+            LEFT JOIN counts c ON c.bucket_start = s.bucket_start
+        """)
+        
+        row = db.execute(query, params).fetchone()
+        
+        data = {
+            "bucket": bucket,
+            "from": start,
+            "to": end,
+            "buckets": row.buckets or [],
+            "scans_in": row.scans_in or [],
+            "scans_out": row.scans_out or [],
+            "total": row.total or []
+        }
+        
+        return {"data": data, "error": None}
+    except Exception as e:
+        return error_response(e)
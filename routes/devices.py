@@ -2,9 +2,12 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from database import get_db
-from typing import Optional
+from typing import List, Optional
 import uuid
-from datetime import datetime
+import repository
+from upserts import MAX_UPSERT_BATCH, DEVICES, apply_changes
+from heartbeats import tracker
+from errors import error_response
 
 router = APIRouter(prefix="/api/devices", tags=["devices"])
 
@@ -20,125 +23,98 @@ async def get_devices(db: Session = Depends(get_db)):
         
         return {"data": data, "error": None}
     except Exception as e:
-        return {"data": None, "error": str(e)}
+        return error_response(e)
+
+@router.post("/{device_id}/heartbeat")
+async def device_heartbeat(device_id: str):
+    """Record a device heartbeat (in memory; flushed to devices in batches)"""
+    try:
+        uuid.UUID(device_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid device id")
+    
+    if not tracker.beat(device_id):
+        raise HTTPException(status_code=503, detail="Heartbeat table full")
+    
+    return {"data": {"device_id": device_id, "connection_status": "online"}, "error": None}
 
 @router.get("/{device_id}")
 async def get_device_by_id(device_id: str, db: Session = Depends(get_db)):
     """Get a single device by ID"""
     try:
-        query = text("SELECT * FROM devices WHERE id = :device_id")
-        result = db.execute(query, {"device_id": device_id})
-        row = result.fetchone()
-        
-        if not row:
-            raise HTTPException(status_code=404, detail="Device not found")
-        
-        columns = result.keys()
-        data = dict(zip(columns, row))
-        
-        return {"data": data, "error": None}
-    except HTTPException:
-        raise
+        data = repository.DEVICES.get(db, device_id)
     except Exception as e:
-        return {"data": None, "error": str(e)}
+        return error_response(e)
+    if not data:
+        raise HTTPException(status_code=404, detail=repository.DEVICES.not_found)
+    return {"data": data, "error": None}
 
 @router.post("")
 async def create_device(device_data: dict, db: Session = Depends(get_db)):
     """Create a new device"""
     try:
-        device_id = device_data.get('id') or str(uuid.uuid4())
-        
-        query = text("""
-            INSERT INTO devices (
-                id, name, device_type, ip_address, port, location,
-                status, created_at, updated_at
-            ) VALUES (
-                :id, :name, :device_type, :ip_address, :port, :location,
-                :status, :created_at, :updated_at
-            )
-            RETURNING *
-        """)
-        
-        params = {
-            'id': device_id,
-            'name': device_data.get('name', ''),
-            'device_type': device_data.get('device_type', 'camera'),
-            'ip_address': device_data.get('ip_address'),
-            'port': device_data.get('port', 80),
-            'location': device_data.get('location'),
-            'status': device_data.get('status', 'active'),
-            'created_at': datetime.utcnow(),
-            'updated_at': datetime.utcnow()
-        }
-        
-        result = db.execute(query, params)
-        db.commit()
-        
-        row = result.fetchone()
-        columns = result.keys()
-        data = dict(zip(columns, row))
-        
-        return {"data": data, "error": None}
+        return {"data": repository.DEVICES.create(db, device_data), "error": None}
+    except Exception as e:
+        db.rollback()
+        return error_response(e)
+
+@router.post("/upsert")
+async def upsert_devices(changes: List[dict], db: Session = Depends(get_db)):
+    """Apply a batch of edge-synced device changes; newer updated_at wins"""
+    if len(changes) > MAX_UPSERT_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_UPSERT_BATCH} changes per request")
+    try:
+        return {"data": apply_changes(db, DEVICES, changes), "error": None}
     except Exception as e:
         db.rollback()
-        return {"data": None, "error": str(e)}
+        return error_response(e)
+
+@router.post("/bulk/status")
+async def bulk_set_device_status(body: dict, db: Session = Depends(get_db)):
+    """Set status on devices selected by ids and/or filter, in one statement"""
+    try:
+        data = repository.DEVICES.bulk_set_status(db, body, body.get("status"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        db.rollback()
+        return error_response(e)
+    return {"data": data, "error": None}
+
+@router.post("/bulk/delete")
+async def bulk_delete_devices(body: dict, db: Session = Depends(get_db)):
+    """Delete devices selected by ids and/or filter; returns counts"""
+    try:
+        data = repository.DEVICES.bulk_delete(db, body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        db.rollback()
+        return error_response(e)
+    return {"data": data, "error": None}
 
 @router.put("/{device_id}")
 async def update_device(device_id: str, updates: dict, db: Session = Depends(get_db)):
     """Update a device"""
     try:
-        update_fields = []
-        params = {'id': device_id, 'updated_at': datetime.utcnow()}
-        
-        allowed_fields = ['name', 'device_type', 'ip_address', 'port', 'location', 'status']
-        
-        for field in allowed_fields:
-            if field in updates:
-                update_fields.append(f"{field} = :{field}")
-                params[field] = updates[field]
-        
-        if not update_fields:
-            raise HTTPException(status_code=400, detail="No valid fields to update")
-        
-        update_fields.append("updated_at = :updated_at")
-        
-        query = text(f"""
-            UPDATE devices SET {', '.join(update_fields)}
-            WHERE id = :id RETURNING *
-        """)
-        
-        result = db.execute(query, params)
-        db.commit()
-        
-        row = result.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="Device not found")
-        
-        columns = result.keys()
-        data = dict(zip(columns, row))
-        
-        return {"data": data, "error": None}
-    except HTTPException:
-        raise
+        data = repository.DEVICES.update(db, device_id, updates)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         db.rollback()
-        return {"data": None, "error": str(e)}
+        return error_response(e)
+    if not data:
+        raise HTTPException(status_code=404, detail=repository.DEVICES.not_found)
+    return {"data": data, "error": None}
 
 @router.delete("/{device_id}")
 async def delete_device(device_id: str, db: Session = Depends(get_db)):
     """Delete a device"""
     try:
-        query = text("DELETE FROM devices WHERE id = :id RETURNING id")
-        result = db.execute(query, {"id": device_id})
-        db.commit()
-        
-        row = result.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="Device not found")
-        
-        return {"data": True, "error": None}
-    except HTTPException:
-        raise
+        deleted = repository.DEVICES.delete(db, device_id)
     except Exception as e:
         db.rollback()
-        return {"data": None, "error": str(e)}
+        return error_response(e)
+    if not deleted:
+        raise HTTPException(status_code=404, detail=repository.DEVICES.not_found)
+    return {"data": True, "error": None}
@@ -5,6 +5,7 @@ from database import get_db
 from typing import Optional
 import uuid
 from datetime import datetime
+from errors import error_response
 
 router = APIRouter(prefix="/api", tags=["enrollment"])
 
@@ -35,7 +36,7 @@ async def get_worker_templates(
         else:
             return {"data": None, "error": None}
     except Exception as e:
-        return {"data": None, "error": None}  # Table might not exist
+        return error_response(e)
 
 @router.get("/enrollment_invites")
 async def get_enrollment_invite(
@@ -64,7 +65,7 @@ async def get_enrollment_invite(
         else:
             return {"data": None, "error": None}
     except Exception as e:
-        return {"data": None, "error": None}
+        return error_response(e)
 
 @router.get("/worker_sites")
 async def get_worker_site_assignments(
@@ -89,7 +90,7 @@ async def get_worker_site_assignments(
         
         return {"data": data, "error": None}
     except Exception as e:
-        return {"data": [], "error": None}
+        return error_response(e)
 
 @router.post("/worker_sites")
 async def create_site_assignments(
@@ -108,6 +109,7 @@ async def create_site_assignments(
                 ) VALUES (
                     :id, :worker_id, :site_id, :created_at
                 )
+                ON CONFLICT (site_id, worker_id) DO NOTHING
                 RETURNING *
             """)
             
@@ -127,7 +129,7 @@ async def create_site_assignments(
         return {"data": created, "error": None}
     except Exception as e:
         db.rollback()
-        return {"data": None, "error": str(e)}
+        return error_response(e)
 
 @router.delete("/worker_sites")
 async def delete_site_assignments(
@@ -155,4 +157,4 @@ async def delete_site_assignments(
         return {"data": deleted_count, "error": None}
     except Exception as e:
         db.rollback()
-        return {"data": None, "error": str(e)}
+        return error_response(e)
@@ -0,0 +1,131 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from database import get_db
+from typing import Optional
+import asyncio
+import os
+import uuid
+import face_index
+import embedding_snapshots
+from errors import error_response
+
+router = APIRouter(prefix="/api", tags=["faces"])
+
+@router.get("/face_embeddings/{worker_id}")
+async def get_face_embedding(worker_id: str, db: Session = Depends(get_db)):
+    """Whether a worker has a face template enrolled (metadata only)"""
+    try:
+        row = db.execute(text("""
+            SELECT worker_id, client_company_id, model, octet_length(embedding) / 4 AS dimensions,
+                   created_at, updated_at
+            FROM worker_embeddings WHERE worker_id = :worker_id
+        """), {"worker_id": worker_id}).fetchone()
+    except Exception as e:
+        return error_response(e)
+    if not row:
+        raise HTTPException(status_code=404, detail="No face template enrolled")
+    return {"data": dict(row._mapping), "error": None}
+
+@router.put("/face_embeddings/{worker_id}")
+async def enroll_face_embedding(worker_id: str, body: dict, db: Session = Depends(get_db)):
+    """Enroll or replace a worker's face template: {"embedding": [...], "model": ...}"""
+    try:
+        row = face_index.enroll(db, worker_id, body.get("embedding"), body.get("model"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        db.rollback()
+        return error_response(e)
+    if not row:
+        raise HTTPException(status_code=404, detail="Worker not found")
+    return {"data": dict(row._mapping), "error": None}
+
+@router.delete("/face_embeddings/{worker_id}")
+async def delete_face_embedding(worker_id: str, db: Session = Depends(get_db)):
+    """Remove a worker's face template"""
+    try:
+        deleted = face_index.unenroll(db, worker_id)
+    except Exception as e:
+        db.rollback()
+        return error_response(e)
+    if not deleted:
+        raise HTTPException(status_code=404, detail="No face template enrolled")
+    return {"data": True, "error": None}
+
+@router.post("/identify")
+async def identify(body: dict, db: Session = Depends(get_db)):
+    """Match a batch of face embeddings against a company's enrolled workers
+
+    {"client_company_id": ..., "embeddings": [[...], ...], "k": 1, "threshold": 0.5}
+    returns, per embedding, up to k {"worker_id", "score"} best first.
+    """
+    client_company_id = body.get("client_company_id")
+    embeddings = body.get("embeddings")
+    try:
+        # Canonical form: it keys the per-company index cache
+        client_company_id = str(uuid.UUID(str(client_company_id)))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="client_company_id must be a UUID")
+    if not isinstance(embeddings, list) or not embeddings:
+        raise HTTPException(status_code=400, detail="embeddings must be a non-empty list")
+    if len(embeddings) > face_index.MAX_IDENTIFY_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {face_index.MAX_IDENTIFY_BATCH} embeddings per request")
+    try:
+        k = int(body.get("k", 1))
+        threshold = float(body.get("threshold", face_index.FACE_MATCH_THRESHOLD))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="k and threshold must be numbers")
+    if not 1 <= k <= face_index.MAX_IDENTIFY_K:
+        raise HTTPException(status_code=400, detail=f"k must be between 1 and {face_index.MAX_IDENTIFY_K}")
+
+    try:
+        # Index load and the matrix product run off the event loop
+        data = await asyncio.to_thread(face_index.identify, db, client_company_id, embeddings, k, threshold)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        return error_response(e)
+    return {"data": data, "error": None}
+
+@router.get("/sites/{site_id}/embeddings")
+async def get_site_embeddings(
+    request: Request,
+    site_id: str,
+    dtype: str = "int8",
+    since: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Quantized, mmap-able templates for a site's workers (see embedding_snapshots.py)
+
+    Pass the X-Embedding-Version of the file the device has as since to get
+    a delta when the server still has that version.
+    """
+    try:
+        uuid.UUID(site_id)
+        base_version = int(since, 16) if since else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="site_id must be a UUID and since a version")
+
+    try:
+        version, kind, f = await asyncio.to_thread(
+            embedding_snapshots.get_snapshot, db, site_id, dtype, base_version
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        return error_response(e)
+
+    etag = f'"{dtype}-{version:016x}"'
+    headers = {"ETag": etag, "X-Embedding-Version": f"{version:016x}", "Cache-Control": "no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        f.close()
+        return Response(status_code=304, headers=headers)
+    if kind == embedding_snapshots.DELTA:
+        headers["X-Embedding-Base-Version"] = since.lower()
+        headers["ETag"] = f'"{dtype}-{base_version:016x}-{version:016x}"'
+    headers["X-Embedding-Kind"] = "delta" if kind == embedding_snapshots.DELTA else "full"
+    headers["Content-Length"] = str(os.fstat(f.fileno()).st_size)
+    db.close()
+    return StreamingResponse(embedding_snapshots.iter_file(f), media_type="application/octet-stream", headers=headers)
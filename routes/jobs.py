@@ -0,0 +1,100 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from database import get_db
+from typing import Optional
+import jobs
+from errors import error_response
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+# params can hold a whole import, so status reads leave it out
+JOB_COLUMNS = """
+    id, kind, status, progress, progress_message, result, error, attempts, worker,
+    created_at, started_at, heartbeat_at, finished_at, result_size IS NOT NULL AS has_result_file
+"""
+
+def _job_dict(row):
+    return dict(row._mapping)
+
+@router.post("", status_code=202)
+async def submit_job(job: dict, db: Session = Depends(get_db)):
+    """Queue a background job: {"kind": ..., "params": {...}}"""
+    kind = job.get("kind")
+    params = job.get("params") or {}
+    if not isinstance(params, dict):
+        raise HTTPException(status_code=400, detail="params must be an object")
+    try:
+        row = jobs.submit(db, kind, params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        db.rollback()
+        return error_response(e)
+    return {"data": {"id": row.id, "kind": row.kind, "status": row.status}, "error": None}
+
+@router.get("")
+async def list_jobs(
+    status: Optional[str] = None,
+    kind: Optional[str] = None,
+    limit: int = 50,
+    db: Session = Depends(get_db)
+):
+    """List recent jobs"""
+    try:
+        query = f"SELECT {JOB_COLUMNS} FROM jobs WHERE 1=1"
+        params = {"limit": min(max(limit, 1), 500)}
+        if status:
+            query += " AND status = :status"
+            params["status"] = status
+        if kind:
+            query += " AND kind = :kind"
+            params["kind"] = kind
+        query += " ORDER BY created_at DESC LIMIT :limit"
+
+        result = db.execute(text(query), params)
+        return {"data": [_job_dict(row) for row in result], "error": None}
+    except Exception as e:
+        return error_response(e)
+
+@router.get("/{job_id}")
+async def get_job(job_id: str, db: Session = Depends(get_db)):
+    """Job status and progress"""
+    try:
+        row = db.execute(
+            text(f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = CAST(:id AS uuid)"), {"id": job_id}
+        ).fetchone()
+    except Exception as e:
+        return error_response(e)
+    if not row:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"data": _job_dict(row), "error": None}
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: str, db: Session = Depends(get_db)):
+    """Job result; file results are streamed as a download"""
+    try:
+        row = db.execute(
+            text("SELECT id, status, result, result_size FROM jobs WHERE id = CAST(:id AS uuid)"), {"id": job_id}
+        ).fetchone()
+    except Exception as e:
+        return error_response(e)
+    if not row:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if row.status != jobs.SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job is {row.status}")
+
+    if row.result_size is not None:
+        # Release the connection; the stream reads chunks on its own session
+        db.close()
+        filename = (row.result or {}).get("filename") or f"{row.id}.bin"
+        return StreamingResponse(
+            jobs.read_result_chunks(str(row.id)),
+            media_type="application/octet-stream",
+            headers={
+                "Content-Disposition": f'attachment; filename="{filename}"',
+                "Content-Length": str(row.result_size),
+            },
+        )
+    return {"data": row.result, "error": None}
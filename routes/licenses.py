@@ -5,11 +5,8 @@ from typing import List
 from datetime import datetime
 import json
 import os
-import sys
 
-# Import license generator
-sys.path.append(os.path.dirname(__file__) + '/..')
-from generate_license import LicenseGenerator
+from license_system.generate_license import LicenseGenerator
 
 router = APIRouter(prefix="/api/licenses", tags=["licenses"])
 
@@ -21,12 +18,8 @@ class LicenseRequest(BaseModel):
     duration_months: int = 12
     features: List[str] = ["face_recognition", "liveness", "reports"]
 
-# Initialize generator
-generator = LicenseGenerator()
-try:
-    generator.load_private_key()
-except:
-    print("⚠️  Warning: private_key.pem not found. License generation will fail.")
+# Private key (and cryptography) are loaded on the first generate request
+generator = LicenseGenerator(os.getenv("LICENSE_PRIVATE_KEY_PATH", "private_key.pem"))
 
 @router.post("/generate")
 async def generate_license(request: LicenseRequest):
@@ -0,0 +1,122 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from database import get_db, prefers_primary, read_session, statement_timeout
+from typing import Optional
+from datetime import date, timedelta
+import csv
+import io
+import reports
+from errors import error_response
+
+router = APIRouter(prefix="/api/reports", tags=["reports"])
+
+MAX_JSON_ROWS = 50000
+
+# Rows flushed per chunk when streaming CSV
+CSV_BATCH_ROWS = 5000
+
+
+def _params(client_company_id, start, end, worker_id=None, zone_id=None):
+    if end < start:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    params = reports.presence_params(start, end + timedelta(days=1))
+    params.update({"company_id": client_company_id, "worker_id": worker_id, "zone_id": zone_id})
+    return params
+
+
+def _stream_csv(request, query, params, columns, filename):
+    # Own session: the stream outlives the request dependency. Routed like
+    # get_db, so live reports read scan_events on a replica within
+    # REPLICA_MAX_LAG_SECONDS unless the client has just written.
+    db = read_session(prefers_primary(request), statement_timeout(request))
+    # The first batch is fetched before the response starts, so a bad
+    # parameter or a timeout still gets a proper error response
+    try:
+        result = db.execute(query, params, execution_options={"stream_results": True})
+        batches = result.partitions(CSV_BATCH_ROWS)
+        first = next(batches, [])
+    except Exception as e:
+        db.close()
+        return error_response(e)
+
+    def generate():
+        try:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            writer.writerows(first)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            for rows in batches:
+                writer.writerows(rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+def _json_rows(db, query, params, limit):
+    result = db.execute(query, params)
+    columns = result.keys()
+    return [dict(zip(columns, row)) for row in result.fetchmany(limit)]
+
+
+@router.get("/attendance")
+async def get_attendance_report(
+    request: Request,
+    client_company_id: str,
+    start: date = Query(..., alias="from"),
+    end: date = Query(..., alias="to"),
+    worker_id: Optional[str] = None,
+    live: bool = False,
+    format: str = "json",
+    limit: int = MAX_JSON_ROWS,
+    db: Session = Depends(get_db)
+):
+    """Daily time on site per worker (from/to inclusive, CSV is streamed)"""
+    params = _params(client_company_id, start, end, worker_id)
+    query = reports.attendance_query(worker_id, live)
+    
+    if format == "csv":
+        return _stream_csv(request, query, params, reports.ATTENDANCE_COLUMNS, f"attendance_{start}_{end}.csv")
+    
+    try:
+        data = _json_rows(db, query, params, min(limit, MAX_JSON_ROWS))
+        return {"data": data, "error": None}
+    except Exception as e:
+        return error_response(e)
+
+@router.get("/zone_dwell")
+async def get_zone_dwell_report(
+    request: Request,
+    client_company_id: str,
+    start: date = Query(..., alias="from"),
+    end: date = Query(..., alias="to"),
+    worker_id: Optional[str] = None,
+    zone_id: Optional[str] = None,
+    live: bool = False,
+    format: str = "json",
+    limit: int = MAX_JSON_ROWS,
+    db: Session = Depends(get_db)
+):
+    """Daily time in each zone per worker (from/to inclusive, CSV is streamed)"""
+    params = _params(client_company_id, start, end, worker_id, zone_id)
+    query = reports.zone_dwell_query(worker_id, zone_id, live)
+    
+    if format == "csv":
+        return _stream_csv(request, query, params, reports.ZONE_DWELL_COLUMNS, f"zone_dwell_{start}_{end}.csv")
+    
+    try:
+        data = _json_rows(db, query, params, min(limit, MAX_JSON_ROWS))
+        return {"data": data, "error": None}
+    except Exception as e:
+        return error_response(e)
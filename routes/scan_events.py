@@ -0,0 +1,160 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from database import get_db
+from typing import List, Optional
+from datetime import datetime, timezone
+import asyncio
+import os
+import uuid
+import archive
+from scan_filter import ACCEPTED, DIRECTIONS, PASSBACK_FLAGGED, WRITTEN, scan_filter
+from upserts import parse_timestamp
+from errors import error_response
+
+router = APIRouter(prefix="/api/scan_events", tags=["scan_events"])
+
+MAX_ARCHIVE_ROWS = 10000
+MAX_SCAN_BATCH = int(os.getenv("MAX_SCAN_BATCH", "1000"))
+
+def _uuid(value, field):
+    if value is None:
+        return None
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        raise ValueError(f"{field} must be a UUID")
+
+def _prepare_scan(event, now):
+    if not isinstance(event, dict):
+        raise ValueError("event must be an object")
+    worker_id = _uuid(event.get("worker_id"), "worker_id")
+    if worker_id is None:
+        raise ValueError("worker_id is required")
+    direction = event.get("direction")
+    if direction is not None and direction not in DIRECTIONS:
+        raise ValueError(f"direction must be one of: {', '.join(DIRECTIONS)}")
+    return {
+        "id": _uuid(event.get("id"), "id") or str(uuid.uuid4()),
+        "worker_id": worker_id,
+        "device_id": _uuid(event.get("device_id"), "device_id"),
+        "zone_id": _uuid(event.get("zone_id"), "zone_id"),
+        "direction": direction,
+        "scanned_at": parse_timestamp(event.get("scanned_at"), now),
+    }
+
+def _stored_ids(db, events):
+    """Outcomes of events (with client-supplied ids) already in scan_events, by id"""
+    if not events:
+        return {}
+    rows = db.execute(text("""
+        SELECT se.id, se.flagged FROM scan_events se
+        JOIN unnest(CAST(:ids AS uuid[]), CAST(:scanned_at AS timestamptz[])) AS e(id, scanned_at)
+          ON se.id = e.id AND se.scanned_at = e.scanned_at
+    """), {"ids": [e["id"] for e in events], "scanned_at": [e["scanned_at"] for e in events]})
+    return {str(row.id): PASSBACK_FLAGGED if row.flagged else ACCEPTED for row in rows}
+
+@router.post("")
+async def ingest_scan_events(events: List[dict], db: Session = Depends(get_db)):
+    """Record a batch of scans; duplicates and passback violations are filtered first (see scan_filter.py)"""
+    if len(events) > MAX_SCAN_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_SCAN_BATCH} events per request")
+
+    now = datetime.now(timezone.utc)
+    try:
+        prepared = [_prepare_scan(event, now) for event in events]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        stored = _stored_ids(db, [event for event, raw in zip(prepared, events) if raw.get("id")])
+    except Exception as e:
+        db.rollback()
+        return error_response(e)
+
+    # A retried batch that already committed: its events were accepted
+    # (or flagged) then, and running them through the filter again would call them duplicates
+    fresh = [i for i, event in enumerate(prepared) if event["id"] not in stored]
+    outcomes = [stored.get(event["id"], ACCEPTED) for event in prepared]
+    fresh_outcomes, undo = scan_filter.admit([prepared[i] for i in fresh])
+    for i, outcome in zip(fresh, fresh_outcomes):
+        outcomes[i] = outcome
+    written = [
+        dict(prepared[i], flagged=outcome == PASSBACK_FLAGGED)
+        for i, outcome in zip(fresh, fresh_outcomes) if outcome in WRITTEN
+    ]
+    try:
+        if written:
+            # One statement for the batch; a replayed id is skipped
+            db.execute(text("""
+                INSERT INTO scan_events (id, worker_id, device_id, zone_id, direction, scanned_at, flagged, created_at)
+                SELECT e.id, e.worker_id, e.device_id, e.zone_id, e.direction, e.scanned_at, e.flagged, :now
+                FROM unnest(
+                    CAST(:ids AS uuid[]), CAST(:worker_ids AS uuid[]), CAST(:device_ids AS uuid[]),
+                    CAST(:zone_ids AS uuid[]), CAST(:directions AS text[]), CAST(:scanned_at AS timestamptz[]),
+                    CAST(:flagged AS boolean[])
+                ) AS e(id, worker_id, device_id, zone_id, direction, scanned_at, flagged)
+                ON CONFLICT DO NOTHING
+            """), {
+                "ids": [e["id"] for e in written],
+                "worker_ids": [e["worker_id"] for e in written],
+                "device_ids": [e["device_id"] for e in written],
+                "zone_ids": [e["zone_id"] for e in written],
+                "directions": [e["direction"] for e in written],
+                "scanned_at": [e["scanned_at"] for e in written],
+                "flagged": [e["flagged"] for e in written],
+                "now": now,
+            })
+            db.commit()
+    except Exception as e:
+        db.rollback()
+        scan_filter.restore(undo)
+        return error_response(e)
+
+    counts = {}
+    for outcome in outcomes:
+        counts[outcome] = counts.get(outcome, 0) + 1
+    results = [{"id": event["id"], "status": outcome} for event, outcome in zip(prepared, outcomes)]
+    return {"data": {"results": results, "counts": counts}, "error": None}
+
+@router.get("/archive")
+async def get_archived_scan_events(
+    client_company_id: str,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    worker_id: Optional[str] = None,
+    device_id: Optional[str] = None,
+    zone_id: Optional[str] = None,
+    direction: Optional[str] = None,
+    limit: int = 1000
+):
+    """Query archived scan events (Parquet files, not Postgres)
+
+    client_company_id=unknown returns scans whose worker could not be
+    placed in a company when they were archived (see archive.py).
+    """
+    if limit < 1 or limit > MAX_ARCHIVE_ROWS:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_ARCHIVE_ROWS}")
+    if client_company_id != archive.UNKNOWN_COMPANY:
+        try:
+            client_company_id = _uuid(client_company_id, "client_company_id")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        # Parquet reads block, so they run off the event loop
+        data = await asyncio.to_thread(
+            archive.query_archive,
+            client_company_id,
+            start=start,
+            end=end,
+            worker_id=worker_id,
+            device_id=device_id,
+            zone_id=zone_id,
+            direction=direction,
+            limit=limit
+        )
+        
+        return {"data": data, "error": None}
+    except Exception as e:
+        return error_response(e)
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from database import get_db
+from typing import Optional
+import delta_sync
+from errors import error_response
+
+router = APIRouter(prefix="/api/sync", tags=["sync"])
+
+@router.get("")
+async def sync_changes(
+    since: Optional[str] = None,
+    tables: Optional[str] = None,
+    client_company_id: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Rows created, updated or deleted since a sync token, plus the next token"""
+    selected = [t.strip() for t in tables.split(",") if t.strip()] if tables else None
+    unknown = [t for t in selected or [] if t not in delta_sync.SYNC_TABLES]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown tables: {', '.join(unknown)} (expected {', '.join(delta_sync.SYNC_TABLES)})"
+        )
+    if since is not None:
+        try:
+            delta_sync.decode_token(since)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        data = delta_sync.changes_since(db, since=since, tables=selected, client_company_id=client_company_id)
+        return {"data": data, "error": None}
+    except Exception as e:
+        return error_response(e)
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import text
 from database import get_db
 from typing import Optional
+from errors import error_response
 
 router = APIRouter(prefix="/api", tags=["team"])
 
@@ -37,7 +38,7 @@ async def get_team_members(
         
         return {"data": data, "error": None}
     except Exception as e:
-        return {"data": None, "error": str(e)}
+        return error_response(e)
 
 @router.get("/team_invites")
 async def get_pending_invites(db: Session = Depends(get_db)):
@@ -55,7 +56,7 @@ async def get_pending_invites(db: Session = Depends(get_db)):
         
         return {"data": data, "error": None}
     except Exception as e:
-        return {"data": [], "error": None}  # Table might not exist
+        return error_response(e)
 
 @router.delete("/user_roles")
 async def remove_team_member(
@@ -82,7 +83,7 @@ async def remove_team_member(
         raise
     except Exception as e:
         db.rollback()
-        return {"data": None, "error": str(e)}
+        return error_response(e)
 
 @router.delete("/team_invites")
 async def delete_invite(
@@ -104,7 +105,7 @@ async def delete_invite(
         raise
     except Exception as e:
         db.rollback()
-        return {"data": None, "error": str(e)}
+        return error_response(e)
 
 @router.patch("/user_roles")
 async def update_member_role(
@@ -140,4 +141,4 @@ async def update_member_role(
         raise
     except Exception as e:
         db.rollback()
-        return {"data": None, "error": str(e)}
+        return error_response(e)
@@ -1,19 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from database import get_db
-from typing import Optional
+from database import get_db, prefers_primary, read_session, statement_timeout
+from partitions import scan_window_start
+from typing import List, Optional
+import asyncio
 import uuid
-from datetime import datetime
+import repository
+from upserts import MAX_UPSERT_BATCH, WORKERS, apply_changes
+import snapshots
+from errors import error_response
+from coalesce import coalesced
 
 router = APIRouter(prefix="/api/workers", tags=["workers"])
 
-@router.get("")
-async def get_workers(
-    client_company_id: Optional[str] = None,
-    db: Session = Depends(get_db)
-):
-    """Get all workers, optionally filtered by company"""
+def _load_workers(client_company_id, primary, timeout_ms):
+    db = read_session(primary, timeout_ms)
     try:
         if client_company_id:
             query = text("SELECT * FROM workers WHERE client_company_id = :company_id ORDER BY created_at DESC")
@@ -23,130 +25,283 @@ async def get_workers(
             result = db.execute(query)
         
         columns = result.keys()
-        data = [dict(zip(columns, row)) for row in result.fetchall()]
-        
+        return [dict(zip(columns, row)) for row in result.fetchall()]
+    finally:
+        db.close()
+
+@router.get("")
+async def get_workers(request: Request, client_company_id: Optional[str] = None):
+    """Get all workers, optionally filtered by company"""
+    try:
+        primary = prefers_primary(request)
+        data = await coalesced(
+            "workers.list", _load_workers, client_company_id, primary, statement_timeout(request),
+            share=not primary
+        )
         return {"data": data, "error": None}
     except Exception as e:
-        return {"data": None, "error": str(e)}
+        return error_response(e)
 
-@router.get("/{worker_id}")
-async def get_worker_by_id(worker_id: str, db: Session = Depends(get_db)):
-    """Get a single worker by ID"""
+# Queries shorter than a trigram only use the prefix indexes
+MIN_FUZZY_LENGTH = 3
+MAX_SEARCH_RESULTS = 100
+
+def _like_escape(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+@router.get("/search")
+async def search_workers(
+    q: str,
+    client_company_id: Optional[str] = None,
+    mode: str = "search",
+    limit: int = 20,
+    offset: int = 0,
+    db: Session = Depends(get_db)
+):
+    """Search workers by name, email or employee ID (ranked, paginated)"""
     try:
-        query = text("SELECT * FROM workers WHERE id = :worker_id")
-        result = db.execute(query, {"worker_id": worker_id})
-        row = result.fetchone()
+        term = q.strip().lower()
+        if not term:
+            return {"data": [], "error": None}
+        
+        limit = max(1, min(limit, MAX_SEARCH_RESULTS))
+        params = {
+            "q": term,
+            "prefix": _like_escape(term) + '%',
+            "contains": '%' + _like_escape(term) + '%',
+            "limit": limit + 1,
+            "offset": max(0, offset)
+        }
         
-        if not row:
-            raise HTTPException(status_code=404, detail="Worker not found")
+        company_filter = ""
+        if client_company_id:
+            company_filter = "AND w.client_company_id = :company_id"
+            params["company_id"] = client_company_id
+        
+        exact_match = "(lower(w.employee_id) = :q OR lower(w.email) = :q)"
+        prefix_match = """(
+            lower(w.first_name) LIKE :prefix OR lower(w.last_name) LIKE :prefix
+            OR lower(w.email) LIKE :prefix OR lower(w.employee_id) LIKE :prefix
+        )"""
+        
+        if mode == "autocomplete" or len(term) < MIN_FUZZY_LENGTH:
+            # Prefix-only: served by the (client_company_id, lower(col)) btrees
+            query = text(f"""
+                SELECT w.id, w.first_name, w.last_name, w.email, w.employee_id, w.status
+                FROM workers w
+                WHERE {prefix_match}
+                  {company_filter}
+                ORDER BY {exact_match} DESC, w.last_name, w.first_name, w.id
+                LIMIT :limit OFFSET :offset
+            """)
+        else:
+            # Fuzzy names plus substring email / employee ID, via the trigram GIN indexes
+            query = text(f"""
+                SELECT w.id, w.first_name, w.last_name, w.email, w.phone, w.employee_id,
+                       w.client_company_id, w.status, w.created_at, w.updated_at,
+                       GREATEST(
+                           similarity(lower(w.first_name || ' ' || w.last_name), :q),
+                           similarity(lower(w.first_name), :q),
+                           similarity(lower(w.last_name), :q),
+                           similarity(lower(COALESCE(w.email, '')), :q),
+                           similarity(lower(COALESCE(w.employee_id, '')), :q)
+                       )
+                       + CASE WHEN {exact_match} THEN 2
+                              WHEN {prefix_match} THEN 1
+                              ELSE 0 END AS rank
+                FROM workers w
+                WHERE (
+                    lower(w.first_name || ' ' || w.last_name) % :q
+                    OR lower(w.first_name) % :q
+                    OR lower(w.last_name) % :q
+                    OR lower(w.first_name || ' ' || w.last_name) LIKE :contains
+                    OR lower(w.email) LIKE :contains
+                    OR lower(w.employee_id) LIKE :contains
+                )
+                  {company_filter}
+                ORDER BY rank DESC, w.last_name, w.first_name, w.id
+                LIMIT :limit OFFSET :offset
+            """)
         
+        result = db.execute(query, params)
         columns = result.keys()
-        data = dict(zip(columns, row))
+        rows = result.fetchall()
         
-        return {"data": data, "error": None}
-    except HTTPException:
-        raise
+        data = [dict(zip(columns, row)) for row in rows[:limit]]
+        
+        return {"data": data, "has_more": len(rows) > limit, "error": None}
     except Exception as e:
-        return {"data": None, "error": str(e)}
+        return error_response(e)
+
+@router.get("/snapshot")
+async def get_worker_snapshot(request: Request, client_company_id: str, db: Session = Depends(get_db)):
+    """Company roster as a memory-mappable Arrow IPC file (see snapshots.py)"""
+    try:
+        # Canonical form, so "ABC..." and "{abc...}" share one cache entry
+        client_company_id = str(uuid.UUID(client_company_id))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="client_company_id must be a UUID")
+
+    try:
+        # The roster query and Arrow build block; keep them off the event loop
+        snapshot = await asyncio.to_thread(snapshots.get_snapshot, db, client_company_id)
+    except Exception as e:
+        return error_response(e)
+
+    etag = f'"{snapshot.version}"'
+    headers = {
+        "ETag": etag,
+        "X-Snapshot-Version": snapshot.version,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=snapshot.gzipped, media_type=snapshots.SNAPSHOT_MEDIA_TYPE, headers=headers)
+    return Response(content=snapshot.data, media_type=snapshots.SNAPSHOT_MEDIA_TYPE, headers=headers)
+
+@router.get("/{worker_id}")
+async def get_worker_by_id(worker_id: str, db: Session = Depends(get_db)):
+    """Get a single worker by ID"""
+    try:
+        data = repository.WORKERS.get(db, worker_id)
+    except Exception as e:
+        return error_response(e)
+    if not data:
+        raise HTTPException(status_code=404, detail=repository.WORKERS.not_found)
+    return {"data": data, "error": None}
+
+# Everything the profile screen needs in one statement: the worker, their
+# site assignments, latest enrollment invite and newest scan
+WORKER_DETAIL_SQL = """
+    SELECT
+        to_jsonb(w) AS worker,
+        COALESCE((
+            SELECT jsonb_agg(to_jsonb(ws) ORDER BY ws.created_at DESC)
+            FROM worker_sites ws
+            WHERE ws.worker_id = w.id
+        ), '[]'::jsonb) AS sites,
+        (
+            SELECT to_jsonb(ei)
+            FROM enrollment_invites ei
+            WHERE ei.worker_id = w.id
+            ORDER BY ei.created_at DESC
+            LIMIT 1
+        ) AS enrollment_invite,
+        ls.last_seen, ls.zone_id AS last_zone_id, ls.device_id AS last_device_id,
+        ls.direction AS last_direction
+    FROM workers w
+    LEFT JOIN LATERAL (
+        SELECT se.scanned_at AS last_seen, se.zone_id, se.device_id, se.direction
+        FROM scan_events se
+        WHERE se.worker_id = w.id AND NOT se.flagged {window_clause}
+        ORDER BY se.scanned_at DESC
+        LIMIT 1
+    ) ls ON TRUE
+    WHERE w.id = :worker_id
+"""
+
+@router.get("/{worker_id}/detail")
+async def get_worker_detail(worker_id: str, db: Session = Depends(get_db)):
+    """Worker profile with site assignments, latest enrollment invite and last seen"""
+    try:
+        params = {"worker_id": worker_id}
+        window_clause = ""
+        since = scan_window_start()
+        if since:
+            window_clause = "AND se.scanned_at >= :since"
+            params["since"] = since
+
+        row = db.execute(text(WORKER_DETAIL_SQL.format(window_clause=window_clause)), params).fetchone()
+    except Exception as e:
+        return error_response(e)
+    if not row:
+        raise HTTPException(status_code=404, detail=repository.WORKERS.not_found)
+
+    last_seen = None
+    if row.last_seen:
+        last_seen = {
+            "scanned_at": row.last_seen,
+            "zone_id": row.last_zone_id,
+            "device_id": row.last_device_id,
+            "direction": row.last_direction,
+        }
+    data = {
+        "worker": row.worker,
+        "sites": row.sites,
+        "enrollment_invite": row.enrollment_invite,
+        "last_seen": last_seen,
+    }
+    return {"data": data, "error": None}
 
 @router.post("")
 async def create_worker(worker_data: dict, db: Session = Depends(get_db)):
     """Create a new worker"""
     try:
-        worker_id = worker_data.get('id') or str(uuid.uuid4())
-        
-        query = text("""
-            INSERT INTO workers (
-                id, first_name, last_name, email, phone, employee_id,
-                client_company_id, status, created_at, updated_at
-            ) VALUES (
-                :id, :first_name, :last_name, :email, :phone, :employee_id,
-                :client_company_id, :status, :created_at, :updated_at
-            )
-            RETURNING *
-        """)
-        
-        params = {
-            'id': worker_id,
-            'first_name': worker_data.get('first_name', ''),
-            'last_name': worker_data.get('last_name', ''),
-            'email': worker_data.get('email'),
-            'phone': worker_data.get('phone'),
-            'employee_id': worker_data.get('employee_id'),
-            'client_company_id': worker_data.get('client_company_id'),
-            'status': worker_data.get('status', 'active'),
-            'created_at': datetime.utcnow(),
-            'updated_at': datetime.utcnow()
-        }
-        
-        result = db.execute(query, params)
-        db.commit()
-        
-        row = result.fetchone()
-        columns = result.keys()
-        data = dict(zip(columns, row))
-        
-        return {"data": data, "error": None}
+        return {"data": repository.WORKERS.create(db, worker_data), "error": None}
+    except Exception as e:
+        db.rollback()
+        return error_response(e)
+
+@router.post("/upsert")
+async def upsert_workers(changes: List[dict], db: Session = Depends(get_db)):
+    """Apply a batch of edge-synced worker changes; newer updated_at wins"""
+    if len(changes) > MAX_UPSERT_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_UPSERT_BATCH} changes per request")
+    try:
+        return {"data": apply_changes(db, WORKERS, changes), "error": None}
     except Exception as e:
         db.rollback()
-        return {"data": None, "error": str(e)}
+        return error_response(e)
+
+@router.post("/bulk/status")
+async def bulk_set_worker_status(body: dict, db: Session = Depends(get_db)):
+    """Set status on workers selected by ids and/or filter, in one statement"""
+    try:
+        data = repository.WORKERS.bulk_set_status(db, body, body.get("status"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        db.rollback()
+        return error_response(e)
+    return {"data": data, "error": None}
+
+@router.post("/bulk/delete")
+async def bulk_delete_workers(body: dict, db: Session = Depends(get_db)):
+    """Delete workers selected by ids and/or filter with their site assignments and invites; returns counts"""
+    try:
+        data = repository.WORKERS.bulk_delete(db, body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        db.rollback()
+        return error_response(e)
+    return {"data": data, "error": None}
 
 @router.put("/{worker_id}")
 async def update_worker(worker_id: str, updates: dict, db: Session = Depends(get_db)):
     """Update a worker"""
     try:
-        update_fields = []
-        params = {'id': worker_id, 'updated_at': datetime.utcnow()}
-        
-        allowed_fields = ['first_name', 'last_name', 'email', 'phone', 'employee_id', 'status']
-        
-        for field in allowed_fields:
-            if field in updates:
-                update_fields.append(f"{field} = :{field}")
-                params[field] = updates[field]
-        
-        if not update_fields:
-            raise HTTPException(status_code=400, detail="No valid fields to update")
-        
-        update_fields.append("updated_at = :updated_at")
-        
-        query = text(f"""
-            UPDATE workers SET {', '.join(update_fields)}
-            WHERE id = :id RETURNING *
-        """)
-        
-        result = db.execute(query, params)
-        db.commit()
-        
-        row = result.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="Worker not found")
-        
-        columns = result.keys()
-        data = dict(zip(columns, row))
-        
-        return {"data": data, "error": None}
-    except HTTPException:
-        raise
+        data = repository.WORKERS.update(db, worker_id, updates)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         db.rollback()
-        return {"data": None, "error": str(e)}
+        return error_response(e)
+    if not data:
+        raise HTTPException(status_code=404, detail=repository.WORKERS.not_found)
+    return {"data": data, "error": None}
 
 @router.delete("/{worker_id}")
 async def delete_worker(worker_id: str, db: Session = Depends(get_db)):
     """Delete a worker"""
     try:
-        query = text("DELETE FROM workers WHERE id = :id RETURNING id")
-        result = db.execute(query, {"id": worker_id})
-        db.commit()
-        
-        row = result.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="Worker not found")
-        
-        return {"data": True, "error": None}
-    except HTTPException:
-        raise
+        deleted = repository.WORKERS.delete(db, worker_id)
     except Exception as e:
         db.rollback()
-        return {"data": None, "error": str(e)}
+        return error_response(e)
+    if not deleted:
+        raise HTTPException(status_code=404, detail=repository.WORKERS.not_found)
+    return {"data": True, "error": None}
@@ -1,19 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from database import get_db
-from typing import Optional
-import uuid
-from datetime import datetime
+from database import get_db, prefers_primary, read_session, statement_timeout
+from typing import List, Optional
+import repository
+from upserts import MAX_UPSERT_BATCH, ZONES, apply_changes
+from errors import error_response
+from coalesce import coalesced
 
 router = APIRouter(prefix="/api/zones", tags=["zones"])
 
-@router.get("")
-async def get_zones(
-    zone_type: Optional[str] = None,
-    db: Session = Depends(get_db)
-):
-    """Get all zones, optionally filtered by type"""
+def _load_zones(zone_type, primary, timeout_ms):
+    db = read_session(primary, timeout_ms)
     try:
         if zone_type:
             query = text("SELECT * FROM location_zones WHERE zone_type = :zone_type ORDER BY created_at DESC")
@@ -23,128 +21,100 @@ async def get_zones(
             result = db.execute(query)
         
         columns = result.keys()
-        data = [dict(zip(columns, row)) for row in result.fetchall()]
-        
+        return [dict(zip(columns, row)) for row in result.fetchall()]
+    finally:
+        db.close()
+
+@router.get("")
+async def get_zones(request: Request, zone_type: Optional[str] = None):
+    """Get all zones, optionally filtered by type"""
+    try:
+        primary = prefers_primary(request)
+        data = await coalesced(
+            "zones.list", _load_zones, zone_type, primary, statement_timeout(request),
+            share=not primary
+        )
         return {"data": data, "error": None}
     except Exception as e:
-        return {"data": None, "error": str(e)}
+        return error_response(e)
 
 @router.get("/{zone_id}")
 async def get_zone_by_id(zone_id: str, db: Session = Depends(get_db)):
     """Get a single zone by ID"""
     try:
-        query = text("SELECT * FROM location_zones WHERE id = :zone_id")
-        result = db.execute(query, {"zone_id": zone_id})
-        row = result.fetchone()
-        
-        if not row:
-            raise HTTPException(status_code=404, detail="Zone not found")
-        
-        columns = result.keys()
-        data = dict(zip(columns, row))
-        
-        return {"data": data, "error": None}
-    except HTTPException:
-        raise
+        data = repository.ZONES.get(db, zone_id)
     except Exception as e:
-        return {"data": None, "error": str(e)}
+        return error_response(e)
+    if not data:
+        raise HTTPException(status_code=404, detail=repository.ZONES.not_found)
+    return {"data": data, "error": None}
 
 @router.post("")
 async def create_zone(zone_data: dict, db: Session = Depends(get_db)):
     """Create a new zone"""
     try:
-        zone_id = zone_data.get('id') or str(uuid.uuid4())
-        
-        query = text("""
-            INSERT INTO location_zones (
-                id, name, zone_type, description, capacity,
-                status, created_at, updated_at
-            ) VALUES (
-                :id, :name, :zone_type, :description, :capacity,
-                :status, :created_at, :updated_at
-            )
-            RETURNING *
-        """)
-        
-        params = {
-            'id': zone_id,
-            'name': zone_data.get('name', ''),
-            'zone_type': zone_data.get('zone_type', 'general'),
-            'description': zone_data.get('description'),
-            'capacity': zone_data.get('capacity'),
-            'status': zone_data.get('status', 'active'),
-            'created_at': datetime.utcnow(),
-            'updated_at': datetime.utcnow()
-        }
-        
-        result = db.execute(query, params)
-        db.commit()
-        
-        row = result.fetchone()
-        columns = result.keys()
-        data = dict(zip(columns, row))
-        
-        return {"data": data, "error": None}
+        return {"data": repository.ZONES.create(db, zone_data), "error": None}
+    except Exception as e:
+        db.rollback()
+        return error_response(e)
+
+@router.post("/upsert")
+async def upsert_zones(changes: List[dict], db: Session = Depends(get_db)):
+    """Apply a batch of edge-synced zone changes; newer updated_at wins"""
+    if len(changes) > MAX_UPSERT_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_UPSERT_BATCH} changes per request")
+    try:
+        return {"data": apply_changes(db, ZONES, changes), "error": None}
+    except Exception as e:
+        db.rollback()
+        return error_response(e)
+
+@router.post("/bulk/status")
+async def bulk_set_zone_status(body: dict, db: Session = Depends(get_db)):
+    """Set status on zones selected by ids and/or filter, in one statement"""
+    try:
+        data = repository.ZONES.bulk_set_status(db, body, body.get("status"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         db.rollback()
-        return {"data": None, "error": str(e)}
+        return error_response(e)
+    return {"data": data, "error": None}
+
+@router.post("/bulk/delete")
+async def bulk_delete_zones(body: dict, db: Session = Depends(get_db)):
+    """Delete zones selected by ids and/or filter; returns counts"""
+    try:
+        data = repository.ZONES.bulk_delete(db, body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        db.rollback()
+        return error_response(e)
+    return {"data": data, "error": None}
 
 @router.put("/{zone_id}")
 async def update_zone(zone_id: str, updates: dict, db: Session = Depends(get_db)):
     """Update a zone"""
     try:
-        update_fields = []
-        params = {'id': zone_id, 'updated_at': datetime.utcnow()}
-        
-        allowed_fields = ['name', 'zone_type', 'description', 'capacity', 'status']
-        
-        for field in allowed_fields:
-            if field in updates:
-                update_fields.append(f"{field} = :{field}")
-                params[field] = updates[field]
-        
-        if not update_fields:
-            raise HTTPException(status_code=400, detail="No valid fields to update")
-        
-        update_fields.append("updated_at = :updated_at")
-        
-        query = text(f"""
-            UPDATE location_zones SET {', '.join(update_fields)}
-            WHERE id = :id RETURNING *
-        """)
-        
-        result = db.execute(query, params)
-        db.commit()
-        
-        row = result.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="Zone not found")
-        
-        columns = result.keys()
-        data = dict(zip(columns, row))
-        
-        return {"data": data, "error": None}
-    except HTTPException:
-        raise
+        data = repository.ZONES.update(db, zone_id, updates)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         db.rollback()
-        return {"data": None, "error": str(e)}
+        return error_response(e)
+    if not data:
+        raise HTTPException(status_code=404, detail=repository.ZONES.not_found)
+    return {"data": data, "error": None}
 
 @router.delete("/{zone_id}")
 async def delete_zone(zone_id: str, db: Session = Depends(get_db)):
     """Delete a zone"""
     try:
-        query = text("DELETE FROM location_zones WHERE id = :id RETURNING id")
-        result = db.execute(query, {"id": zone_id})
-        db.commit()
-        
-        row = result.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="Zone not found")
-        
-        return {"data": True, "error": None}
-    except HTTPException:
-        raise
+        deleted = repository.ZONES.delete(db, zone_id)
     except Exception as e:
         db.rollback()
-        return {"data": None, "error": str(e)}
+        return error_response(e)
+    if not deleted:
+        raise HTTPException(status_code=404, detail=repository.ZONES.not_found)
+    return {"data": True, "error": None}
@@ -0,0 +1,78 @@
+-- Time-bucketed scan counts for /api/dashboard/activity
+-- Maintained incrementally at ingestion by a statement-level trigger on
+-- scan_events, so every writer (API, edge devices, bulk loads) keeps it
+-- current with one aggregated upsert per INSERT statement. Buckets are
+-- aligned to the Unix epoch (UTC). Counts are not decremented when raw
+-- partitions are detached, so activity history outlives scan retention.
+-- Passback-flagged scans (scan_flags.sql, applied first) are not counted.
+--
+-- Run once; the backfill reads all of scan_events while blocking writers.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS scan_activity (
+    bucket_size TEXT NOT NULL,            -- '5m' | '1h' | '1d'
+    bucket_start TIMESTAMPTZ NOT NULL,
+    zone_id UUID NOT NULL,                -- nil UUID when the scan had no zone
+    device_id UUID NOT NULL,              -- nil UUID when the scan had no device
+    scans_in BIGINT NOT NULL DEFAULT 0,
+    scans_out BIGINT NOT NULL DEFAULT 0,
+    scans_total BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket_size, bucket_start, zone_id, device_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_scan_activity_zone ON scan_activity(bucket_size, zone_id, bucket_start);
+CREATE INDEX IF NOT EXISTS idx_scan_activity_device ON scan_activity(bucket_size, device_id, bucket_start);
+
+CREATE OR REPLACE FUNCTION scan_activity_rollup() RETURNS trigger AS $$
+BEGIN
+    -- ORDER BY keeps concurrent upserts locking rows in the same order
+    INSERT INTO scan_activity AS sa (
+        bucket_size, bucket_start, zone_id, device_id, scans_in, scans_out, scans_total
+    )
+    SELECT b.bucket_size,
+           to_timestamp(floor(extract(epoch FROM n.scanned_at) / b.seconds) * b.seconds) AS bucket_start,
+           COALESCE(n.zone_id, '00000000-0000-0000-0000-000000000000'::uuid) AS zone_id,
+           COALESCE(n.device_id, '00000000-0000-0000-0000-000000000000'::uuid) AS device_id,
+           COUNT(*) FILTER (WHERE n.direction = 'in'),
+           COUNT(*) FILTER (WHERE n.direction = 'out'),
+           COUNT(*)
+    FROM new_scans n
+    CROSS JOIN (VALUES ('5m', 300), ('1h', 3600), ('1d', 86400)) AS b(bucket_size, seconds)
+    WHERE NOT n.flagged
+    GROUP BY 1, 2, 3, 4
+    ORDER BY 1, 2, 3, 4
+    ON CONFLICT (bucket_size, bucket_start, zone_id, device_id) DO UPDATE
+    SET scans_in = sa.scans_in + EXCLUDED.scans_in,
+        scans_out = sa.scans_out + EXCLUDED.scans_out,
+        scans_total = sa.scans_total + EXCLUDED.scans_total;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+LOCK TABLE scan_events IN SHARE MODE;
+
+TRUNCATE scan_activity;
+
+INSERT INTO scan_activity (bucket_size, bucket_start, zone_id, device_id, scans_in, scans_out, scans_total)
+SELECT b.bucket_size,
+       to_timestamp(floor(extract(epoch FROM se.scanned_at) / b.seconds) * b.seconds),
+       COALESCE(se.zone_id, '00000000-0000-0000-0000-000000000000'::uuid),
+       COALESCE(se.device_id, '00000000-0000-0000-0000-000000000000'::uuid),
+       COUNT(*) FILTER (WHERE se.direction = 'in'),
+       COUNT(*) FILTER (WHERE se.direction = 'out'),
+       COUNT(*)
+FROM scan_events se
+CROSS JOIN (VALUES ('5m', 300), ('1h', 3600), ('1d', 86400)) AS b(bucket_size, seconds)
+WHERE NOT se.flagged
+GROUP BY 1, 2, 3, 4;
+
+DROP TRIGGER IF EXISTS scan_events_activity_rollup ON scan_events;
+CREATE TRIGGER scan_events_activity_rollup
+    AFTER INSERT ON scan_events
+    REFERENCING NEW TABLE AS new_scans
+    FOR EACH STATEMENT EXECUTE FUNCTION scan_activity_rollup();
+
+COMMIT;
+
+ANALYZE scan_activity;
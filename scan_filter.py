@@ -0,0 +1,141 @@
+"""
+Scan de-duplication and anti-passback at ingestion
+Cameras report the same face several times a second, and misreads produce
+impossible sequences such as two "in" scans for the same zone in a row.
+POST /api/scan_events runs every batch through ScanFilter before writing,
+so that noise never reaches scan_events (or last-seen, occupancy and the
+scan_activity rollup downstream) and costs no queries:
+
+- duplicate: same worker, device and direction as the last accepted scan
+  from that device within SCAN_DEDUP_WINDOW seconds. Always dropped.
+- passback: same direction as the worker's last accepted scan for the
+  zone (in after in, out after out) within SCAN_PASSBACK_RESET seconds.
+  Dropped, or with SCAN_PASSBACK_MODE=flag written with scan_events.flagged
+  set (scan_flags.sql), which every downstream reader skips ("off" disables
+  the check). The reset keeps a missed "out" from locking a worker out of a
+  zone for good.
+
+Both tables are bounded LRUs kept per API process, so the filter is best
+effort across processes: a duplicate that lands on another process is
+written. Event times come from the device (scanned_at), and a scan older
+than the state it would change is accepted without checks or updates.
+A client retrying a batch that committed gets the same outcomes again:
+from the outcomes this process remembers per event id, and from
+scan_events for events another process wrote.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from metrics import SCAN_EVENTS_TOTAL, SCAN_FILTER_TRACKED
+
+SCAN_DEDUP_WINDOW = float(os.getenv("SCAN_DEDUP_WINDOW", "2"))
+SCAN_PASSBACK_MODE = os.getenv("SCAN_PASSBACK_MODE", "drop").lower()   # drop | flag | off
+SCAN_PASSBACK_RESET = float(os.getenv("SCAN_PASSBACK_RESET", str(16 * 3600)))
+SCAN_FILTER_MAX_KEYS = int(os.getenv("SCAN_FILTER_MAX_KEYS", "200000"))
+
+DIRECTIONS = ("in", "out")
+
+ACCEPTED = "accepted"
+DUPLICATE = "duplicate"
+PASSBACK_DROPPED = "passback_dropped"
+PASSBACK_FLAGGED = "passback_flagged"
+
+# Outcomes that are written to scan_events
+WRITTEN = (ACCEPTED, PASSBACK_FLAGGED)
+
+
+class ScanFilter:
+    """Recent-scan window per (worker, device) and direction state per (worker, zone)"""
+
+    def __init__(self, dedup_window=SCAN_DEDUP_WINDOW, passback_mode=SCAN_PASSBACK_MODE,
+                 passback_reset=SCAN_PASSBACK_RESET, max_keys=SCAN_FILTER_MAX_KEYS):
+        self.dedup_window = timedelta(seconds=dedup_window)
+        self.passback_mode = passback_mode
+        self.passback_reset = timedelta(seconds=passback_reset)
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._recent = OrderedDict()      # (worker, device) -> (scanned_at, direction)
+        self._direction = OrderedDict()   # (worker, zone) -> (scanned_at, direction)
+        self._outcomes = OrderedDict()    # event id -> outcome, so a replay gets the same answer
+
+    def _remember(self, table, key, value, undo):
+        undo.append((table, key, table.get(key), value))
+        table[key] = value
+        table.move_to_end(key)
+        while len(table) > self.max_keys:
+            table.popitem(last=False)
+
+    def _check(self, event, undo):
+        worker, device, zone = event["worker_id"], event["device_id"], event["zone_id"]
+        direction, scanned_at = event["direction"], event["scanned_at"]
+
+        if device:
+            last = self._recent.get((worker, device))
+            if last is not None:
+                last_at, last_direction = last
+                if last_direction == direction and abs(scanned_at - last_at) < self.dedup_window:
+                    return DUPLICATE
+
+        outcome = ACCEPTED
+        if zone and direction in DIRECTIONS and self.passback_mode != "off":
+            last = self._direction.get((worker, zone))
+            if last is not None:
+                last_at, last_direction = last
+                if scanned_at < last_at:
+                    # Late delivery of an older scan: history, not a transition
+                    return ACCEPTED
+                if last_direction == direction and scanned_at - last_at < self.passback_reset:
+                    if self.passback_mode != "flag":
+                        return PASSBACK_DROPPED
+                    outcome = PASSBACK_FLAGGED
+            self._remember(self._direction, (worker, zone), (scanned_at, direction), undo)
+
+        if device:
+            self._remember(self._recent, (worker, device), (scanned_at, direction), undo)
+        return outcome
+
+    def admit(self, events):
+        """Outcome per event (input order), plus an undo token for restore()
+
+        events need id, worker_id, device_id, zone_id, direction and an
+        aware scanned_at. They are checked in scanned_at order, so a batch
+        may arrive in any order. An id seen before gets its earlier outcome.
+        """
+        outcomes = [None] * len(events)
+        undo = []
+        checked = []    # outcomes of events not seen before, for the metrics
+        order = sorted(range(len(events)), key=lambda i: events[i]["scanned_at"])
+        with self._lock:
+            for i in order:
+                outcome = self._outcomes.get(events[i]["id"])
+                if outcome is None:
+                    outcome = self._check(events[i], undo)
+                    self._remember(self._outcomes, events[i]["id"], outcome, undo)
+                    checked.append(outcome)
+                outcomes[i] = outcome
+            SCAN_FILTER_TRACKED.labels(state="recent").set(len(self._recent))
+            SCAN_FILTER_TRACKED.labels(state="direction").set(len(self._direction))
+            SCAN_FILTER_TRACKED.labels(state="outcomes").set(len(self._outcomes))
+        for outcome in checked:
+            SCAN_EVENTS_TOTAL.labels(result=outcome).inc()
+        return outcomes, undo
+
+    def restore(self, undo):
+        """Undo admit() after the batch failed to write, so a retry is not filtered
+
+        A key another batch has updated since is left as it is.
+        """
+        with self._lock:
+            for table, key, previous, value in reversed(undo):
+                if table.get(key) is not value:
+                    continue
+                if previous is None:
+                    table.pop(key, None)
+                else:
+                    table[key] = previous
+
+
+scan_filter = ScanFilter()
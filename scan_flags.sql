@@ -0,0 +1,11 @@
+-- Passback flags written by POST /api/scan_events (see scan_filter.py)
+-- With SCAN_PASSBACK_MODE=flag a passback violation is kept for audit but
+-- marked flagged, and every reader that derives presence from scan_events
+-- (last-seen, reports, the scan_activity rollup) skips flagged rows.
+--
+-- Apply before scan_activity.sql. On a database that already has
+-- scan_activity, re-run the CREATE FUNCTION scan_activity_rollup() from
+-- scan_activity.sql afterwards so the trigger skips flagged rows too.
+
+-- A constant default is catalog-only: no rewrite of existing partitions
+ALTER TABLE scan_events ADD COLUMN IF NOT EXISTS flagged BOOLEAN NOT NULL DEFAULT false;
@@ -0,0 +1,144 @@
+"""
+Worker roster snapshots for edge nodes
+/api/workers/snapshot serves a company's roster as an uncompressed Arrow
+IPC file, so edge nodes can pyarrow.memory_map() it and read columns with
+no parsing. The bytes travel gzip-compressed (Content-Encoding) and are
+stored decompressed on the device.
+
+Snapshots are cached per company and rebuilt only when the roster
+fingerprint changes: a count plus an order-independent hash over each
+worker's id and sync_txid (see delta_sync.sql), which moves on every
+insert, update and delete. Clients revalidate with If-None-Match. The
+fingerprint is itself reused for SNAPSHOT_VERSION_TTL seconds, so polling
+devices cost one aggregate per company per TTL, and a roster change shows
+up at most that long after it commits.
+
+    import pyarrow as pa
+    table = pa.ipc.open_file(pa.memory_map("roster.arrow")).read_all()
+"""
+
+import gzip
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from sqlalchemy import text
+
+# pyarrow is imported inside the functions that need it so that the API
+# does not pay for it at startup.
+
+# Bump when the column layout changes; it is part of every ETag
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_MEDIA_TYPE = "application/vnd.apache.arrow.file"
+SNAPSHOT_CACHE_SIZE = int(os.getenv("SNAPSHOT_CACHE_SIZE", "64"))
+SNAPSHOT_VERSION_TTL = float(os.getenv("SNAPSHOT_VERSION_TTL", "5"))
+
+ROSTER_COLUMNS = ["id", "employee_id", "first_name", "last_name", "status", "updated_at"]
+
+
+class Snapshot:
+    def __init__(self, version, data):
+        self.version = version
+        self.data = data
+        self.gzipped = gzip.compress(data, compresslevel=6)
+        self.checked_at = time.monotonic()   # when version was last confirmed current
+
+
+_cache = OrderedDict()   # company id -> Snapshot, least recently used first
+_cache_lock = threading.Lock()
+_build_locks = {}        # company id -> lock so one request rebuilds at a time
+
+
+def roster_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("id", pa.string()),
+        ("employee_id", pa.string()),
+        ("first_name", pa.string()),
+        ("last_name", pa.string()),
+        ("status", pa.dictionary(pa.int8(), pa.string())),
+        ("updated_at", pa.timestamp("us", tz="UTC")),
+    ])
+
+
+def roster_version(db, client_company_id):
+    """Fingerprint of the company's roster; changes whenever any worker does"""
+    row = db.execute(text("""
+        SELECT COUNT(*) AS workers,
+               COALESCE(SUM(hashtextextended(CAST(id AS text) || ':' || COALESCE(CAST(sync_txid AS text), ''), 0)), 0) AS digest
+        FROM workers
+        WHERE client_company_id = :client_company_id
+    """), {"client_company_id": client_company_id}).fetchone()
+    return f"{SNAPSHOT_FORMAT_VERSION}-{row.workers}-{row.digest}"
+
+
+def build_snapshot(db, client_company_id, version):
+    import pyarrow as pa
+
+    result = db.execute(text(f"""
+        SELECT {', '.join(ROSTER_COLUMNS)}
+        FROM workers
+        WHERE client_company_id = :client_company_id
+        ORDER BY id
+    """), {"client_company_id": client_company_id})
+    rows = result.fetchall()
+
+    columns = {name: [] for name in ROSTER_COLUMNS}
+    for row in rows:
+        for name, value in zip(ROSTER_COLUMNS, row):
+            columns[name].append(value)
+    columns["id"] = [str(value) for value in columns["id"]]
+
+    schema = roster_schema().with_metadata({
+        "format_version": str(SNAPSHOT_FORMAT_VERSION),
+        "client_company_id": client_company_id,
+        "roster_version": version,
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+    })
+    table = pa.Table.from_pydict(columns, schema=schema)
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_file(sink, schema) as writer:
+        writer.write_table(table)
+    return Snapshot(version, sink.getvalue().to_pybytes())
+
+
+def get_snapshot(db, client_company_id):
+    """Cached snapshot for the company, rebuilt when its roster has changed
+
+    Blocking (a query and possibly a build): call it off the event loop.
+    The cache is keyed on the canonical UUID string.
+    """
+    client_company_id = str(uuid.UUID(str(client_company_id)))
+    with _cache_lock:
+        cached = _cache.get(client_company_id)
+        if cached is not None and time.monotonic() - cached.checked_at < SNAPSHOT_VERSION_TTL:
+            _cache.move_to_end(client_company_id)
+            return cached
+
+    version = roster_version(db, client_company_id)
+    with _cache_lock:
+        cached = _cache.get(client_company_id)
+        if cached is not None and cached.version == version:
+            cached.checked_at = time.monotonic()
+            _cache.move_to_end(client_company_id)
+            return cached
+        build_lock = _build_locks.setdefault(client_company_id, threading.Lock())
+
+    with build_lock:
+        with _cache_lock:
+            cached = _cache.get(client_company_id)
+            if cached is not None and cached.version == version:
+                cached.checked_at = time.monotonic()
+                return cached
+        snapshot = build_snapshot(db, client_company_id, version)
+        with _cache_lock:
+            _cache[client_company_id] = snapshot
+            _cache.move_to_end(client_company_id)
+            while len(_cache) > SNAPSHOT_CACHE_SIZE:
+                evicted, _ = _cache.popitem(last=False)
+                _build_locks.pop(evicted, None)
+        return snapshot
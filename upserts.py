@@ -0,0 +1,223 @@
+"""
+Idempotent batch upserts for edge-synced tables
+Sites with intermittent connectivity queue mutations locally and replay
+them on reconnect. Every change carries the row id and the updated_at it
+was made at; a change only lands when it is newer than the stored row, so
+replays and out-of-order deliveries are harmless no-ops.
+
+Changes are grouped by the set of fields they carry and each group is a
+single INSERT ... SELECT FROM unnest(...) ON CONFLICT (id) DO UPDATE, so a
+batch costs a handful of statements in one transaction. Fields a change
+omits keep their stored value (or the column default for new rows).
+"""
+
+import os
+import uuid
+from datetime import datetime, timezone
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from errors import classify
+
+MAX_UPSERT_BATCH = int(os.getenv("MAX_UPSERT_BATCH", "5000"))
+
+CREATED = "created"
+UPDATED = "updated"
+SKIPPED = "skipped"          # stored row is the same age or newer
+SUPERSEDED = "superseded"    # a later change for the same id is in this batch
+FAILED = "error"
+
+
+class UpsertTable:
+    """Columns an edge site may write, with their types and insert defaults"""
+
+    def __init__(self, table, columns, defaults):
+        self.table = table
+        self.columns = columns      # column -> postgres type for the unnest casts
+        self.defaults = defaults    # used when a change for a new row omits a column
+
+
+WORKERS = UpsertTable(
+    "workers",
+    {
+        "first_name": "text", "last_name": "text", "email": "text", "phone": "text",
+        "employee_id": "text", "client_company_id": "uuid", "status": "text",
+    },
+    {"first_name": "", "last_name": "", "status": "active"},
+)
+
+DEVICES = UpsertTable(
+    "devices",
+    {
+        "name": "text", "device_type": "text", "ip_address": "text", "port": "integer",
+        "location": "text", "status": "text",
+    },
+    {"name": "", "device_type": "camera", "port": 80, "status": "active"},
+)
+
+ZONES = UpsertTable(
+    "location_zones",
+    {
+        "name": "text", "zone_type": "text", "description": "text", "capacity": "integer",
+        "status": "text",
+    },
+    {"name": "", "zone_type": "general", "status": "active"},
+)
+
+
+def parse_timestamp(value, now):
+    """ISO-8601 string -> aware datetime; missing means now, future is clamped to now"""
+    if value is None:
+        return now
+    if isinstance(value, str):
+        if value.endswith("Z"):
+            value = value[:-1] + "+00:00"
+        value = datetime.fromisoformat(value)
+    if not isinstance(value, datetime):
+        raise ValueError("timestamp must be an ISO-8601 string")
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    # A device clock running ahead would otherwise lock the row against
+    # every later edit until real time caught up.
+    return min(value, now)
+
+
+def _coerce(value, pg_type):
+    if value is None:
+        return None
+    if pg_type == "uuid":
+        return str(uuid.UUID(str(value)))
+    if pg_type == "integer":
+        if isinstance(value, bool):
+            raise ValueError("expected an integer")
+        return int(value)
+    return str(value)
+
+
+def _prepare(spec, change, now):
+    """Validate one change; returns (id, {column: value}, created_at, updated_at)"""
+    if not isinstance(change, dict):
+        raise ValueError("change must be an object")
+    if not change.get("id"):
+        raise ValueError("id is required")
+    try:
+        row_id = str(uuid.UUID(str(change["id"])))
+    except ValueError:
+        raise ValueError("invalid id")
+    fields = {}
+    for column, pg_type in spec.columns.items():
+        if column in change:
+            try:
+                fields[column] = _coerce(change[column], pg_type)
+            except (TypeError, ValueError):
+                raise ValueError(f"invalid {column}")
+    updated_at = parse_timestamp(change.get("updated_at"), now)
+    created_at = parse_timestamp(change.get("created_at"), now) if change.get("created_at") else now
+    return row_id, fields, created_at, updated_at
+
+
+def _upsert_sql(spec, present):
+    columns = list(spec.columns)
+    insert_columns = ["id"] + columns + ["created_at", "updated_at"]
+    types = ["uuid"] + [spec.columns[c] for c in columns] + ["timestamptz", "timestamptz"]
+    arrays = ", ".join(f"CAST(:{c} AS {t}[])" for c, t in zip(insert_columns, types))
+    assignments = [f"{c} = EXCLUDED.{c}" for c in columns if c in present]
+    assignments.append("updated_at = EXCLUDED.updated_at")
+    return text(f"""
+        INSERT INTO {spec.table} ({', '.join(insert_columns)})
+        SELECT * FROM unnest({arrays})
+        ON CONFLICT (id) DO UPDATE SET {', '.join(assignments)}
+        WHERE {spec.table}.updated_at < EXCLUDED.updated_at
+        RETURNING id, (xmax = 0) AS inserted
+    """)
+
+
+def _write_group(db, spec, present, rows):
+    """Upsert rows sharing a field set in one savepoint; returns {id: inserted}"""
+    params = {"id": [r[0] for r in rows]}
+    for column in spec.columns:
+        default = spec.defaults.get(column)
+        params[column] = [r[2].get(column, default) if column in present else default for r in rows]
+    params["created_at"] = [r[3] for r in rows]
+    params["updated_at"] = [r[4] for r in rows]
+
+    with db.begin_nested():
+        return {
+            str(row.id): row.inserted
+            for row in db.execute(_upsert_sql(spec, present), params)
+        }
+
+
+def _fail_group(error, rows, results):
+    # Timeouts and lost connections fail the whole batch so the client
+    # retries it after Retry-After
+    if classify(error)[0] == 503:
+        raise error
+    message = str(getattr(error, "orig", error)).strip()
+    for row_id, index, *_ in rows:
+        results[index] = {"id": row_id, "status": FAILED, "error": message}
+
+
+def _record(written, rows, results):
+    for row_id, index, *_ in rows:
+        if row_id not in written:
+            status = SKIPPED
+        else:
+            status = CREATED if written[row_id] else UPDATED
+        results[index] = {"id": row_id, "status": status}
+
+
+def apply_changes(db, spec, changes):
+    """Apply a change set in one transaction and return per-item outcomes
+
+    Outcomes are in input order. Invalid changes, and rows the database
+    rejects (e.g. a foreign key violation), are reported as errors without
+    rolling back the rest of the batch; transient database errors propagate.
+    """
+    now = datetime.now(timezone.utc)
+    results = [None] * len(changes)
+    latest = {}  # id -> (index, fields, created_at, updated_at)
+
+    for index, change in enumerate(changes):
+        raw_id = change.get("id") if isinstance(change, dict) else None
+        try:
+            row_id, fields, created_at, updated_at = _prepare(spec, change, now)
+        except (TypeError, ValueError) as e:
+            results[index] = {"id": raw_id, "status": FAILED, "error": str(e)}
+            continue
+        previous = latest.get(row_id)
+        if previous is not None:
+            if previous[3] > updated_at:
+                results[index] = {"id": row_id, "status": SUPERSEDED}
+                continue
+            results[previous[0]] = {"id": row_id, "status": SUPERSEDED}
+        latest[row_id] = (index, fields, created_at, updated_at)
+
+    groups = {}
+    for row_id, (index, fields, created_at, updated_at) in latest.items():
+        groups.setdefault(frozenset(fields), []).append((row_id, index, fields, created_at, updated_at))
+
+    for present, rows in groups.items():
+        try:
+            written = _write_group(db, spec, present, rows)
+        except SQLAlchemyError as e:
+            if classify(e)[0] == 503 or len(rows) == 1:
+                _fail_group(e, rows, results)
+                continue
+            # One bad row (a foreign key, a duplicate email) must not fail
+            # the valid ones: retry the group one row per savepoint
+            for row in rows:
+                try:
+                    written = _write_group(db, spec, present, [row])
+                except SQLAlchemyError as e:
+                    _fail_group(e, [row], results)
+                    continue
+                _record(written, [row], results)
+            continue
+        _record(written, rows, results)
+
+    db.commit()
+
+    summary = {status: 0 for status in (CREATED, UPDATED, SKIPPED, SUPERSEDED, FAILED)}
+    for result in results:
+        summary[result["status"]] += 1
+    return {"results": results, "counts": summary}
@@ -0,0 +1,19 @@
+-- Worker search indexes for /api/workers/search
+-- Trigram GIN indexes serve fuzzy (%) and substring (LIKE '%q%') matching;
+-- the prefix btrees lead with client_company_id so tenant-scoped
+-- autocomplete (LIKE 'q%') is a narrow range scan. They complement
+-- idx_workers_email / idx_workers_employee_id from add_indexes.sql, which
+-- serve exact lookups.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_workers_full_name_trgm ON workers USING gin (lower(first_name || ' ' || last_name) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_workers_first_name_trgm ON workers USING gin (lower(first_name) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_workers_last_name_trgm ON workers USING gin (lower(last_name) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_workers_email_trgm ON workers USING gin (lower(email) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_workers_employee_id_trgm ON workers USING gin (lower(employee_id) gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_workers_first_name_prefix ON workers(client_company_id, lower(first_name) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_workers_last_name_prefix ON workers(client_company_id, lower(last_name) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_workers_email_prefix ON workers(client_company_id, lower(email) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_workers_employee_id_prefix ON workers(client_company_id, lower(employee_id) text_pattern_ops);